@@ -0,0 +1,232 @@
+"""
+Benchmark `CantoneseDetector` on a synthetic corpus.
+
+Run from the repository root:
+
+    python -m benchmarks.bench --output results.json
+    python -m benchmarks.bench --compare before.json after.json
+    python -m benchmarks.bench --import-only
+
+Every `judge` configuration and every internal stage is timed (best of `--repeat` runs) and reported as seconds,
+documents per second and characters per second. Peak memory of each `judge` configuration is measured in a
+separate run with `tracemalloc`, so that tracing does not slow down the timings.
+
+The import time of the package and the cold start (import and first `judge`) are measured in fresh interpreters.
+The run fails if the import takes longer than `--import-budget` seconds.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+# Seconds allowed for `import cantonesedetect`, checked by every run
+IMPORT_BUDGET = 0.05
+
+COLD_START = """
+import time
+start = time.perf_counter()
+from cantonesedetect import CantoneseDetector
+CantoneseDetector(split_seg=True, use_quotes=True).judge("他說「係噉嘅」。我們去吃飯")
+print(time.perf_counter() - start)
+"""
+
+from benchmarks.corpus import generate_corpus
+from cantonesedetect.Detector import CantoneseDetector
+
+
+def best_time(function: Callable[[], Any], repeat: int) -> float:
+    """
+    Return the shortest wall time of `repeat` calls to `function`.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(function: Callable[[], Any]) -> int:
+    """
+    Return the peak memory in bytes allocated by Python during a call to `function`.
+    """
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def import_times(repeat: int) -> Dict[str, float]:
+    """
+    Return the shortest time of `import cantonesedetect`, as reported by `-X importtime`, and of the cold start,
+    each in `repeat` fresh interpreters. Bytecode is written by a first run, so that it is not compiled each time.
+    """
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    subprocess.run([sys.executable, "-c", "import cantonesedetect"], env=env, check=True)
+
+    import_seconds = cold_start_seconds = float('inf')
+    for _ in range(repeat):
+        stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import cantonesedetect"], env=env,
+                                capture_output=True, text=True, check=True).stderr
+        # The last line is the package itself, with the cumulative time of its imports in microseconds
+        import_seconds = min(import_seconds, int(stderr.splitlines()[-1].split("|")[1]) / 1e6)
+        stdout = subprocess.run([sys.executable, "-c", COLD_START], env=env, capture_output=True, text=True,
+                                check=True).stdout
+        cold_start_seconds = min(cold_start_seconds, float(stdout))
+    return {"import": import_seconds, "cold_start": cold_start_seconds}
+
+
+def run_benchmarks(corpus: List[str], repeat: int) -> Dict[str, Dict[str, float]]:
+    """
+    Time `judge` under every `split_seg`/`use_quotes`/`get_analysis` combination and each internal stage.
+
+    Returns:
+        dict: For each benchmark name, its `seconds`, `docs_per_s` and `chars_per_s`, and `peak_bytes` for `judge`.
+    """
+    chars = sum(len(document) for document in corpus)
+    results: Dict[str, Dict[str, float]] = {}
+
+    def record(name: str, seconds: float, documents: int, characters: int) -> Dict[str, float]:
+        results[name] = {
+            "seconds": seconds,
+            "docs_per_s": documents / seconds if seconds > 0 else 0.0,
+            "chars_per_s": characters / seconds if seconds > 0 else 0.0,
+        }
+        return results[name]
+
+    for split_seg, use_quotes, get_analysis in itertools.product((False, True), repeat=3):
+        detector = CantoneseDetector(split_seg=split_seg, use_quotes=use_quotes, get_analysis=get_analysis)
+
+        def judge_corpus():
+            return [detector.judge(document) for document in corpus]
+
+        name = f"judge[split_seg={split_seg},use_quotes={use_quotes},get_analysis={get_analysis}]"
+        record(name, best_time(judge_corpus, repeat), len(corpus), chars)["peak_bytes"] = peak_memory(judge_corpus)
+
+    # Internal stages, each over the output of the previous one
+    detector = CantoneseDetector(split_seg=True, use_quotes=True)
+    documents_parts = [detector._separate_parts(document) for document in corpus]
+    documents_segments = [[segment for part in parts for segment in detector._split_part(document, part)]
+                          for document, parts in zip(corpus, documents_parts)]
+    segments = [segment for document_segments in documents_segments for segment in document_segments]
+    segment_texts = [segment.text() for segment in segments]
+    segment_chars = sum(len(segment) for segment in segments)
+
+    record("stage:_separate_parts", best_time(
+        lambda: [detector._separate_parts(document) for document in corpus], repeat), len(corpus), chars)
+    record("stage:_split_part", best_time(
+        lambda: [[detector._split_part(document, part) for part in parts]
+                 for document, parts in zip(corpus, documents_parts)], repeat), len(corpus), chars)
+    record("stage:_get_segment_features", best_time(
+        lambda: [detector._get_segment_features(segment) for segment in segments], repeat), len(segments), segment_chars)
+    record("stage:_get_segment_counts", best_time(
+        lambda: [detector._get_segment_counts(segment) for segment in segments], repeat), len(segments), segment_chars)
+    record("stage:_hant_length", best_time(
+        lambda: [detector._hant_length(segment) for segment in segment_texts], repeat), len(segments), segment_chars)
+    record("stage:_judge_segments", best_time(
+        lambda: [detector._judge_segments(document_segments) for document_segments in documents_segments], repeat),
+        len(corpus), segment_chars)
+
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(before_path: str, after_path: str) -> None:
+    """
+    Print the speedup of every benchmark between two result files.
+    """
+    with open(before_path, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(after_path, encoding='utf-8') as f:
+        after = json.load(f)
+
+    print(f"{'benchmark':<70} {'before (s)':>12} {'after (s)':>12} {'speedup':>8}")
+    for name, result in after["results"].items():
+        if name not in before["results"]:
+            continue
+        old, new = before["results"][name]["seconds"], result["seconds"]
+        print(f"{name:<70} {old:>12.4f} {new:>12.4f} {old / new if new > 0 else 0.0:>7.2f}x")
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Benchmark CantoneseDetector on a synthetic corpus.')
+    argparser.add_argument('--output', type=str, default=None,
+                           help='Write the results as JSON to this file. Default is stdout.')
+    argparser.add_argument('--documents', type=int, default=5000)
+    argparser.add_argument('--seed', type=int, default=0)
+    argparser.add_argument('--canto-density', type=float, default=0.05)
+    argparser.add_argument('--swc-density', type=float, default=0.05)
+    argparser.add_argument('--quote-density', type=float, default=0.1)
+    argparser.add_argument('--repeat', type=int, default=3)
+    argparser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                           help='Compare two result files instead of running the benchmarks.')
+    argparser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET,
+                           help=f'Fail if importing the package takes longer than this many seconds. Default is {IMPORT_BUDGET}.')
+    argparser.add_argument('--import-only', action='store_true', default=False,
+                           help='Only measure the import time and the cold start.')
+    args = argparser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    startup = import_times(max(args.repeat, 5))
+    sys.stderr.write(f"import: {startup['import'] * 1000:.1f} ms (budget {args.import_budget * 1000:.1f} ms), "
+                     f"cold start: {startup['cold_start'] * 1000:.1f} ms\n")
+    over_budget = startup["import"] > args.import_budget
+    if args.import_only:
+        if over_budget:
+            sys.exit(f"Import time {startup['import']:.4f} s is over the budget of {args.import_budget:.4f} s")
+        return
+
+    corpus_parameters = {
+        "documents": args.documents,
+        "seed": args.seed,
+        "canto_density": args.canto_density,
+        "swc_density": args.swc_density,
+        "quote_density": args.quote_density,
+    }
+    corpus = generate_corpus(**corpus_parameters)
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": sys.version,
+            "platform": platform.platform(),
+            "corpus": corpus_parameters,
+            "corpus_chars": sum(len(document) for document in corpus),
+            "repeat": args.repeat,
+        },
+        "results": run_benchmarks(corpus, args.repeat),
+    }
+    for name, seconds in startup.items():
+        report["results"][f"startup:{name}"] = {"seconds": seconds}
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if over_budget:
+        sys.exit(f"Import time {startup['import']:.4f} s is over the budget of {args.import_budget:.4f} s")
+
+
+if __name__ == '__main__':
+    main()
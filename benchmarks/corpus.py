@@ -0,0 +1,81 @@
+"""
+Reproducible synthetic corpora for the benchmarks.
+
+Documents are built from segments of neutral Han characters, into which Cantonese and SWC lexicon entries are
+inserted at a controlled density. Segments are joined with sentence delimiters, and some of them are put in quotes.
+The same parameters and seed always give the same corpus.
+"""
+import argparse
+import random
+from typing import List, Tuple
+
+from cantonesedetect.Detector import CANTO_FEATURE_RE, SWC_FEATURE_RE
+from cantonesedetect.FeatureScanner import _expand_pattern
+
+# Common characters that are neither Cantonese nor SWC features
+NEUTRAL_CHARS = "我你人大中國學校讀書今天明年時間工作朋友家庭電話城市公司老師學生問題開心重要方法生活世界社會經濟文化歷史"
+DELIMITERS = "，。？！"
+QUOTES = [("「", "」"), ("『", "』"), ("“", "”"), ("《", "》"), ("【", "】")]
+
+
+def generate_corpus(documents: int = 10000, seed: int = 0, segments: Tuple[int, int] = (1, 8), segment_length: Tuple[int, int] = (4, 30), canto_density: float = 0.05, swc_density: float = 0.05, quote_density: float = 0.1) -> List[str]:
+    """
+    Generate a synthetic corpus.
+
+    Args:
+        documents (int): Number of documents.
+        seed (int): Seed of the random generator.
+        segments (Tuple[int, int]): Minimum and maximum number of segments per document.
+        segment_length (Tuple[int, int]): Minimum and maximum number of characters per segment.
+        canto_density (float): Probability that a character position starts a Cantonese lexicon entry.
+        swc_density (float): Probability that a character position starts an SWC lexicon entry.
+        quote_density (float): Probability that a segment is put in quotes.
+
+    Returns:
+        List[str]: The documents.
+    """
+    rng = random.Random(seed)
+    canto_entries = _expand_pattern(CANTO_FEATURE_RE.pattern)
+    swc_entries = _expand_pattern(SWC_FEATURE_RE.pattern)
+
+    corpus: List[str] = []
+    for _ in range(documents):
+        parts: List[str] = []
+        for _ in range(rng.randint(*segments)):
+            length = rng.randint(*segment_length)
+            chars: List[str] = []
+            while len(chars) < length:
+                draw = rng.random()
+                if draw < canto_density:
+                    chars.extend(rng.choice(canto_entries))
+                elif draw < canto_density + swc_density:
+                    chars.extend(rng.choice(swc_entries))
+                else:
+                    chars.append(rng.choice(NEUTRAL_CHARS))
+            segment = "".join(chars)
+            if rng.random() < quote_density:
+                opening, closing = rng.choice(QUOTES)
+                segment = opening + segment + closing
+            parts.append(segment + rng.choice(DELIMITERS))
+        corpus.append("".join(parts))
+    return corpus
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Write a synthetic corpus, one document per line.')
+    argparser.add_argument('--output', type=str, required=True)
+    argparser.add_argument('--documents', type=int, default=10000)
+    argparser.add_argument('--seed', type=int, default=0)
+    argparser.add_argument('--canto-density', type=float, default=0.05)
+    argparser.add_argument('--swc-density', type=float, default=0.05)
+    argparser.add_argument('--quote-density', type=float, default=0.1)
+    args = argparser.parse_args()
+
+    corpus = generate_corpus(args.documents, args.seed, canto_density=args.canto_density,
+                             swc_density=args.swc_density, quote_density=args.quote_density)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        f.writelines(document + '\n' for document in corpus)
+
+
+if __name__ == '__main__':
+    main()
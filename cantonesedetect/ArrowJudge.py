@@ -0,0 +1,209 @@
+"""
+Judge a text column of Parquet or Arrow data, and add the judgement and the feature counts as new columns.
+
+The column is judged one record batch at a time. Each batch is dictionary-encoded by Arrow, so that only its
+distinct strings are converted to Python strings and judged, in chunks sent to a `JudgePool`. The results are
+built as Arrow arrays directly over the result buffers, and spread back to the rows with `take()`. Null texts get
+null results.
+
+Needs pyarrow, which is an optional dependency: pip install cantonesedetect[arrow]
+"""
+from array import array
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow is an optional dependency: pip install cantonesedetect[arrow]
+    pa = None
+
+from .ParallelJudge import JUDGEMENT_CODES, JUDGEMENTS, JudgePool, chunked
+
+# The columns added to every batch. The judgement is dictionary-encoded with the values of `JudgementType`, and the
+# counts are the sums over the segments of the document, as int32.
+OUTPUT_COLUMNS: Tuple[str, ...] = ("judgement", "canto_feature_count", "swc_feature_count", "han_length")
+
+DEFAULT_BATCH_SIZE = 65536
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError("Judging Parquet and Arrow data needs pyarrow: pip install cantonesedetect[arrow]")
+
+
+def _judge_texts(detector, texts: List[str]) -> Tuple[bytes, array, array, array]:
+    """
+    Judge a chunk of texts with the detector of the worker, and return their judgement codes with their net
+    Cantonese and SWC feature counts and Han lengths.
+    """
+    codes = bytearray()
+    canto_counts, swc_counts, han_lengths = array("i"), array("i"), array("i")
+    for text in texts:
+        judgement, canto_count, swc_count, han_length = detector._judge_with_counts(text)
+        codes.append(JUDGEMENT_CODES[judgement])
+        canto_counts.append(canto_count)
+        swc_counts.append(swc_count)
+        han_lengths.append(han_length)
+    return bytes(codes), canto_counts, swc_counts, han_lengths
+
+
+def output_schema(schema: "pa.Schema", column: str) -> "pa.Schema":
+    """
+    Return the schema of the batches with the judgement columns added.
+
+    Raises:
+        KeyError: If the text column is not in the schema.
+        ValueError: If the schema already has one of `OUTPUT_COLUMNS`.
+    """
+    _require_pyarrow()
+    if schema.get_field_index(column) < 0:
+        raise KeyError(f"No column {column!r}, the columns are {schema.names}")
+    for name in OUTPUT_COLUMNS:
+        if schema.get_field_index(name) >= 0:
+            raise ValueError(f"The input already has a {name!r} column")
+    schema = schema.append(pa.field(OUTPUT_COLUMNS[0], pa.dictionary(pa.int8(), pa.string())))
+    for name in OUTPUT_COLUMNS[1:]:
+        schema = schema.append(pa.field(name, pa.int32()))
+    return schema
+
+
+def _distinct_texts(column: "pa.Array") -> Tuple["pa.Array", List[str]]:
+    """
+    Return the index of each row in the distinct texts of a column, and the distinct texts. Rows that are null, or
+    whose dictionary value is null, get a null index.
+
+    Raises:
+        TypeError: If the column does not hold strings.
+    """
+    if not pa.types.is_dictionary(column.type):
+        column = column.dictionary_encode()
+    value_type = column.type.value_type
+    if not (pa.types.is_string(value_type) or pa.types.is_large_string(value_type)):
+        raise TypeError(f"The text column must hold strings, not {value_type}")
+
+    indices, dictionary = column.indices, column.dictionary
+    texts = dictionary.to_pylist()
+    if dictionary.null_count:
+        # A dictionary may hold nulls: their rows are null texts, and the null values are judged as empty strings
+        import pyarrow.compute as pc
+        null_positions = [position for position, text in enumerate(texts) if text is None]
+        indices = pc.if_else(pc.is_in(indices, pa.array(null_positions, indices.type)),
+                             pa.scalar(None, indices.type), indices)
+        texts = [text if text is not None else "" for text in texts]
+    return indices, texts
+
+
+def _result_arrays(indices: "pa.Array", results: List[Tuple[bytes, array, array, array]]) -> List["pa.Array"]:
+    """
+    Build the judgement columns of a batch from the results of its distinct texts.
+    """
+    codes = b"".join(result[0] for result in results)
+    columns = [pa.Array.from_buffers(pa.int8(), len(codes), [None, pa.py_buffer(codes)]).take(indices)]
+    for position in range(1, 4):
+        values = array("i")
+        for result in results:
+            values += result[position]
+        columns.append(pa.Array.from_buffers(pa.int32(), len(values), [None, pa.py_buffer(values)]).take(indices))
+    columns[0] = pa.DictionaryArray.from_arrays(columns[0], pa.array([judgement.value for judgement in JUDGEMENTS]))
+    return columns
+
+
+def judge_record_batches(pool: JudgePool, batches: Iterable["pa.RecordBatch"], column: str, chunksize: int = 1024, max_pending: Optional[int] = None) -> Iterator["pa.RecordBatch"]:
+    """
+    Judge the text column of record batches, and yield each batch with the `OUTPUT_COLUMNS` added, in order.
+
+    The distinct texts of the batches are judged in chunks by the pool, with up to `max_pending` chunks in
+    flight, so later batches are read while earlier ones are judged.
+
+    Args:
+        pool (JudgePool): The pool judging the chunks. Its config gives `split_seg`, `use_quotes` and the thresholds.
+        batches (Iterable[pa.RecordBatch]): The input batches. Consumed lazily.
+        column (str): The name of the text column.
+        chunksize (int): The number of distinct texts sent to a worker at a time.
+        max_pending (int): The maximum number of chunks submitted but not yet yielded.
+
+    Yields:
+        pa.RecordBatch: The batches with the judgement columns.
+    """
+    _require_pyarrow()
+    # Each batch with the index of its rows in its distinct texts, its number of chunks and their results
+    plans: Deque[Tuple[Any, Any, int, List]] = deque()
+
+    def tasks() -> Iterator[Tuple[List[str]]]:
+        for batch in batches:
+            indices, texts = _distinct_texts(batch.column(column))
+            # Even a batch without texts has one chunk, so that it is yielded in its turn
+            chunks = list(chunked(texts, chunksize)) or [[]]
+            plans.append((batch, indices, len(chunks), []))
+            for chunk in chunks:
+                yield (chunk,)
+
+    schemas: Dict[Any, Any] = {}
+    for _, result in pool.map_ordered(_judge_texts, tasks(), max_pending):
+        batch, indices, chunk_count, results = plans[0]
+        results.append(result)
+        if len(results) < chunk_count:
+            continue
+        plans.popleft()
+        if batch.schema not in schemas:
+            schemas[batch.schema] = output_schema(batch.schema, column)
+        yield pa.RecordBatch.from_arrays(batch.columns + _result_arrays(indices, results),
+                                         schema=schemas[batch.schema])
+
+
+def read_record_batches(path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Tuple["pa.Schema", Iterator["pa.RecordBatch"]]:
+    """
+    Open a Parquet file, if the path ends with `.parquet`, or an Arrow IPC file or stream, which is memory-mapped so
+    that its batches are read without copying.
+
+    Returns:
+        tuple: The schema of the file, and an iterator over its record batches.
+    """
+    _require_pyarrow()
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        return parquet_file.schema_arrow, parquet_file.iter_batches(batch_size=batch_size)
+
+    source = pa.memory_map(path)
+    try:
+        reader = pa.ipc.open_file(source)
+        return reader.schema, (reader.get_batch(index) for index in range(reader.num_record_batches))
+    except pa.ArrowInvalid:
+        source.seek(0)
+        reader = pa.ipc.open_stream(source)
+        return reader.schema, iter(reader)
+
+
+def judge_table_file(config: Dict[str, Any], path: str, output: str, column: str, workers: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE, chunksize: int = 1024, backend: str = "auto") -> int:
+    """
+    Judge the text column of a Parquet or Arrow file, and write it with the judgement columns to `output`, as Parquet
+    if its path ends with `.parquet`, otherwise as an Arrow IPC file.
+
+    Args:
+        config (dict): The detector config, see `CantoneseDetector._get_config()`.
+        path (str): The input file, see `read_record_batches()`.
+        output (str): The output file.
+        column (str): The name of the text column.
+        workers (int): Number of workers. 1 judges in the current process.
+        batch_size (int): The number of rows read at a time from Parquet.
+        chunksize (int): The number of distinct texts sent to a worker at a time.
+        backend (str): `"process"`, `"thread"` or `"auto"`, see `JudgePool`.
+
+    Returns:
+        int: The number of rows judged.
+    """
+    schema, batches = read_record_batches(path, batch_size)
+    schema = output_schema(schema, column)
+    if output.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(output, schema)
+    else:
+        writer = pa.ipc.new_file(output, schema)
+
+    rows = 0
+    with writer, JudgePool(config, workers, backend) as pool:
+        for batch in judge_record_batches(pool, batches, column, chunksize):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
@@ -0,0 +1,179 @@
+"""
+Judge documents from asyncio code without blocking the event loop.
+
+Concurrent `judge()` calls are put in a bounded queue. A batcher task takes the documents waiting in the queue,
+up to `max_batch_size` of them, and judges them as one batch in an executor, so the per-call overhead of the
+executor is paid once per batch. When the queue is full, `judge()` waits for room, which applies backpressure to
+the callers.
+"""
+import asyncio
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, AsyncIterable, AsyncIterator, Deque, Dict, Iterable, List, Optional, Tuple
+
+from .DocumentFeatures import DocumentFeatures
+from .JudgementTypes import JudgementType
+from .ParallelJudge import _judge_documents, decode_judgements
+
+# The detectors of a worker process of a `ProcessPoolExecutor`, by detector config
+_config_detectors: Dict[Tuple, Any] = {}
+
+
+def _judge_documents_with_config(config: Dict[str, Any], documents: List[str]) -> bytes | List[Tuple[JudgementType, DocumentFeatures]]:
+    """
+    `_judge_documents()` in a worker process, with a detector created once per config.
+    """
+    key = tuple(sorted(config.items()))
+    detector = _config_detectors.get(key)
+    if detector is None:
+        from .Detector import CantoneseDetector
+        detector = _config_detectors[key] = CantoneseDetector(**config)
+    return _judge_documents(detector, documents)
+
+
+class AsyncJudge:
+    """
+    Micro-batching asyncio front end of a detector.
+
+    Attributes:
+        detector (CantoneseDetector): The detector. In a `ProcessPoolExecutor`, each worker process creates its
+            own detector from its config.
+        executor (Executor): Where the batches are judged. Defaults to the default executor of the event loop.
+        max_batch_size (int): The maximum number of documents judged in one batch.
+        max_delay (float): Seconds to wait for more documents before judging a batch that is not full.
+        max_pending (int): The maximum number of documents waiting for a batch, and in flight in `judge_many()`.
+        max_concurrent_batches (int): The maximum number of batches judged at the same time.
+        batches (int): Number of batches judged so far.
+        documents (int): Number of documents judged so far.
+    """
+
+    def __init__(self, detector, executor: Optional[Executor] = None, max_batch_size: int = 64, max_delay: float = 0.001, max_pending: int = 1024, max_concurrent_batches: int = 1) -> None:
+        self.detector = detector
+        self.executor: Optional[Executor] = executor
+        self.max_batch_size: int = max_batch_size
+        self.max_delay: float = max_delay
+        self.max_pending: int = max_pending
+        self.max_concurrent_batches: int = max_concurrent_batches
+        self.batches: int = 0
+        self.documents: int = 0
+
+        # Bound to the event loop of the first call
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: set = set()
+
+    def _start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._batcher = loop.create_task(self._run())
+        elif self.loop is not loop:
+            raise RuntimeError("AsyncJudge is bound to another event loop")
+
+    async def judge(self, document: str) -> JudgementType | Tuple[JudgementType, DocumentFeatures]:
+        """
+        Judge a document in the next batch.
+
+        Args:
+            document (str): The document to be judged.
+
+        Returns:
+            The result of `detector.judge(document)`.
+        """
+        self._start()
+        future = self.loop.create_future()
+        await self._queue.put((document, future))
+        return await future
+
+    async def judge_many(self, documents: AsyncIterable[str] | Iterable[str]) -> AsyncIterator[JudgementType | Tuple[JudgementType, DocumentFeatures]]:
+        """
+        Judge documents from an async or a plain iterable, and yield the results in input order. At most
+        `max_pending` documents are in flight, so the documents are only read as fast as they are judged.
+        """
+        pending: Deque[asyncio.Task] = deque()
+        try:
+            if isinstance(documents, AsyncIterable):
+                async for document in documents:
+                    pending.append(asyncio.ensure_future(self.judge(document)))
+                    if len(pending) >= self.max_pending:
+                        yield await pending.popleft()
+            else:
+                for document in documents:
+                    pending.append(asyncio.ensure_future(self.judge(document)))
+                    if len(pending) >= self.max_pending:
+                        yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _run(self) -> None:
+        """
+        Take batches from the queue and judge them, while at most `max_concurrent_batches` are in flight.
+        """
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            if queue.qsize() < self.max_batch_size - 1 and self.max_delay > 0:
+                # Let concurrent callers join the batch
+                await asyncio.sleep(self.max_delay)
+            while len(batch) < self.max_batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            await self._slots.acquire()
+            task = self.loop.create_task(self._judge_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _judge_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        documents = [document for document, _ in batch]
+        try:
+            if isinstance(self.executor, ProcessPoolExecutor):
+                results = await self.loop.run_in_executor(
+                    self.executor, _judge_documents_with_config, self.detector._get_config(), documents)
+            else:
+                results = await self.loop.run_in_executor(self.executor, _judge_documents, self.detector, documents)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        if isinstance(results, bytes):
+            results = decode_judgements(results)
+        self.batches += 1
+        self.documents += len(documents)
+        for (_, future), result in zip(batch, results):
+            # The caller may have been cancelled
+            if not future.done():
+                future.set_result(result)
+
+    async def aclose(self) -> None:
+        """
+        Stop the batcher. Documents still waiting for a batch are cancelled, batches in flight are finished.
+        """
+        if self._batcher is None:
+            return
+        self._batcher.cancel()
+        try:
+            await self._batcher
+        except asyncio.CancelledError:
+            pass
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            future.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def __aenter__(self) -> "AsyncJudge":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
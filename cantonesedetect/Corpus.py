@@ -0,0 +1,227 @@
+"""
+Judge large line-delimited corpus files.
+
+The input file is memory-mapped and split into byte ranges that end on a newline, so each worker reads and decodes
+only its own range and no single reader process becomes the bottleneck. The output of the ranges is written in
+input order, either to one output stream or to one file per range.
+"""
+import io
+import json
+import mmap
+import os
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from .ParallelJudge import JudgePool
+from .Records import encode_columnar, write_jsonl, write_results
+
+# Size of the byte ranges judged by one task
+DEFAULT_RANGE_SIZE = 64 * 1024 * 1024
+
+
+def format_results(lines: List[str], results: List, print_analysis: bool) -> str:
+    """
+    Format the judgements of input lines as the CLI prints them, with the analysis if `print_analysis` is True.
+    """
+    output = io.StringIO()
+    write_results(output, lines, results, print_analysis)
+    return output.getvalue()
+
+
+def format_output(lines: List[str], results: List, print_analysis: bool, output_format: str = "text") -> bytes:
+    """
+    Encode the judgements of input lines in an output format of `Records.OUTPUT_FORMATS`.
+    """
+    if output_format == "columnar":
+        return encode_columnar(lines, results)
+    if output_format == "jsonl":
+        output = io.StringIO()
+        write_jsonl(output, lines, results)
+        return output.getvalue().encode('utf-8')
+    return format_results(lines, results, print_analysis).encode('utf-8')
+
+
+def split_byte_ranges(path: str, range_count: int, start: int = 0, end: Optional[int] = None) -> List[Tuple[int, int]]:
+    """
+    Split a file, or the part of it between `start` and `end`, into at most `range_count` byte ranges of about
+    the same size. Every range except the last one ends right after a newline, so no line is split between two ranges.
+
+    Args:
+        path (str): The file to split.
+        range_count (int): The number of ranges wanted.
+        start (int): The offset to start from, which must be the start of a line. Defaults to the start of the file.
+        end (int): The offset to stop at, which must be the end of a line. Defaults to the end of the file.
+
+    Returns:
+        List[Tuple[int, int]]: The `(start, end)` byte offsets of the non-empty ranges, in file order.
+    """
+    if end is None:
+        end = os.path.getsize(path)
+    if start >= end:
+        return []
+
+    ranges: List[Tuple[int, int]] = []
+    size = end - start
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        range_start = start
+        for index in range(1, range_count):
+            newline = mm.find(b'\n', max(range_start, start + size * index // range_count), end)
+            if newline == -1:
+                break
+            ranges.append((range_start, newline + 1))
+            range_start = newline + 1
+        if range_start < end:
+            ranges.append((range_start, end))
+    return ranges
+
+
+def read_range_lines(mm: mmap.mmap, start: int, end: int) -> List[str]:
+    """
+    Decode a byte range and split it into stripped lines, the same lines as iterating over the file in text mode.
+    """
+    text = mm[start:end].decode('utf-8')
+    if '\r' in text:
+        # Universal newlines, as in text mode
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    lines = text.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    return [line.strip() for line in lines]
+
+
+def _judge_range(detector, path: str, start: int, end: int, shard_path: Optional[str], output_format: str) -> bytes | int:
+    """
+    Judge the lines in a byte range of a file. The formatted output is returned as bytes, or written to
+    `shard_path` if given, in which case the number of lines is returned.
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        lines = read_range_lines(mm, start, end)
+
+    results = [detector.judge(line) for line in lines]
+    output = format_output(lines, results, detector.get_analysis, output_format)
+
+    if shard_path is None:
+        return output
+    with open(shard_path, 'wb') as shard:
+        shard.write(output)
+    return len(lines)
+
+
+def judge_file(config: Dict[str, Any], path: str, output: Optional[BinaryIO] = None, shard_output: Optional[str] = None, workers: Optional[int] = None, range_size: int = DEFAULT_RANGE_SIZE, start: int = 0, end: Optional[int] = None, output_format: str = "text", backend: str = "auto") -> Iterator[Tuple[int, int]]:
+    """
+    Judge every line of a file, or of the part between `start` and `end`, in parallel byte ranges.
+
+    Args:
+        config (dict): The keyword arguments of the `CantoneseDetector` used by the workers.
+        path (str): The input file, one document per line.
+        output (BinaryIO): The stream where the results of all ranges are written in order.
+        shard_output (str): If given instead of `output`, the results of range `i` are written by the worker
+            to the file `f"{shard_output}.{i:05d}"`.
+        workers (int): Number of workers. Defaults to the number of CPUs.
+        range_size (int): Approximate size in bytes of the range judged by one task.
+        start (int): The offset of the first line to judge. Defaults to the start of the file.
+        end (int): The offset after the last line to judge. Defaults to the end of the file.
+        output_format (str): `"text"`, `"jsonl"` or `"columnar"`, see `format_output()`.
+        backend (str): `"process"`, `"thread"` or `"auto"`, see `JudgePool`.
+
+    Yields:
+        tuple: The `(start, end)` byte offsets of every range once its results are written, in file order.
+    """
+    assert (output is None) != (shard_output is None), "Exactly one of `output` and `shard_output` is needed"
+
+    if end is None:
+        end = os.path.getsize(path)
+    range_count = max(1, -(-(end - start) // range_size))
+    ranges = split_byte_ranges(path, range_count, start, end)
+    tasks = ((path, start, end, None if shard_output is None else f"{shard_output}.{index:05d}", output_format)
+             for index, (start, end) in enumerate(ranges))
+
+    with JudgePool(config, workers, backend) as pool:
+        for (_, start, end, _, _), result in pool.map_ordered(_judge_range, tasks):
+            if output is not None:
+                output.write(result)
+            yield start, end
+
+
+def _write_checkpoint(checkpoint_path: str, checkpoint: Dict[str, Any]) -> None:
+    """
+    Replace the checkpoint file atomically, so that a crash never leaves a partial checkpoint behind.
+    """
+    temp_path = checkpoint_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, checkpoint_path)
+
+
+def run_job(config: Dict[str, Any], path: str, output_path: str, shard_index: int = 0, shard_count: int = 1, checkpoint_path: Optional[str] = None, workers: Optional[int] = None, range_size: int = DEFAULT_RANGE_SIZE, output_format: str = "text", backend: str = "auto") -> Dict[str, Any]:
+    """
+    Judge one shard of a file into an output file, writing a checkpoint after every byte range so that the job
+    can be resumed after a crash without duplicating or dropping lines.
+
+    The file is split into `shard_count` newline-aligned shards, which only depends on the content of the file, so
+    every node computes the same shards. The checkpoint records the input offset up to which the output is complete
+    and the size of the output at that point. On resume, the output is truncated to that size, which drops any
+    results written after the last checkpoint, and judging restarts from that input offset.
+
+    Args:
+        config (dict): The keyword arguments of the `CantoneseDetector` used by the workers.
+        path (str): The input file, one document per line.
+        output_path (str): The output file of this shard.
+        shard_index (int): The index of the shard to judge, from 0 to `shard_count - 1`.
+        shard_count (int): The number of shards the file is split into.
+        checkpoint_path (str): The checkpoint file. Defaults to `f"{output_path}.checkpoint"`.
+        workers (int): Number of workers. Defaults to the number of CPUs.
+        range_size (int): Approximate size in bytes of the range judged between two checkpoints.
+        output_format (str): `"text"`, `"jsonl"` or `"columnar"`, see `format_output()`.
+        backend (str): `"process"`, `"thread"` or `"auto"`, see `JudgePool`.
+
+    Returns:
+        dict: The final checkpoint.
+    """
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Shard index {shard_index} is out of range for {shard_count} shards")
+    checkpoint_path = checkpoint_path or output_path + '.checkpoint'
+
+    shards = split_byte_ranges(path, shard_count)
+    size = os.path.getsize(path)
+    # A file with fewer lines than shards has empty shards at the end.
+    shard_start, shard_end = shards[shard_index] if shard_index < len(shards) else (size, size)
+
+    checkpoint: Dict[str, Any] = {
+        "input": os.path.abspath(path),
+        "input_size": size,
+        "shard_index": shard_index,
+        "shard_count": shard_count,
+        "start": shard_start,
+        "end": shard_end,
+        "config": config,
+        "format": output_format,
+        "input_offset": shard_start,
+        "output_offset": 0,
+    }
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, encoding='utf-8') as f:
+            saved = json.load(f)
+        # Checkpoints written before the output formats were added are text jobs
+        saved.setdefault("format", "text")
+        for key in ("input", "input_size", "shard_index", "shard_count", "start", "end", "config", "format"):
+            if saved.get(key) != checkpoint[key]:
+                raise ValueError(
+                    f"Checkpoint {checkpoint_path} belongs to another job: {key} is {saved.get(key)!r}, expected {checkpoint[key]!r}")
+        checkpoint = saved
+
+    with open(output_path, 'r+b' if os.path.exists(output_path) else 'wb') as output:
+        output.truncate(checkpoint["output_offset"])
+        output.seek(checkpoint["output_offset"])
+        for _, range_end in judge_file(config, path, output=output, workers=workers, range_size=range_size,
+                                       start=checkpoint["input_offset"], end=shard_end, output_format=output_format,
+                                       backend=backend):
+            output.flush()
+            os.fsync(output.fileno())
+            checkpoint["input_offset"] = range_end
+            checkpoint["output_offset"] = output.tell()
+            _write_checkpoint(checkpoint_path, checkpoint)
+
+    _write_checkpoint(checkpoint_path, checkpoint)
+    return checkpoint
@@ -0,0 +1,294 @@
+"""
+Mergeable statistics of a corpus, collected while judging it.
+
+`CorpusStats` counts the documents of each judgement, the segments of each judgement by Han length, and how many
+times every literal of the four lexicons matches: which Cantonese and SWC features fire, and how often each
+exclusion cancels a feature. The literals come from the lexicons, and segment lengths are grouped in powers of two,
+so the memory does not grow with the corpus.
+
+Statistics collected by separate workers or machines are combined with `merge()`, and saved as a compact binary
+block or as JSON.
+"""
+import json
+import sys
+import zlib
+from array import array
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .FeatureScanner import CANTO_EXCLUDE, CANTO_FEATURE, SWC_EXCLUDE, SWC_FEATURE, _expand_pattern
+from .JudgementTypes import JudgementType
+from .ParallelJudge import JUDGEMENT_CODES, JUDGEMENTS, JudgePool, decode_judgements, encode_judgements
+
+MAGIC = b"CDST1\n"
+
+LEXICONS: Tuple[Tuple[str, int], ...] = (
+    ("canto_feature", CANTO_FEATURE),
+    ("canto_exclude", CANTO_EXCLUDE),
+    ("swc_feature", SWC_FEATURE),
+    ("swc_exclude", SWC_EXCLUDE),
+)
+
+# Segments of Han length `n` are counted in bucket `n.bit_length()`: 0, 1, 2-3, 4-7, ..., and the last bucket
+# holds all the longer ones.
+LENGTH_BUCKETS = 17
+
+
+def length_bucket_range(bucket: int) -> Tuple[int, Optional[int]]:
+    """
+    Return the smallest and the largest Han length counted in a bucket, None for the last bucket.
+    """
+    if bucket == 0:
+        return 0, 0
+    return 1 << (bucket - 1), None if bucket == LENGTH_BUCKETS - 1 else (1 << bucket) - 1
+
+
+@lru_cache(maxsize=None)
+def _lexicon_literals() -> Tuple[Tuple[Tuple[str, ...], Dict[str, int]], ...]:
+    """
+    Return the distinct literals of each lexicon, in the order of its regex, with their indices.
+    """
+    from .Detector import FEATURE_SCANNER
+    lexicons = []
+    for pattern in FEATURE_SCANNER.patterns:
+        literals = tuple(dict.fromkeys(_expand_pattern(pattern.pattern)))
+        lexicons.append((literals, {literal: index for index, literal in enumerate(literals)}))
+    return tuple(lexicons)
+
+
+def _lexicon_key() -> int:
+    # Statistics of different lexicons count different literals, so they cannot be merged
+    return zlib.crc32("\n".join("|".join(literals) for literals, _ in _lexicon_literals()).encode("utf-8"))
+
+
+class CorpusStats:
+    """
+    Histograms of the judgements and of the lexicon matches of a corpus.
+
+    Attributes:
+        documents (array): Number of documents of each judgement, by judgement code, see `ParallelJudge.JUDGEMENTS`.
+        segment_lengths (array): Number of segments of each judgement in each length bucket, at
+            `bucket * len(JUDGEMENTS) + code`.
+        matches (List[array]): For each lexicon of `LEXICONS`, the number of matches of each of its literals.
+    """
+
+    def __init__(self) -> None:
+        self.documents: array = array("q", bytes(8 * len(JUDGEMENTS)))
+        self.segment_lengths: array = array("q", bytes(8 * LENGTH_BUCKETS * len(JUDGEMENTS)))
+        self.matches: List[array] = [array("q", bytes(8 * len(literals))) for literals, _ in _lexicon_literals()]
+        # The config and the detector of `_get_counting_detector()`
+        self._counting: Optional[Tuple[Dict[str, Any], Any]] = None
+
+    def judge(self, detector, document: str) -> JudgementType:
+        """
+        Judge a document as `detector.judge()` without analysis, and count it.
+
+        The document is judged by a detector with the same config, without early exit or segment cache so that every
+        segment is counted, whose feature counting and segment judging hooks also update these statistics.
+
+        Args:
+            detector (CantoneseDetector): The detector. Its `split_seg`, `use_quotes` and thresholds are used.
+            document (str): The document to be judged.
+
+        Returns:
+            JudgementType: The judgement of the document.
+        """
+        judgement = self._get_counting_detector(detector).judge(document)
+        self.documents[JUDGEMENT_CODES[judgement]] += 1
+        return judgement
+
+    def _get_counting_detector(self, detector):
+        """
+        Return a detector configured as `detector`, whose hooks count the literals and segments into these statistics.
+        It is kept for the next documents judged with the same config.
+        """
+        config = {**detector._get_config(), "get_analysis": False, "cache_size": 0, "early_exit": False}
+        if self._counting is not None and self._counting[0] == config:
+            return self._counting[1]
+
+        from .Detector import FEATURE_SCANNER, CantoneseDetector
+        find_offsets = FEATURE_SCANNER.find_offsets
+        literal_indices = [indices for _, indices in _lexicon_literals()]
+        lexicon_matches = self.matches
+        segment_lengths = self.segment_lengths
+        judgement_count = len(JUDGEMENTS)
+        counting = CantoneseDetector(**config)
+        judge_segment_counts = counting._judge_segment_counts
+
+        def count_features(text: str) -> Tuple[int, int, int]:
+            matches = array("i")
+            han_length = find_offsets(text, matches)
+            counts = [0, 0, 0, 0]
+            for lexicon, start, end in zip(*[iter(matches)] * 3):
+                counts[lexicon] += 1
+                lexicon_matches[lexicon][literal_indices[lexicon][text[start:end]]] += 1
+            return counts[CANTO_FEATURE] - counts[CANTO_EXCLUDE], counts[SWC_FEATURE] - counts[SWC_EXCLUDE], han_length
+
+        def counted_judge_segment_counts(canto_feature_count: int, swc_feature_count: int, segment_length: int) -> JudgementType:
+            segment_judgement = judge_segment_counts(canto_feature_count, swc_feature_count, segment_length)
+            bucket = min(segment_length.bit_length(), LENGTH_BUCKETS - 1)
+            segment_lengths[bucket * judgement_count + JUDGEMENT_CODES[segment_judgement]] += 1
+            return segment_judgement
+
+        counting._count_features = count_features
+        counting._judge_segment_counts = counted_judge_segment_counts
+        self._counting = (config, counting)
+        return counting
+
+    def imap(self, pool: JudgePool, chunks: Iterable[List[str]], max_pending: Optional[int] = None) -> Iterator[Tuple[List[str], List[JudgementType]]]:
+        """
+        `pool.imap()` without analysis, that also counts the chunks. Each worker collects the statistics of its
+        chunk, which are merged into these statistics as the results are yielded.
+        """
+        for (chunk,), (codes, stats) in pool.map_ordered(_judge_documents_with_stats, ((chunk,) for chunk in chunks), max_pending):
+            self.merge(stats)
+            yield chunk, decode_judgements(codes)
+
+    def merge(self, other: "CorpusStats") -> "CorpusStats":
+        """
+        Add the counts of `other` to these statistics.
+
+        Returns:
+            CorpusStats: These statistics.
+        """
+        for name in ("documents", "segment_lengths"):
+            counts, other_counts = getattr(self, name), getattr(other, name)
+            for index, count in enumerate(other_counts):
+                counts[index] += count
+        for counts, other_counts in zip(self.matches, other.matches):
+            for index, count in enumerate(other_counts):
+                if count:
+                    counts[index] += count
+        return self
+
+    @classmethod
+    def merged(cls, stats: Iterable["CorpusStats"]) -> "CorpusStats":
+        """
+        Return the sum of many statistics.
+        """
+        total = cls()
+        for item in stats:
+            total.merge(item)
+        return total
+
+    def markers(self, lexicon: int) -> Dict[str, int]:
+        """
+        Return the literals of a lexicon that matched, with their counts, most frequent first.
+        """
+        literals, _ = _lexicon_literals()[lexicon]
+        return dict(sorted(((literal, count) for literal, count in zip(literals, self.matches[lexicon]) if count),
+                           key=lambda item: -item[1]))
+
+    def to_json(self) -> Dict[str, Any]:
+        """
+        Return the statistics as a JSON-serializable dict, with the judgement and literal names spelled out.
+        """
+        segment_lengths = []
+        for bucket in range(LENGTH_BUCKETS):
+            low, high = length_bucket_range(bucket)
+            counts = self.segment_lengths[bucket * len(JUDGEMENTS):(bucket + 1) * len(JUDGEMENTS)]
+            if any(counts):
+                segment_lengths.append({"min_han_length": low, "max_han_length": high,
+                                        **{judgement.value: count for judgement, count in zip(JUDGEMENTS, counts) if count}})
+        return {
+            "documents": {judgement.value: count for judgement, count in zip(JUDGEMENTS, self.documents)},
+            "segment_lengths": segment_lengths,
+            **{name: self.markers(lexicon) for name, lexicon in LEXICONS},
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "CorpusStats":
+        """
+        Read statistics written by `to_json()`.
+        """
+        stats = cls()
+        for judgement, count in data["documents"].items():
+            stats.documents[JUDGEMENT_CODES[JudgementType(judgement)]] = count
+        for row in data["segment_lengths"]:
+            bucket = min(row["min_han_length"].bit_length(), LENGTH_BUCKETS - 1)
+            for judgement in JUDGEMENTS:
+                stats.segment_lengths[bucket * len(JUDGEMENTS) + JUDGEMENT_CODES[judgement]] = row.get(judgement.value, 0)
+        for name, lexicon in LEXICONS:
+            _, indices = _lexicon_literals()[lexicon]
+            for literal, count in data[name].items():
+                if literal not in indices:
+                    raise ValueError(f"{literal!r} is not a literal of {name} in this version of the lexicons")
+                stats.matches[lexicon][indices[literal]] = count
+        return stats
+
+    def to_bytes(self) -> bytes:
+        """
+        Encode the statistics as the magic line, a JSON header line, then the raw little-endian counts.
+        """
+        arrays = [self.documents, self.segment_lengths] + self.matches
+        header = {"lexicons": _lexicon_key(), "lengths": [len(values) for values in arrays]}
+        block = bytearray(MAGIC)
+        block += json.dumps(header).encode("utf-8") + b"\n"
+        for values in arrays:
+            if sys.byteorder == "big":
+                values = array(values.typecode, values)
+                values.byteswap()
+            block += values.tobytes()
+        return bytes(block)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CorpusStats":
+        """
+        Decode statistics encoded by `to_bytes()` with the same lexicons.
+        """
+        if not data.startswith(MAGIC):
+            raise ValueError("Not a corpus statistics block")
+        header_end = data.index(b"\n", len(MAGIC)) + 1
+        header = json.loads(data[len(MAGIC):header_end])
+        if header["lexicons"] != _lexicon_key():
+            raise ValueError("The statistics were collected with other lexicons")
+
+        stats = cls()
+        arrays = [stats.documents, stats.segment_lengths] + stats.matches
+        position = header_end
+        for values, length in zip(arrays, header["lengths"]):
+            if length != len(values):
+                raise ValueError("The statistics were collected with other lexicons")
+            values[:] = array("q", data[position:position + 8 * length])
+            if sys.byteorder == "big":
+                values.byteswap()
+            position += 8 * length
+        return stats
+
+    def save(self, path: str) -> None:
+        """
+        Save the statistics as JSON if the path ends with `.json`, otherwise as binary.
+        """
+        if path.endswith(".json"):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.to_json(), f, ensure_ascii=False, indent=2)
+        else:
+            with open(path, "wb") as f:
+                f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "CorpusStats":
+        """
+        Load statistics saved by `save()`.
+        """
+        if path.endswith(".json"):
+            with open(path, encoding="utf-8") as f:
+                return cls.from_json(json.load(f))
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The counting detector holds closures, and is rebuilt on demand
+        return {**self.__dict__, "_counting": None}
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, CorpusStats) and self.documents == other.documents and \
+            self.segment_lengths == other.segment_lengths and self.matches == other.matches
+
+
+def _judge_documents_with_stats(detector, documents: List[str]) -> Tuple[bytes, CorpusStats]:
+    """
+    Judge a chunk of documents in a worker, and return the packed judgements with the statistics of the chunk.
+    """
+    stats = CorpusStats()
+    return encode_judgements([stats.judge(detector, document) for document in documents]), stats
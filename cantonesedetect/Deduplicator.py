@@ -0,0 +1,232 @@
+"""
+Skip exact duplicate lines of a corpus before they are judged.
+
+Each line is hashed as it is judged, i.e. after stripping, so two lines with the same hash always get the same
+judgement. Only the first occurrence of a line is sent to the workers: later copies either reuse its judgement, or
+are dropped from the output.
+
+The seen-set keeps one small entry per distinct line. Beyond `max_entries` entries, the oldest entries are either
+forgotten, so that their duplicates are judged again, or spilled to an SQLite file in `spill_dir`.
+
+Without `spill_dir`, the deduplication is only exact within the memory window: in `"drop"` mode a line whose entry
+was forgotten is written again when it comes back. Entries are spilled at the moment they leave memory, so with
+`spill_dir` every line is written at most once.
+"""
+import hashlib
+import os
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .JudgementTypes import JudgementType
+from .ParallelJudge import JUDGEMENT_CODES, JUDGEMENTS, JudgePool
+
+DEDUP_MODES: Tuple[str, ...] = ("reuse", "drop")
+
+DEFAULT_MAX_ENTRIES = 1_000_000
+
+# Code of a line sent to the workers whose result has not come back yet
+_PENDING = -1
+
+
+def line_digest(line: str) -> bytes:
+    """
+    Return the 128-bit hash of a line.
+    """
+    return hashlib.blake2b(line.encode("utf-8"), digest_size=16).digest()
+
+
+class SeenSet:
+    """
+    A map from line hashes to the code of their result, with at most `max_entries` entries in memory.
+
+    Attributes:
+        max_entries (int): The maximum number of entries in memory.
+        spill_dir (str): If given, entries beyond `max_entries` are moved to an SQLite file in this directory
+            instead of being forgotten. The file is deleted by `close()`.
+        evicted (int): Number of entries forgotten.
+        spilled (int): Number of entries moved to disk.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, spill_dir: Optional[str] = None) -> None:
+        self.max_entries: int = max_entries
+        self.spill_dir: Optional[str] = spill_dir
+        self.evicted: int = 0
+        self.spilled: int = 0
+        self._memory: Dict[bytes, int] = {}
+        self._database = None
+        self._path: Optional[str] = None
+
+    def get(self, digest: bytes) -> Optional[int]:
+        """
+        Return the code stored for a hash, `_PENDING` if its result is not known yet, or None if it is not seen.
+        """
+        code = self._memory.get(digest)
+        if code is None and self._database is not None:
+            row = self._database.execute("SELECT code FROM seen WHERE digest = ?", (digest,)).fetchone()
+            if row is not None:
+                code = row[0]
+        return code
+
+    def set(self, digest: bytes, code: int) -> None:
+        self._memory[digest] = code
+        if len(self._memory) > self.max_entries:
+            self._shrink()
+
+    def _shrink(self) -> None:
+        """
+        Spill or forget the oldest entries whose result is known, down to three quarters of `max_entries`, so that
+        the cost is paid once every many insertions.
+        """
+        excess = len(self._memory) - self.max_entries * 3 // 4
+        oldest = []
+        for digest, code in self._memory.items():
+            if len(oldest) >= excess:
+                break
+            if code != _PENDING:
+                oldest.append((digest, code))
+
+        if self.spill_dir is not None:
+            if self._database is None:
+                import sqlite3
+                import tempfile
+                fd, self._path = tempfile.mkstemp(dir=self.spill_dir, prefix="cantonesedetect-seen-", suffix=".sqlite")
+                os.close(fd)
+                self._database = sqlite3.connect(self._path)
+                self._database.execute("PRAGMA journal_mode = OFF")
+                self._database.execute("PRAGMA synchronous = OFF")
+                self._database.execute("CREATE TABLE seen (digest BLOB PRIMARY KEY, code INTEGER) WITHOUT ROWID")
+            self._database.executemany("INSERT OR REPLACE INTO seen VALUES (?, ?)", oldest)
+            self.spilled += len(oldest)
+        else:
+            self.evicted += len(oldest)
+        for digest, _ in oldest:
+            del self._memory[digest]
+
+    def close(self) -> None:
+        if self._database is not None:
+            self._database.close()
+            self._database = None
+            os.unlink(self._path)
+
+    def __len__(self) -> int:
+        return len(self._memory) + self.spilled
+
+
+class Deduplicator:
+    """
+    Wrap the judging of a `JudgePool` so that only the first copy of every line is judged.
+
+    Attributes:
+        mode (str): `"reuse"` to output duplicates with the judgement of their first copy, `"drop"` to leave them
+            out of the output. Without `spill_dir`, `"drop"` only leaves out the copies of lines still in memory.
+        seen (SeenSet): The hashes of the lines seen so far, with their results.
+        lines (int): Number of input lines.
+        duplicates (int): Number of input lines that were copies of an earlier line.
+        rejudged (int): Number of duplicates judged again because their first copy was forgotten.
+    """
+
+    def __init__(self, mode: str = "reuse", max_entries: int = DEFAULT_MAX_ENTRIES, spill_dir: Optional[str] = None) -> None:
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"Unknown deduplication mode: {mode}")
+        self.mode: str = mode
+        self.seen: SeenSet = SeenSet(max_entries, spill_dir)
+        self.lines: int = 0
+        self.duplicates: int = 0
+        self.rejudged: int = 0
+        self._detector = None
+
+    def imap(self, pool: JudgePool, chunks: Iterable[List[str]], max_pending: Optional[int] = None) -> Iterator[Tuple[List[str], List[JudgementType]]]:
+        """
+        `pool.imap()` over the lines not seen before. Yields each input chunk with its judgements, in input order,
+        without the duplicates in `"drop"` mode.
+        """
+        if self.mode == "reuse" and pool.config.get("get_analysis"):
+            raise ValueError("Duplicates can only reuse judgements without analysis")
+        return self._deduplicate(
+            pool.config, chunks, lambda unique: pool.imap(unique, max_pending),
+            JUDGEMENT_CODES.__getitem__, JUDGEMENTS.__getitem__, lambda detector, line: detector.judge(line), list)
+
+    def ifilter(self, pool: JudgePool, chunks: Iterable[List[str]], target: str, max_pending: Optional[int] = None) -> Iterator[Tuple[List[str], bytes]]:
+        """
+        `pool.ifilter()` over the lines not seen before. Yields each input chunk with one byte per line, in input
+        order, without the duplicates in `"drop"` mode.
+        """
+        return self._deduplicate(
+            pool.config, chunks, lambda unique: pool.ifilter(unique, target, max_pending), int, int,
+            lambda detector, line: getattr(detector, f"is_{target}")(line), bytes)
+
+    def _deduplicate(self, config: Dict[str, Any], chunks: Iterable[List[str]], run: Callable, to_code: Callable, from_code: Callable, judge: Callable, collect: Callable) -> Iterator[Tuple[List[str], Any]]:
+        """
+        Send the new lines of every chunk to `run`, and merge its results back with the duplicates.
+
+        Args:
+            config (dict): The detector config, to judge duplicates whose first copy was forgotten.
+            chunks (Iterable[List[str]]): The input chunks.
+            run (Callable): Maps an iterable of chunks of new lines to `(chunk, results)` in order.
+            to_code, from_code (Callable): Convert a result to the int stored in the seen-set and back.
+            judge (Callable): `judge(detector, line)` gives the result of one line in this process.
+            collect (Callable): Builds the results of a chunk from a list.
+        """
+        plans: Deque[List[Tuple[str, bytes, bool]]] = deque()
+
+        def new_lines() -> Iterator[List[str]]:
+            for chunk in chunks:
+                plan = []
+                for line in chunk:
+                    digest = line_digest(line)
+                    new = self.seen.get(digest) is None
+                    if new:
+                        self.seen.set(digest, _PENDING if self.mode == "reuse" else 0)
+                    plan.append((line, digest, new))
+                plans.append(plan)
+                yield [line for line, _, new in plan if new]
+
+        for _, results in run(new_lines()):
+            plan = plans.popleft()
+            results = iter(results)
+            lines, merged = [], []
+            for line, digest, new in plan:
+                self.lines += 1
+                if new:
+                    result = next(results)
+                    if self.mode == "reuse":
+                        self.seen.set(digest, to_code(result))
+                elif self.mode == "drop":
+                    self.duplicates += 1
+                    continue
+                else:
+                    self.duplicates += 1
+                    code = self.seen.get(digest)
+                    if code is None or code == _PENDING:
+                        result = judge(self._get_detector(config), line)
+                        self.rejudged += 1
+                    else:
+                        result = from_code(code)
+                lines.append(line)
+                merged.append(result)
+            yield lines, collect(merged)
+
+    def _get_detector(self, config: Dict[str, Any]):
+        if self._detector is None:
+            from .Detector import CantoneseDetector
+            self._detector = CantoneseDetector(**config)
+        return self._detector
+
+    def report(self) -> str:
+        """
+        Return a one-line summary of the duplicates found.
+        """
+        ratio = self.duplicates / self.lines if self.lines else 0.0
+        action = "reused" if self.mode == "reuse" else "dropped"
+        return (f"Lines: {self.lines}, duplicates: {self.duplicates} ({ratio:.1%}) {action}, "
+                f"distinct lines forgotten: {self.seen.evicted}, spilled to disk: {self.seen.spilled}, "
+                f"duplicates judged again: {self.rejudged}\n")
+
+    def close(self) -> None:
+        self.seen.close()
+
+    def __enter__(self) -> "Deduplicator":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -5,16 +5,28 @@ Core logic:
 3. If get_analysis is true, print the Cantonese and SWC ratio to I/O.
 """
 import math
-import re
+import os
+from array import array
 from collections import Counter
-from typing import List, Optional, Tuple
+from operator import itemgetter
+from typing import TYPE_CHECKING, Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
 
 from .DocumentFeatures import DocumentFeatures
+from .FeatureScanner import FeatureScanner
+from .Instrumentation import DetectorStats
 from .JudgementTypes import JudgementType
+from .LazyPattern import LazyPattern
+from .SegmentCache import SegmentCache
 from .SegmentFeatures import SegmentFeatures
+from .Tokenizer import Part, Segment, SpanKind, Tokenizer
+
+if TYPE_CHECKING:
+    from .AsyncJudge import AsyncJudge
+
+# The regexes are compiled on first use, see `LazyPattern`.
 
 # Cantonese characters not found in SWC
-CANTO_FEATURE_RE = re.compile(
+CANTO_FEATURE_RE = LazyPattern(
     r'[嘅嗰啲咗佢喺咁噉冇哋畀嚟諗惗乜嘢閪撚𨳍𨳊瞓睇餸𨋢摷嚿嚡嘥嗮啱揾搵揦喐逳噏𢳂岋糴揈捹撳㩒𥄫攰癐冚孻冧𡃁嚫跣𨃩瀡氹嬲掟揼揸孭黐唞㪗埞忟𢛴踎脷]|' +
     r'[㗎𠺢喎噃啩𠿪啫唧嗱]|' +
     r'唔[係得會想好識使洗駛通知到去走掂該錯差多少]|點[樣會做得解知]|[琴尋噚聽第]日|[而依]家|[真就實梗緊堅又話都但淨剩只定一]係|邊[度個位科]|' +
@@ -23,13 +35,13 @@ CANTO_FEATURE_RE = re.compile(
 
 
 # A list of exceptions where the above characters can be found in SWC
-CANTO_EXCLUDE_RE = re.compile(r'(關係|吱唔|咿唔|喇嘛|喇叭|俾路支|俾斯麥)')
+CANTO_EXCLUDE_RE = LazyPattern(r'(關係|吱唔|咿唔|喇嘛|喇叭|俾路支|俾斯麥)')
 
 # SWC characters that are less common in Cantonese
-SWC_FEATURE_RE = re.compile(r'[這哪唄咱啥甭那是的他她它吧沒麼么些了卻説說吃弄把也在]|[事門塊勁花那點會]兒|而已')
+SWC_FEATURE_RE = LazyPattern(r'[這哪唄咱啥甭那是的他她它吧沒麼么些了卻説說吃弄把也在]|[事門塊勁花那點會]兒|而已')
 
 # A list of exceptions where the above characters can be found in Cantonese (mainly phrases or proper nouns)
-SWC_EXCLUDE_RE = re.compile(
+SWC_EXCLUDE_RE = LazyPattern(
     r'亞利桑那|剎那|巴塞羅那|薩那|沙那|哈瓦那|印第安那|那不勒斯|支那|'
     r'是[否日次非但旦]|[利於]是|唯命是從|頭頭是道|似是而非|自以為是|俯拾皆是|撩是鬥非|莫衷一是|唯才是用|'
     r'[目綠藍紅中]的|的[士確式]|波羅的海|眾矢之的|的而且確|大眼的度|的起心肝'
@@ -49,30 +61,47 @@ SWC_EXCLUDE_RE = re.compile(
 )
 
 # A list of quotes: Content inside and outside a pair of quotes should be treated separately.
-ALL_QUOTEMARKS_RE = re.compile(
+ALL_QUOTEMARKS_RE = LazyPattern(
     r'「([^「]*)」|“([^“]*)”|《([^《]*)》|【([^【]*)】|『([^『]*)』')
 
 # A list of sentential delimiters
-ALL_DELIMITERS_RE = re.compile(r'[，。；？！⋯\n]')
+ALL_DELIMITERS_RE = LazyPattern(r'[，。；？！⋯\n]')
 
-ALL_HAN_RE = re.compile(
+ALL_HAN_RE = LazyPattern(
     r'[\u4e00-\u9fff\u3400-\u4dbf\U00020000-\U0002a6df\U0002a700-\U0002ebef'
     r'\U00030000-\U000323af\ufa0e\ufa0f\ufa11\ufa13\ufa14\ufa1f\ufa21\ufa23\ufa24\ufa27\ufa28\ufa29\u3006\u3007]'
     r'[\ufe00-\ufe0f\U000e0100-\U000e01ef]?')
 
+# All four lexicons compiled into one trie, scanned in a single pass together with the Han characters. The trie
+# is built on first use. If `CANTONESEDETECT_CACHE_DIR` is set, the trie is saved there and loaded by later processes.
+FEATURE_SCANNER = FeatureScanner(
+    CANTO_FEATURE_RE, CANTO_EXCLUDE_RE, SWC_FEATURE_RE, SWC_EXCLUDE_RE, ALL_HAN_RE,
+    cache_dir=os.environ.get("CANTONESEDETECT_CACHE_DIR"))
+
+# Matrix, quotes and segments as spans of the document, without copying them into new strings
+TOKENIZER = Tokenizer(ALL_QUOTEMARKS_RE, ALL_DELIMITERS_RE)
+
 
 class CantoneseDetector:
     """
     To judge a document, you can either judge the entire document with as one single segment based on its Cantonese and SWC presence,
     or split the document into segments and aggregate the judgement from the segments.
 
+    A detector is thread-safe: `judge()`, `tag()` and the predicates keep their state in local variables, the shared
+    regexes and trie are read-only once built, and the segment cache is locked. So one detector can be shared by the
+    threads of a service, see also the `"thread"` backend of `JudgePool`.
+
     Attributes:
         split_seg (bool): Split the document into segments if True. Defaults to False.
         use_quotes (bool): Separate Matrix and Quote if True. Defaults to False.
         get_analysis (bool): Print judgement to I/O if True. Defaults to False.
+        cache_size (int): Cache the judgements of up to this many distinct segments. Defaults to 0, no cache.
+        instrument (bool): Collect per-stage timers and counters in `stats` if True. Defaults to False.
+        early_exit (bool): Stop judging segments once the judgement of the document can no longer change, if True
+            and `get_analysis` is False. The judgement is the same as without it. Defaults to False.
     """
 
-    def __init__(self, split_seg: bool = False, use_quotes: bool = False, get_analysis: bool = False, canto_tolerance: float = 0.01, swc_tolerance: float = 0.01, canto_presence: float = 0.03, swc_presence: float = 0.03) -> None:
+    def __init__(self, split_seg: bool = False, use_quotes: bool = False, get_analysis: bool = False, canto_tolerance: float = 0.01, swc_tolerance: float = 0.01, canto_presence: float = 0.03, swc_presence: float = 0.03, cache_size: int = 0, instrument: bool = False, early_exit: bool = False) -> None:
         """
         Initialize the thresholds
         """
@@ -91,6 +120,43 @@ class CantoneseDetector:
         # The minimum SWC features expected to be found in Mixed or SWC text.
         self.swc_presence: float = swc_presence
 
+        # Segment judgements are memoized if cache_size > 0. In unsplit mode, each document or matrix/quote half
+        # is a single segment, so it is cached as a whole.
+        self.segment_cache: Optional[SegmentCache] = SegmentCache(
+            cache_size) if cache_size > 0 else None
+
+        # Only used without analysis, as the analysis needs the features of every segment.
+        self.early_exit: bool = early_exit
+
+        # Returns the net Cantonese and SWC feature counts and the Han length of a text, for `_get_segment_counts()`.
+        # `CorpusStats` replaces it on its own detectors, to also count which literals matched.
+        self._count_features: Callable[[str], Tuple[int, int, int]] = FEATURE_SCANNER.count
+
+        # Without instrumentation the stage methods are left untouched, so there is no overhead.
+        self.stats: Optional[DetectorStats] = None
+        if instrument:
+            self.stats = DetectorStats(FEATURE_SCANNER)
+            self.stats.attach(self)
+
+        # Created by the first `ajudge()` call, and recreated if it is called from another event loop.
+        self._async_judge: Optional["AsyncJudge"] = None
+
+    def _get_config(self) -> Dict[str, Any]:
+        """
+        Return the keyword arguments that recreate this detector, e.g. in a worker process.
+        """
+        return {
+            "split_seg": self.split_seg,
+            "use_quotes": self.use_quotes,
+            "get_analysis": self.get_analysis,
+            "canto_tolerance": self.canto_tolerance,
+            "swc_tolerance": self.swc_tolerance,
+            "canto_presence": self.canto_presence,
+            "swc_presence": self.swc_presence,
+            "cache_size": self.segment_cache.maxsize if self.segment_cache is not None else 0,
+            "early_exit": self.early_exit,
+        }
+
     def _hant_length(self, segment: str) -> int:
         """
         Return the number of Han characters in a segment. Punctuations are excluded.
@@ -101,51 +167,99 @@ class CantoneseDetector:
         Returns:
             int: The number of Han characters in the segment.
         """
-        return sum(1 for _ in ALL_HAN_RE.finditer(segment))
+        return FEATURE_SCANNER.han_length(segment)
 
-    def _separate_quotes(self, document: str) -> Tuple[str, str]:
+    def _separate_parts(self, document: str) -> List[Part]:
         """
-        Extract quotes and matrix from a document.
+        Return the parts of a document to be judged as spans: the whole document, or its matrix and its quotes.
+        The special cases of `_judge_matrix_quotes()` are resolved here, so a single part is judged on its own.
 
         Args:
-            document (str): The input document from which quotes and matrix will be extracted.
+            document (str): The document to be judged.
 
         Returns:
-            quotes (Tuple[str, str]): A tuple containing the matrix and quotes extracted from the document.
+            List[Part]: One part, or the matrix and the quotes.
         """
-        matrix = re.sub(ALL_QUOTEMARKS_RE, "…", document)
-        quote_segments = re.findall(ALL_QUOTEMARKS_RE, document)
-        quotes = "…".join(["".join(s) for s in quote_segments])
+        return TOKENIZER.separate_parts(document, self.use_quotes)
 
-        return matrix, quotes
+    def _split_part(self, document: str, part: Part) -> List[Segment]:
+        """
+        Split a part of a document into the spans of its non-blank segments at sentential delimiters if `split_seg`
+        is True, otherwise the part is a single segment.
+        """
+        return TOKENIZER.split_part(document, part, self.split_seg)
 
-    def _get_segment_features(self, segment: str) -> SegmentFeatures:
+    def _split_part_texts(self, document: str, part: Part) -> List[str]:
         """
-        Extract and set Cantonese and SWC features in a segment.
+        The texts of the segments of `_split_part()`, which are all the judgement needs without analysis.
+        """
+        return TOKENIZER.split_part_texts(document, part, self.split_seg)
+
+    def tokenize(self, document: str) -> List[Tuple[int, int, SpanKind]]:
+        """
+        Tokenize a document into `(start, end, kind)` spans of matrix text, quote text and delimiters, in document
+        order. Quotes are only separated if `use_quotes` is True.
 
         Args:
-            segment (str): The segment of text to be analyzed.
+            document (str): The document to be tokenized.
 
         Returns:
-            segment_features (SegmentFeatures): The features of the segment.
+            List[Tuple[int, int, SpanKind]]: The spans, as offsets into the document.
         """
-        canto_feature = CANTO_FEATURE_RE.findall(segment)
-        canto_exclude = CANTO_EXCLUDE_RE.findall(segment)
-        swc_feature = SWC_FEATURE_RE.findall(segment)
-        swc_exclude = SWC_EXCLUDE_RE.findall(segment)
+        return TOKENIZER.tokenize(document, self.use_quotes)
 
-        canto_feature_count: int = len(canto_feature) - len(canto_exclude)
-        swc_feature_count: int = len(swc_feature) - len(swc_exclude)
+    def _get_segment_features(self, segment: str | Segment) -> SegmentFeatures:
+        """
+        Extract and set Cantonese and SWC features in a segment.
 
-        # len for faster execution
-        segment_length = self._hant_length(segment)
+        Args:
+            segment (str | Segment): The segment of text to be analyzed, or its spans in the document.
 
-        segment_features = SegmentFeatures(segment, canto_feature, canto_exclude, swc_feature,
-                                           swc_exclude, canto_feature_count, swc_feature_count, segment_length)
+        Returns:
+            segment_features (SegmentFeatures): The features of the segment.
+        """
+        # One pass over the segment gives the same matches as the four lexicon regexes and `_hant_length()`,
+        # kept as offsets into the segment
+        matches = array("i")
+        if isinstance(segment, str):
+            segment_length = FEATURE_SCANNER.find_offsets(segment, matches)
+            return SegmentFeatures.from_offsets(segment, ((0, len(segment)),), "", matches, segment_length)
+
+        segment_length = 0
+        offset = 0
+        for text in segment.scan_texts():
+            segment_length += FEATURE_SCANNER.find_offsets(text, matches, offset)
+            offset += len(text) + len(segment.joiner)
+
+        return SegmentFeatures.from_offsets(segment.document, tuple(segment.pieces), segment.joiner, matches, segment_length)
+
+    def _get_segment_counts(self, segment: str | Segment) -> Tuple[int, int, int]:
+        """
+        Count the Cantonese and SWC features in a segment without keeping the matched features.
 
-        return segment_features
+        Args:
+            segment (str | Segment): The segment of text to be analyzed, or its spans in the document.
 
-    def _judge_single_segment(self, segment: str) -> JudgementType | Tuple[JudgementType, SegmentFeatures]:
+        Returns:
+            tuple: The net Cantonese feature count, the net SWC feature count and the Han length of the segment.
+        """
+        if isinstance(segment, str):
+            return self._count_features(segment)
+
+        if len(segment.pieces) == 1:
+            start, end = segment.pieces[0]
+            return self._count_features(segment.document[start:end])
+
+        # Each piece is scanned on its own: no feature contains the "…" that separates them
+        canto_feature_count = swc_feature_count = segment_length = 0
+        for piece in segment.scan_texts():
+            canto_count, swc_count, han_length = self._count_features(piece)
+            canto_feature_count += canto_count
+            swc_feature_count += swc_count
+            segment_length += han_length
+        return canto_feature_count, swc_feature_count, segment_length
+
+    def _judge_segment_counts(self, canto_feature_count: int, swc_feature_count: int, segment_length: int) -> JudgementType:
         """
         Determine the language of a segment based on the presence of Cantonese and SWC features.
 
@@ -155,51 +269,172 @@ class CantoneseDetector:
         If both Cantonese and SWC features are above the threshold, then it's Mixed.
 
         Args:
-            segment (str): The segment of text to be judged.
+            canto_feature_count (int): The net number of Cantonese features in the segment.
+            swc_feature_count (int): The net number of SWC features in the segment.
+            segment_length (int): The number of Han characters in the segment.
 
         Returns:
-            tuple: A tuple containing the judgement and the segment features.
+            JudgementType: The judgement of the segment.
         """
-        segment_features: SegmentFeatures = self._get_segment_features(segment)
-
         # If the segment has no Han characters, it's neutral
-        if segment_features.segment_length == 0:
-            return (JudgementType.NEUTRAL, segment_features) if self.get_analysis else JudgementType.NEUTRAL
+        if segment_length == 0:
+            return JudgementType.NEUTRAL
 
         # Number of Cantonese and SWC features in total
-        num_all_features: int = segment_features.canto_feature_count + \
-            segment_features.swc_feature_count
+        num_all_features: int = canto_feature_count + swc_feature_count
 
         # If the Cantonese or SWC features are less than the torlerance threshold, then it's lacking Cantonese or SWC features.
-        lack_swc: bool = segment_features.swc_feature_count <= math.floor(
-            self.swc_tolerance * segment_features.segment_length)
-        lack_canto: bool = segment_features.canto_feature_count <= math.floor(
-            self.canto_tolerance * segment_features.segment_length)
+        lack_swc: bool = swc_feature_count <= math.floor(
+            self.swc_tolerance * segment_length)
+        lack_canto: bool = canto_feature_count <= math.floor(
+            self.canto_tolerance * segment_length)
 
         # If there are no features or both are lacking, it's a neutral segment
         if num_all_features == 0 or (lack_canto and lack_swc):
-            return (JudgementType.NEUTRAL, segment_features) if self.get_analysis else JudgementType.NEUTRAL
+            return JudgementType.NEUTRAL
 
         # If not lacking
         else:
-            has_canto: bool = segment_features.canto_feature_count >= math.ceil(
-                self.canto_presence * segment_features.segment_length)
-            has_swc: bool = segment_features.swc_feature_count >= math.ceil(
-                self.swc_presence * segment_features.segment_length)
+            has_canto: bool = canto_feature_count >= math.ceil(
+                self.canto_presence * segment_length)
+            has_swc: bool = swc_feature_count >= math.ceil(
+                self.swc_presence * segment_length)
 
-            canto_pref: bool = segment_features.canto_feature_count / num_all_features - \
-                segment_features.swc_feature_count / num_all_features > 0.9
-            swc_pref: bool = segment_features.swc_feature_count / num_all_features - \
-                segment_features.canto_feature_count / num_all_features > 0.9
+            canto_pref: bool = canto_feature_count / num_all_features - \
+                swc_feature_count / num_all_features > 0.9
+            swc_pref: bool = swc_feature_count / num_all_features - \
+                canto_feature_count / num_all_features > 0.9
 
             if canto_pref and not has_swc:
-                return (JudgementType.CANTONESE, segment_features) if self.get_analysis else JudgementType.CANTONESE
+                return JudgementType.CANTONESE
             elif swc_pref and not has_canto:
-                return (JudgementType.SWC, segment_features) if self.get_analysis else JudgementType.SWC
+                return JudgementType.SWC
             else:
-                return (JudgementType.MIXED, segment_features) if self.get_analysis else JudgementType.MIXED
+                return JudgementType.MIXED
+
+    def _judge_single_segment(self, segment: str | Segment) -> JudgementType | Tuple[JudgementType, SegmentFeatures]:
+        """
+        Judge a segment with `_judge_segment_counts()`. The `SegmentFeatures` are only built if `get_analysis` is True,
+        otherwise only the integer counts of the segment are computed.
+
+        Args:
+            segment (str | Segment): The segment of text to be judged, or its spans in the document.
 
-    def _judge_segments(self, segments: List[str], document_features: Optional[DocumentFeatures] = None) -> JudgementType | Tuple[JudgementType, DocumentFeatures]:
+        Returns:
+            JudgementType: The judgement of the segment.
+            (if self.get_analysis) SegmentFeatures: The features of the segment.
+        """
+        if self.segment_cache is not None:
+            key = (segment if isinstance(segment, str) else segment.text(), self.get_analysis, self.canto_tolerance,
+                   self.swc_tolerance, self.canto_presence, self.swc_presence)
+            result = self.segment_cache.get(key)
+            if result is None:
+                result = self._judge_uncached_segment(segment)
+                self.segment_cache.put(key, result)
+            elif self.get_analysis and not isinstance(segment, str):
+                # The cached features point to the document where the segment was first seen
+                judgement, segment_features = result
+                result = judgement, segment_features.relocate(segment.document, tuple(segment.pieces), segment.joiner)
+            return result
+
+        return self._judge_uncached_segment(segment)
+
+    def _judge_uncached_segment(self, segment: str | Segment) -> JudgementType | Tuple[JudgementType, SegmentFeatures]:
+        """
+        `_judge_single_segment()` without the segment cache.
+        """
+        if not self.get_analysis:
+            return self._judge_segment_counts(*self._get_segment_counts(segment))
+
+        segment_features: SegmentFeatures = self._get_segment_features(segment)
+        judgement = self._judge_segment_counts(
+            segment_features.canto_feature_count, segment_features.swc_feature_count, segment_features.segment_length)
+
+        return judgement, segment_features
+
+    def _aggregate_segment_judgements(self, canto_seg_count: int, swc_seg_count: int, neutral_seg_count: int, total_seg_count: int) -> JudgementType:
+        """
+        Aggregate the number of segments of each judgement into the judgement of the document.
+
+        Args:
+            canto_seg_count (int): Number of Cantonese segments.
+            swc_seg_count (int): Number of SWC segments.
+            neutral_seg_count (int): Number of Neutral segments.
+            total_seg_count (int): Number of segments, including Mixed ones.
+
+        Returns:
+            JudgementType: The aggregated judgement.
+        """
+        # 95% threshold
+        threshold = math.ceil(total_seg_count * 0.95)
+
+        canto_only: bool = canto_seg_count + neutral_seg_count >= threshold
+        swc_only: bool = swc_seg_count + neutral_seg_count >= threshold
+        neutral_only: bool = neutral_seg_count >= threshold
+
+        if neutral_only:
+            return JudgementType.NEUTRAL
+        elif canto_only:
+            return JudgementType.CANTONESE
+        elif swc_only:
+            return JudgementType.SWC
+        else:
+            return JudgementType.MIXED
+
+    def _reachable_segment_judgements(self, canto_seg_count: int, swc_seg_count: int, neutral_seg_count: int, remaining_seg_count: int, threshold: int) -> List[JudgementType]:
+        """
+        Return the judgements `_aggregate_segment_judgements()` can still give, depending on the judgements of the
+        remaining segments.
+
+        Every reachable judgement is reached by giving all the remaining segments the same judgement: Neutral
+        maximises the Neutral count, Cantonese the Cantonese + Neutral count without adding Neutral, and so on.
+
+        Args:
+            canto_seg_count (int): Number of Cantonese segments so far.
+            swc_seg_count (int): Number of SWC segments so far.
+            neutral_seg_count (int): Number of Neutral segments so far.
+            remaining_seg_count (int): Number of segments not judged yet.
+            threshold (int): The 95% threshold of the total number of segments.
+
+        Returns:
+            List[JudgementType]: The reachable judgements, in the order of precedence of the aggregation.
+        """
+        reachable: List[JudgementType] = []
+        if neutral_seg_count + remaining_seg_count >= threshold:
+            reachable.append(JudgementType.NEUTRAL)
+        if neutral_seg_count >= threshold:
+            return reachable
+        if canto_seg_count + neutral_seg_count + remaining_seg_count >= threshold:
+            reachable.append(JudgementType.CANTONESE)
+        if canto_seg_count + neutral_seg_count >= threshold:
+            return reachable
+        if swc_seg_count + neutral_seg_count + remaining_seg_count >= threshold:
+            reachable.append(JudgementType.SWC)
+        if swc_seg_count + neutral_seg_count >= threshold:
+            return reachable
+        reachable.append(JudgementType.MIXED)
+        return reachable
+
+    def _decided_segment_judgements(self, canto_seg_count: int, swc_seg_count: int, neutral_seg_count: int, remaining_seg_count: int, threshold: int) -> Optional[JudgementType]:
+        """
+        Return the judgement `_aggregate_segment_judgements()` will give whatever the judgements of the remaining
+        segments are, or None if it still depends on them.
+
+        Args:
+            canto_seg_count (int): Number of Cantonese segments so far.
+            swc_seg_count (int): Number of SWC segments so far.
+            neutral_seg_count (int): Number of Neutral segments so far.
+            remaining_seg_count (int): Number of segments not judged yet.
+            threshold (int): The 95% threshold of the total number of segments.
+
+        Returns:
+            Optional[JudgementType]: The decided judgement, or None.
+        """
+        reachable = self._reachable_segment_judgements(
+            canto_seg_count, swc_seg_count, neutral_seg_count, remaining_seg_count, threshold)
+        return reachable[0] if len(reachable) == 1 else None
+
+    def _judge_segments(self, segments: Iterable[str | Segment], document_features: Optional[DocumentFeatures] = None, counts: Optional[List[int]] = None) -> JudgementType | Tuple[JudgementType, DocumentFeatures]:
         """
         Given a list of segments:
         1. If >95% of the segments are Neutral, the overall judgement is Neutral
@@ -211,12 +446,15 @@ class CantoneseDetector:
         Args:
             segments (list): A list of segments to be judged.
             document_features (DocumentFeatures): The features of the document.
+            counts (list): If given, the net Cantonese and SWC feature counts and the Han length of every segment are
+                added to its three items, and the judgement is returned without analysis. Every segment is then
+                scanned, without early exit or the segment cache.
 
         Returns:
             judgement (JudgementType): The aggregated judgement of the segments.
             document_features (DocumentFeatures): Aggregation of all segment features.
         """
-        if self.get_analysis:
+        if self.get_analysis and counts is None:
             assert document_features is not None
             segment_judgements: List[JudgementType] = []
             # Aggregate the judgements and features of the segments into document_features
@@ -228,31 +466,110 @@ class CantoneseDetector:
                 document_features.document_segments_features.append(
                     segment_features)
                 segment_judgements.append(segment_judgement)
-        else:
-            segment_judgements: List[JudgementType] = [self._judge_single_segment(
-                segment) for segment in segments]
 
-        judgements_counter: Counter = Counter(segment_judgements)
+            judgements_counter: Counter = Counter(segment_judgements)
+            judgement = self._aggregate_segment_judgements(
+                judgements_counter[JudgementType.CANTONESE], judgements_counter[JudgementType.SWC],
+                judgements_counter[JudgementType.NEUTRAL], len(segment_judgements))
 
-        canto_seg_count: int = judgements_counter[JudgementType.CANTONESE]
-        swc_seg_count: int = judgements_counter[JudgementType.SWC]
-        neutral_seg_count: int = judgements_counter[JudgementType.NEUTRAL]
+            return judgement, document_features
 
-        # 95% threshold
-        threshold = math.ceil(sum(judgements_counter.values()) * 0.95)
+        # Without analysis, only keep integer counters of the segment judgements
+        canto_seg_count = swc_seg_count = neutral_seg_count = total_seg_count = 0
+        use_cache: bool = self.segment_cache is not None and counts is None
+        early_exit: bool = self.early_exit and counts is None
+        if early_exit:
+            # The threshold depends on the number of segments, so they are listed first
+            segments = list(segments)
+            threshold = math.ceil(len(segments) * 0.95)
+        for segment in segments:
+            if use_cache:
+                segment_judgement = self._judge_single_segment(segment)
+            elif counts is not None:
+                canto_feature_count, swc_feature_count, segment_length = self._get_segment_counts(segment)
+                counts[0] += canto_feature_count
+                counts[1] += swc_feature_count
+                counts[2] += segment_length
+                segment_judgement = self._judge_segment_counts(canto_feature_count, swc_feature_count, segment_length)
+            else:
+                segment_judgement = self._judge_segment_counts(
+                    *self._get_segment_counts(segment))
+            total_seg_count += 1
+            if segment_judgement is JudgementType.NEUTRAL:
+                neutral_seg_count += 1
+            elif segment_judgement is JudgementType.CANTONESE:
+                canto_seg_count += 1
+            elif segment_judgement is JudgementType.SWC:
+                swc_seg_count += 1
+            if early_exit:
+                decided_judgement = self._decided_segment_judgements(
+                    canto_seg_count, swc_seg_count, neutral_seg_count, len(segments) - total_seg_count, threshold)
+                if decided_judgement is not None:
+                    return decided_judgement
+
+        return self._aggregate_segment_judgements(canto_seg_count, swc_seg_count, neutral_seg_count, total_seg_count)
+
+    def _judge_segments_towards(self, segments: Iterable[str | Segment], target: JudgementType) -> Optional[JudgementType]:
+        """
+        Judge whether the segments aggregate to `target`, to Neutral or to neither, and stop as soon as that is
+        decided by `_reachable_segment_judgements()`.
 
-        canto_only: bool = canto_seg_count + neutral_seg_count >= threshold
-        swc_only: bool = swc_seg_count + neutral_seg_count >= threshold
-        neutral_only: bool = neutral_seg_count >= threshold
+        Args:
+            segments (Iterable[str | Segment]): The segments to be judged.
+            target (JudgementType): `JudgementType.CANTONESE` or `JudgementType.SWC`.
 
-        if neutral_only:
-            return (JudgementType.NEUTRAL, document_features) if self.get_analysis else JudgementType.NEUTRAL
-        elif canto_only:
-            return (JudgementType.CANTONESE, document_features) if self.get_analysis else JudgementType.CANTONESE
-        elif swc_only:
-            return (JudgementType.SWC, document_features) if self.get_analysis else JudgementType.SWC
-        else:
-            return (JudgementType.MIXED, document_features) if self.get_analysis else JudgementType.MIXED
+        Returns:
+            Optional[JudgementType]: `target` or `JudgementType.NEUTRAL`, or None if the segments aggregate to
+                another judgement.
+        """
+        segments = list(segments)
+        threshold = math.ceil(len(segments) * 0.95)
+        canto_seg_count = swc_seg_count = neutral_seg_count = 0
+        use_cache: bool = self.segment_cache is not None and not self.get_analysis
+
+        for index, segment in enumerate(segments):
+            if use_cache:
+                segment_judgement = self._judge_single_segment(segment)
+            else:
+                segment_judgement = self._judge_segment_counts(*self._get_segment_counts(segment))
+            if segment_judgement is JudgementType.NEUTRAL:
+                neutral_seg_count += 1
+            elif segment_judgement is JudgementType.CANTONESE:
+                canto_seg_count += 1
+            elif segment_judgement is JudgementType.SWC:
+                swc_seg_count += 1
+
+            reachable = self._reachable_segment_judgements(
+                canto_seg_count, swc_seg_count, neutral_seg_count, len(segments) - index - 1, threshold)
+            if len(reachable) == 1 and reachable[0] in (target, JudgementType.NEUTRAL):
+                return reachable[0]
+            if target not in reachable and JudgementType.NEUTRAL not in reachable:
+                return None
+
+        # Empty documents are Neutral
+        return JudgementType.NEUTRAL
+
+    def _judge_part_towards(self, document: str, part: Part, target: JudgementType) -> Optional[JudgementType]:
+        """
+        `_judge_part()` reduced to `target`, `JudgementType.NEUTRAL` or None for any other judgement.
+        """
+        return self._judge_segments_towards(self._split_part_texts(document, part), target)
+
+    def _is_judgement(self, document: str, target: JudgementType) -> bool:
+        """
+        Return True if `judge()` would give `target`, scanning only as much of the document as needed.
+        """
+        parts = self._separate_parts(document)
+        if len(parts) == 1:
+            return self._judge_part_towards(document, parts[0], target) is target
+
+        # `_combine_matrix_quotes()` only gives `target` if both parts are `target` or Neutral, but not both Neutral
+        matrix, quotes = parts
+        matrix_judgement = self._judge_part_towards(document, matrix, target)
+        if matrix_judgement is None:
+            return False
+        quotes_judgement = self._judge_part_towards(document, quotes, target)
+        return quotes_judgement is not None and (matrix_judgement is target or quotes_judgement is target)
 
     def _judge_document(self, document: str) -> JudgementType | Tuple[JudgementType, DocumentFeatures]:
         """
@@ -264,15 +581,16 @@ class CantoneseDetector:
         If `get_analysis` is True, function will return the document features along with the judgement.
         Otherwise, it will return the judgement only.
         """
-        # Split the document into segments if split_seg is True
-        if self.split_seg:
-            segments: List[str] = filter(lambda x: x.strip(),
-                                         ALL_DELIMITERS_RE.split(document))
-        # Otherwise, treat the document as a single segment
-        else:
-            segments: List[str] = [document]
+        return self._judge_part(document, Part(SpanKind.MATRIX, [(0, len(document))], ""))
 
+    def _judge_part(self, document: str, part: Part) -> JudgementType | Tuple[JudgementType, DocumentFeatures]:
+        """
+        `_judge_document()` on a part of a document, given as spans.
+        """
         if self.get_analysis:
+            # The segments are kept as spans, so their features know where they are in the document
+            segments = self._split_part(document, part)
+
             # Store document features in an object if get_analysis is True
             document_features = DocumentFeatures(
                 split_seg=self.split_seg, use_quotes=self.use_quotes)
@@ -282,7 +600,7 @@ class CantoneseDetector:
 
             return judgement, document_features
         else:
-            judgement = self._judge_segments(segments)
+            judgement = self._judge_segments(self._split_part_texts(document, part))
             return judgement
 
     def _judge_matrix_quotes(self, document: str) -> JudgementType | Tuple[JudgementType, DocumentFeatures]:
@@ -294,21 +612,18 @@ class CantoneseDetector:
         Returns:
             tuple: A tuple containing the language of the document, the Cantonese ratio, and the SWC ratio.
         """
-        matrix, quotes = self._separate_quotes(document)
+        parts = self._separate_parts(document)
 
-        if matrix == "…":
-            # Matrix is empty, entire input is a quote
-            return self._judge_document(
-                ALL_QUOTEMARKS_RE.sub("", quotes))
-        elif quotes == "":
-            # No quotes
-            return self._judge_document(matrix)
+        if len(parts) == 1:
+            # The entire input is a quote, or there are no quotes
+            return self._judge_part(document, parts[0])
         else:
+            matrix, quotes = parts
             if self.get_analysis:
-                matrix_judgement, matrix_document_features = self._judge_document(
-                    matrix)
-                quotes_judgement, quotes_document_features = self._judge_document(
-                    quotes)
+                matrix_judgement, matrix_document_features = self._judge_part(
+                    document, matrix)
+                quotes_judgement, quotes_document_features = self._judge_part(
+                    document, quotes)
 
                 if matrix_judgement == quotes_judgement:
                     return matrix_judgement, matrix_document_features
@@ -334,25 +649,58 @@ class CantoneseDetector:
                     else:
                         return JudgementType.MIXED, document_features
             else:
-                matrix_judgement = self._judge_document(matrix)
-                quotes_judgement = self._judge_document(quotes)
-
-                if matrix_judgement == quotes_judgement:
-                    return matrix_judgement
-                elif matrix_judgement == JudgementType.NEUTRAL:
-                    return quotes_judgement
-                elif quotes_judgement == JudgementType.NEUTRAL:
-                    return matrix_judgement
-                elif matrix_judgement == JudgementType.SWC and quotes_judgement == JudgementType.CANTONESE:
-                    return JudgementType.CANTONESE_QUOTES_IN_SWC
-                elif matrix_judgement == JudgementType.SWC and quotes_judgement == JudgementType.MIXED:
-                    return JudgementType.MIXED_QUOTES_IN_SWC
-                else:
+                matrix_judgement = self._judge_part(document, matrix)
+                if self.early_exit and matrix_judgement == JudgementType.MIXED:
+                    # A Mixed matrix gives a Mixed document whatever the quotes are
                     return JudgementType.MIXED
+                quotes_judgement = self._judge_part(document, quotes)
+
+                return self._combine_matrix_quotes(matrix_judgement, quotes_judgement)
+
+    def _combine_matrix_quotes(self, matrix_judgement: JudgementType, quotes_judgement: JudgementType) -> JudgementType:
+        """
+        Combine the judgements of the matrix and the quotes of a document into its judgement.
+
+        Args:
+            matrix_judgement (JudgementType): The judgement of the matrix.
+            quotes_judgement (JudgementType): The judgement of the quotes.
+
+        Returns:
+            JudgementType: The judgement of the document.
+        """
+        if matrix_judgement == quotes_judgement:
+            return matrix_judgement
+        elif matrix_judgement == JudgementType.NEUTRAL:
+            return quotes_judgement
+        elif quotes_judgement == JudgementType.NEUTRAL:
+            return matrix_judgement
+        elif matrix_judgement == JudgementType.SWC and quotes_judgement == JudgementType.CANTONESE:
+            return JudgementType.CANTONESE_QUOTES_IN_SWC
+        elif matrix_judgement == JudgementType.SWC and quotes_judgement == JudgementType.MIXED:
+            return JudgementType.MIXED_QUOTES_IN_SWC
+        else:
+            return JudgementType.MIXED
+
+    def _judge_with_counts(self, document: str) -> Tuple[JudgementType, int, int, int]:
+        """
+        Judge a document as `judge()` without analysis, and also return its net Cantonese and SWC feature counts and
+        its Han length, summed over the segments of all its parts.
+
+        Returns:
+            tuple: The judgement, the net Cantonese feature count, the net SWC feature count and the Han length.
+        """
+        counts = [0, 0, 0]
+        part_judgements = [self._judge_segments(self._split_part_texts(document, part), counts=counts)
+                           for part in self._separate_parts(document)]
+        if len(part_judgements) == 1:
+            judgement = part_judgements[0]
+        else:
+            judgement = self._combine_matrix_quotes(*part_judgements)
+        return judgement, counts[0], counts[1], counts[2]
 
     def judge(self, document: str) -> JudgementType | Tuple[JudgementType, DocumentFeatures]:
         """
-        The only exposed api. Judge the language of a document.
+        The main exposed api. Judge the language of a document.
 
         Args:
             document (str): The document to be judged.
@@ -370,3 +718,120 @@ class CantoneseDetector:
             else:
                 judgement = self._judge_document(document)
                 return judgement
+
+    def tag(self, document: str) -> List[Tuple[int, int, JudgementType]]:
+        """
+        Tag a document with the judgements of its segments, as run-length encoded `(start, end, judgement)` spans of
+        the original document. Consecutive segments with the same judgement are merged into one span, which also
+        covers the delimiters and quote marks between them. Text between segments with different judgements, and
+        blank text, is not covered by any span.
+
+        Only the counts of the segments are computed, even if `get_analysis` is True.
+
+        Args:
+            document (str): The document to be tagged.
+
+        Returns:
+            List[Tuple[int, int, JudgementType]]: The spans, in document order. Their judgements are `CANTONESE`,
+                `SWC`, `MIXED` or `NEUTRAL`.
+        """
+        if self.get_analysis:
+            def judge_segment(segment: Segment) -> JudgementType:
+                return self._judge_segment_counts(*self._get_segment_counts(segment))
+        else:
+            judge_segment = self._judge_single_segment
+
+        # The matrix and the quotes interleave in the document, so their pieces are tagged, then sorted
+        pieces: List[Tuple[int, int, JudgementType]] = []
+        for part in self._separate_parts(document):
+            for segment in self._split_part(document, part):
+                judgement = judge_segment(segment)
+                pieces += [(start, end, judgement) for start, end in segment.pieces if end > start]
+        pieces.sort(key=itemgetter(0))
+
+        spans: List[Tuple[int, int, JudgementType]] = []
+        for start, end, judgement in pieces:
+            if spans and spans[-1][2] is judgement:
+                spans[-1] = (spans[-1][0], end, judgement)
+            else:
+                spans.append((start, end, judgement))
+        return spans
+
+    def is_cantonese(self, document: str) -> bool:
+        """
+        Return True if `judge()` would judge the document as Cantonese, which is faster than `judge()`: the
+        scan stops as soon as the answer is certain. The analysis is never computed.
+
+        Args:
+            document (str): The document to be judged.
+
+        Returns:
+            bool: True if the judgement is `JudgementType.CANTONESE`.
+        """
+        return self._is_judgement(document, JudgementType.CANTONESE)
+
+    def is_swc(self, document: str) -> bool:
+        """
+        Return True if `judge()` would judge the document as SWC, which is faster than `judge()`: the scan stops
+        as soon as the answer is certain. The analysis is never computed.
+
+        Args:
+            document (str): The document to be judged.
+
+        Returns:
+            bool: True if the judgement is `JudgementType.SWC`.
+        """
+        return self._is_judgement(document, JudgementType.SWC)
+
+    def judge_many(self, documents: Iterable[str], workers: Optional[int] = None, chunksize: int = 256, backend: str = "auto") -> List[JudgementType] | List[Tuple[JudgementType, DocumentFeatures]]:
+        """
+        Judge many documents with a pool of worker processes or threads. The detector config is sent to every
+        worker once, and the documents are sent in chunks.
+
+        Args:
+            documents (Iterable[str]): The documents to be judged.
+            workers (int): Number of workers. Defaults to the number of CPUs. With 1 worker, the documents
+                are judged in the current process.
+            chunksize (int): Number of documents sent to a worker at a time.
+            backend (str): `"process"`, `"thread"`, or `"auto"` for threads on free-threaded CPython with the GIL
+                disabled and processes otherwise, see `ParallelJudge.JudgePool`.
+
+        Returns:
+            list: The judgements in input order, or `(judgement, document_features)` tuples if `get_analysis` is True.
+        """
+        from .ParallelJudge import judge_many as parallel_judge_many
+        return parallel_judge_many(self._get_config(), documents, workers=workers, chunksize=chunksize, backend=backend)
+
+    def _get_async_judge(self) -> "AsyncJudge":
+        # asyncio is only imported by the asynchronous API
+        import asyncio
+        from .AsyncJudge import AsyncJudge
+        if self._async_judge is None or self._async_judge.loop not in (None, asyncio.get_running_loop()):
+            self._async_judge = AsyncJudge(self)
+        return self._async_judge
+
+    async def ajudge(self, document: str) -> JudgementType | Tuple[JudgementType, DocumentFeatures]:
+        """
+        Judge a document from asyncio code, in the default executor of the event loop. Concurrent calls are
+        judged together in micro-batches. Use `AsyncJudge` directly to choose the executor and the batch sizes.
+
+        Args:
+            document (str): The document to be judged.
+
+        Returns:
+            The result of `judge(document)`.
+        """
+        return await self._get_async_judge().judge(document)
+
+    async def ajudge_many(self, documents: AsyncIterable[str] | Iterable[str]) -> AsyncIterator[JudgementType | Tuple[JudgementType, DocumentFeatures]]:
+        """
+        Judge documents from an async or a plain iterable, and yield the results in input order.
+
+        Args:
+            documents (AsyncIterable[str] | Iterable[str]): The documents to be judged.
+
+        Yields:
+            The result of `judge()` for each document.
+        """
+        async for result in self._get_async_judge().judge_many(documents):
+            yield result
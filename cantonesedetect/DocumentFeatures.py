@@ -1,5 +1,7 @@
-from typing import List
+import io
+from typing import List, TextIO
 
+from cantonesedetect.FeatureScanner import CANTO_FEATURE, SWC_FEATURE
 from cantonesedetect.JudgementTypes import JudgementType
 from cantonesedetect.SegmentFeatures import SegmentFeatures
 
@@ -8,6 +10,7 @@ class DocumentFeatures:
     """
     Store the `SegmentFeatures`s and segment judgements of the document.
     """
+    __slots__ = ("split_seg", "use_quotes", "document_segments_features", "document_segments_judgements")
 
     def __init__(self, split_seg, use_quotes) -> None:
         self.split_seg = split_seg
@@ -18,7 +21,7 @@ class DocumentFeatures:
 
     def _merge_judgements_features(self, matrix_judgements: List[JudgementType], quotes_judgements: List[JudgementType], matrix_features: List[SegmentFeatures], quotes_features: List[SegmentFeatures]) -> None:
         """
-        For documents that split the matrix and quotes, the document judgements and features 
+        For documents that split the matrix and quotes, the document judgements and features
         are merged from those of the matrix and quotes.
         """
         assert self.use_quotes is True
@@ -26,23 +29,33 @@ class DocumentFeatures:
         self.document_segments_features = matrix_features + quotes_features
         self.document_segments_judgements = matrix_judgements + quotes_judgements
 
-    def get_analysis(self) -> str:
+    def write_analysis(self, writer: TextIO) -> None:
         """
-        Return a string representation of the document features
+        Write the analysis of `get_analysis()` to a text stream, one segment at a time.
+
+        Args:
+            writer (TextIO): Any object with a `write(str)` method, e.g. `sys.stdout` or an open file.
         """
         assert len(self.document_segments_features) == len(
             self.document_segments_judgements)
 
-        analysis_string = (
+        writer.write(
             f"------------------------------------\nSplitting quotes: {self.use_quotes}\n"
             f"Splitting segments: {self.split_seg}\n\n----------Segment Features----------\n"
         )
 
         for segment_features, segment_judgement in zip(self.document_segments_features, self.document_segments_judgements):
-            cantonese_features = ", ".join(segment_features.canto_feature)
-            swc_features = ", ".join(segment_features.swc_feature)
+            segment = segment_features.segment
+            cantonese_features = ", ".join(segment_features._matched(CANTO_FEATURE, segment))
+            swc_features = ", ".join(segment_features._matched(SWC_FEATURE, segment))
 
-            analysis_string += f"""Segment: {segment_features.segment}\nJudgement: {segment_judgement}\nCantonese features: {
-                cantonese_features}\nCantonese content: {segment_features.canto_content * 100:.2f}%\nSWC features: {swc_features}\nSWC content: {segment_features.swc_content * 100:.2f}%\n\n"""
+            writer.write(f"""Segment: {segment}\nJudgement: {segment_judgement}\nCantonese features: {
+                cantonese_features}\nCantonese content: {segment_features.canto_content * 100:.2f}%\nSWC features: {swc_features}\nSWC content: {segment_features.swc_content * 100:.2f}%\n\n""")
 
-        return analysis_string
+    def get_analysis(self) -> str:
+        """
+        Return a string representation of the document features
+        """
+        analysis = io.StringIO()
+        self.write_analysis(analysis)
+        return analysis.getvalue()
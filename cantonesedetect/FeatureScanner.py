@@ -0,0 +1,378 @@
+"""
+Single-pass feature scanner.
+
+The Cantonese and SWC lexicons in `Detector.py` are finite alternations of literals and character classes,
+so they can be expanded into a set of literal strings and compiled into one trie. Walking that trie once
+from left to right produces the same matches as running `findall` with each of the four regexes, and the
+Han characters are counted in the same pass.
+"""
+import marshal
+import os
+import re
+import threading
+import zlib
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Indices of the four lexicons inside the trie terminals and the scan results.
+CANTO_FEATURE = 0
+CANTO_EXCLUDE = 1
+SWC_FEATURE = 2
+SWC_EXCLUDE = 3
+
+# Key under which a trie node stores the match length of each lexicon. No literal contains an empty string.
+_TERMINAL = ""
+
+# Version of the layout of the trie, part of the name of its cache file
+_TRIE_FORMAT = "1"
+
+
+def _expand_pattern(pattern: str) -> List[str]:
+    """
+    Expand a regex made only of literals, character classes, groups and alternations into the list of
+    literal strings it can match, in the order the regex engine would try them.
+
+    Args:
+        pattern (str): The regex source, e.g. `CANTO_FEATURE_RE.pattern`.
+
+    Returns:
+        List[str]: The literal strings, earliest alternative first.
+    """
+    position = 0
+
+    def parse_alternation() -> List[str]:
+        nonlocal position
+        literals = parse_sequence()
+        while position < len(pattern) and pattern[position] == "|":
+            position += 1
+            literals += parse_sequence()
+        return literals
+
+    def parse_sequence() -> List[str]:
+        nonlocal position
+        literals = [""]
+        while position < len(pattern) and pattern[position] not in "|)":
+            char = pattern[position]
+            if char == "(":
+                position += 1
+                options = parse_alternation()
+                if position >= len(pattern) or pattern[position] != ")":
+                    raise ValueError(f"Unbalanced group in lexicon pattern at {position}")
+                position += 1
+            elif char == "[":
+                end = pattern.index("]", position)
+                options = list(dict.fromkeys(pattern[position + 1:end]))
+                if any(c in "\\^-" for c in options):
+                    raise ValueError(f"Unsupported character class in lexicon pattern at {position}")
+                position = end + 1
+            elif char in "\\.*+?{}^$]":
+                raise ValueError(f"Unsupported regex syntax {char!r} in lexicon pattern at {position}")
+            else:
+                options = [char]
+                position += 1
+            literals = [prefix + option for prefix in literals for option in options]
+        return literals
+
+    literals = parse_alternation()
+    if position != len(pattern):
+        raise ValueError(f"Unbalanced group in lexicon pattern at {position}")
+    return literals
+
+
+def is_han(char: str) -> bool:
+    """
+    Return True if the character is matched by the Han character class of `ALL_HAN_RE`.
+    """
+    if "一" <= char <= "鿿":
+        return True
+    code = ord(char)
+    return (0x3400 <= code <= 0x4dbf or 0x20000 <= code <= 0x2a6df or 0x2a700 <= code <= 0x2ebef
+            or 0x30000 <= code <= 0x323af or code in _HAN_SINGLETONS)
+
+
+_HAN_SINGLETONS = frozenset([0xfa0e, 0xfa0f, 0xfa11, 0xfa13, 0xfa14, 0xfa1f, 0xfa21, 0xfa23, 0xfa24, 0xfa27,
+                             0xfa28, 0xfa29, 0x3006, 0x3007])
+
+
+class FeatureScanner:
+    """
+    A trie compiled from the four lexicon regexes. Each regex keeps its own scan position, so overlapping
+    matches between different lexicons are all counted, while matches of the same lexicon never overlap,
+    exactly as with `re.findall`.
+    """
+
+    def __init__(self, canto_feature_re: re.Pattern, canto_exclude_re: re.Pattern,
+                 swc_feature_re: re.Pattern, swc_exclude_re: re.Pattern, han_re: re.Pattern,
+                 cache_dir: Optional[str] = None) -> None:
+        """
+        Args:
+            canto_feature_re, canto_exclude_re, swc_feature_re, swc_exclude_re (re.Pattern): The lexicons. Only
+                their `pattern` is read to build the trie, so they can be `LazyPattern`s that are never compiled.
+            han_re (re.Pattern): The Han characters, only used by `differential_check()`.
+            cache_dir (str): If given, the trie is loaded from a file in this directory if one was saved for the
+                same lexicons, and saved there otherwise, so that later processes do not have to build it.
+        """
+        self.patterns: Tuple[re.Pattern, ...] = (
+            canto_feature_re, canto_exclude_re, swc_feature_re, swc_exclude_re)
+        # Only used as the reference in `differential_check()`, Han characters are counted by `is_han()`.
+        self.han_re: re.Pattern = han_re
+        self.cache_dir: Optional[str] = cache_dir
+        # `trie` and `max_literal_length` are set by `_build()` on first access, see `__getattr__()`.
+        self._build_lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        if name in ("trie", "max_literal_length"):
+            # Threads that need the trie while another thread builds it wait for it, so it is built once
+            with self._build_lock:
+                if name not in self.__dict__:
+                    self._build()
+            return self.__dict__[name]
+        raise AttributeError(name)
+
+    def cache_path(self) -> Optional[str]:
+        """
+        Return the path of the cached trie of these lexicons, or None without a cache directory.
+        """
+        if self.cache_dir is None:
+            return None
+        key = zlib.crc32("\n".join(self._cache_key()).encode("utf-8"))
+        return os.path.join(self.cache_dir, f"scanner-{key:08x}.marshal")
+
+    def _cache_key(self) -> Tuple[str, ...]:
+        # Saved with the trie and compared on load, so a stale or colliding file is never used
+        return (_TRIE_FORMAT, str(marshal.version)) + tuple(pattern.pattern for pattern in self.patterns)
+
+    def _build(self) -> None:
+        """
+        Set `trie` and `max_literal_length`, from the cache file if there is a valid one.
+        """
+        path = self.cache_path()
+        if path is not None:
+            try:
+                with open(path, "rb") as f:
+                    key, max_literal_length, trie = marshal.loads(f.read())
+                if key == self._cache_key():
+                    self.trie, self.max_literal_length = trie, max_literal_length
+                    return
+            except (OSError, EOFError, ValueError, TypeError):
+                pass
+
+        trie: Dict[str, dict] = {}
+        # The longest literal bounds how far ahead of a match start the scanner ever reads.
+        max_literal_length = 0
+        priorities: Dict[int, List[Optional[int]]] = {}
+        for lexicon, compiled in enumerate(self.patterns):
+            for priority, literal in enumerate(_expand_pattern(compiled.pattern)):
+                max_literal_length = max(max_literal_length, len(literal))
+                node = trie
+                for char in literal:
+                    node = node.setdefault(char, {})
+                terminal = priorities.setdefault(id(node), [None, None, None, None])
+                # The regex engine takes the first alternative that matches, so keep the earliest one.
+                if terminal[lexicon] is None:
+                    terminal[lexicon] = priority
+
+        self._resolve(trie, priorities, 0, ((None, 0),) * 4)
+        self.trie = trie
+        self.max_literal_length = max_literal_length
+
+        if path is not None:
+            self._save(path)
+
+    def _save(self, path: str) -> None:
+        """
+        Save the trie to `path`. It is written to a temporary file first, so that concurrent processes never read a
+        partial file. A cache that cannot be written is skipped.
+        """
+        # Only imported to write the cache, as it is slow to import
+        import tempfile
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                marshal.dump((self._cache_key(), self.max_literal_length, self.trie), f)
+            os.replace(temp_path, path)
+        except OSError:
+            os.unlink(temp_path)
+
+    def _resolve(self, node: dict, priorities: Dict[int, List[Optional[int]]], depth: int,
+                 best: Tuple[Tuple[Optional[int], int], ...]) -> None:
+        """
+        Store in every node the length of the match each regex would pick if the walk from the match
+        start stops at this node, i.e. the earliest alternative among the literals on the path.
+        """
+        terminal = priorities.get(id(node))
+        if terminal is not None:
+            best = tuple((priority, depth) if priority is not None and (best_priority is None or priority < best_priority)
+                         else (best_priority, best_depth)
+                         for priority, (best_priority, best_depth) in zip(terminal, best))
+        for char, child in node.items():
+            self._resolve(child, priorities, depth + 1, best)
+        node[_TERMINAL] = tuple(best_depth for _, best_depth in best)
+
+    def _walk(self, segment: str, matches: Any, offset: int = 0, stop: Optional[int] = None,
+              resume: Optional[List[int]] = None) -> int:
+        """
+        The single trie walk behind every scan: append the matches of every lexicon, leftmost first and without
+        overlaps within a lexicon as `re.findall()` finds them, to `matches` as flat `(lexicon, start, end)` integers.
+
+        Args:
+            segment (str): The segment of text to be analyzed.
+            matches (array | list): The matches are appended to it.
+            offset (int): Added to the start and end of every match.
+            stop (int): Only consider matches and Han characters before this position. Defaults to the end.
+            resume (List[int]): The position where each lexicon resumes scanning, updated in place.
+                Defaults to the start of the segment.
+
+        Returns:
+            int: The number of Han characters.
+        """
+        root = self.trie
+        max_literal_length = self.max_literal_length
+        extend = matches.extend
+        # Every lexicon resumes scanning after the end of its previous match. The four lexicons are unrolled, as
+        # this loop is the hot path of judging.
+        resume_canto, resume_canto_exclude, resume_swc, resume_swc_exclude = resume or (0, 0, 0, 0)
+        han_length = 0
+
+        for start, char in enumerate(segment if stop is None else segment[:stop]):
+            if "一" <= char <= "鿿" or (char > "々" and is_han(char)):
+                han_length += 1
+            node = root.get(char)
+            if node is None:
+                continue
+            for next_char in segment[start + 1:start + max_literal_length]:
+                child = node.get(next_char)
+                if child is None:
+                    break
+                node = child
+            canto_length, canto_exclude_length, swc_length, swc_exclude_length = node[_TERMINAL]
+
+            if canto_length and resume_canto <= start:
+                resume_canto = start + canto_length
+                extend((CANTO_FEATURE, offset + start, offset + resume_canto))
+            if canto_exclude_length and resume_canto_exclude <= start:
+                resume_canto_exclude = start + canto_exclude_length
+                extend((CANTO_EXCLUDE, offset + start, offset + resume_canto_exclude))
+            if swc_length and resume_swc <= start:
+                resume_swc = start + swc_length
+                extend((SWC_FEATURE, offset + start, offset + resume_swc))
+            if swc_exclude_length and resume_swc_exclude <= start:
+                resume_swc_exclude = start + swc_exclude_length
+                extend((SWC_EXCLUDE, offset + start, offset + resume_swc_exclude))
+
+        if resume is not None:
+            resume[:] = resume_canto, resume_canto_exclude, resume_swc, resume_swc_exclude
+        return han_length
+
+    def findall(self, segment: str) -> Tuple[List[str], List[str], List[str], List[str], int]:
+        """
+        Return the matched features of every lexicon and the Han length of the segment in one pass.
+
+        Args:
+            segment (str): The segment of text to be analyzed.
+
+        Returns:
+            tuple: Lists of Cantonese features, Cantonese exclusions, SWC features and SWC exclusions,
+                and the number of Han characters.
+        """
+        matches: List[int] = []
+        han_length = self._walk(segment, matches)
+        found: Tuple[List[str], ...] = ([], [], [], [])
+        for index in range(0, len(matches), 3):
+            found[matches[index]].append(segment[matches[index + 1]:matches[index + 2]])
+        return found[0], found[1], found[2], found[3], han_length
+
+    def find_offsets(self, segment: str, matches: array, offset: int = 0) -> int:
+        """
+        Append the matches of every lexicon to `matches` as flat `(lexicon, start, end)` integers, in the order they
+        are found, and return the Han length of the segment. The matches are the same as with `findall()`, without
+        copying them into strings.
+
+        Args:
+            segment (str): The segment of text to be analyzed.
+            matches (array): The array the matches are appended to.
+            offset (int): Added to the start and end of every match, e.g. the position of the segment in a text.
+
+        Returns:
+            int: The number of Han characters.
+        """
+        return self._walk(segment, matches, offset)
+
+    def count_matches(self, segment: str, stop: Optional[int] = None, resume: Optional[List[int]] = None) -> Tuple[int, int, int, int, int]:
+        """
+        Return the number of matches of each lexicon and the Han length of a segment, without building any
+        match lists.
+
+        To scan a text that arrives in pieces, pass `stop` to only consider matches starting before it, and a
+        `resume` list that keeps, for each lexicon, the position where its scan continues. The list is updated in
+        place, so the next piece can continue from it.
+
+        Args:
+            segment (str): The segment of text to be analyzed.
+            stop (int): Only count matches and Han characters before this position. Defaults to the end of the segment.
+            resume (List[int]): The position where each lexicon resumes scanning. Defaults to the start of the segment.
+
+        Returns:
+            tuple: The numbers of Cantonese features, Cantonese exclusions, SWC features and SWC exclusions,
+                and the number of Han characters.
+        """
+        matches: List[int] = []
+        han_length = self._walk(segment, matches, 0, stop, resume)
+        lexicons = matches[::3]
+        return (lexicons.count(CANTO_FEATURE), lexicons.count(CANTO_EXCLUDE), lexicons.count(SWC_FEATURE),
+                lexicons.count(SWC_EXCLUDE), han_length)
+
+    def count(self, segment: str) -> Tuple[int, int, int]:
+        """
+        Return the net Cantonese feature count, the net SWC feature count and the Han length of a segment
+        in one pass, without building any match lists.
+
+        Args:
+            segment (str): The segment of text to be analyzed.
+
+        Returns:
+            tuple: `(canto_feature_count, swc_feature_count, segment_length)`.
+        """
+        matches: List[int] = []
+        han_length = self._walk(segment, matches)
+        lexicons = matches[::3]
+        return (lexicons.count(CANTO_FEATURE) - lexicons.count(CANTO_EXCLUDE),
+                lexicons.count(SWC_FEATURE) - lexicons.count(SWC_EXCLUDE), han_length)
+
+    @staticmethod
+    def han_length(segment: str) -> int:
+        """
+        Return the number of Han characters in a segment, as counted by `ALL_HAN_RE`.
+        """
+        return sum(1 for char in segment if "一" <= char <= "鿿" or (char > "々" and is_han(char)))
+
+    def differential_check(self, segments: Iterable[str]) -> List[str]:
+        """
+        Compare the scanner against the original regexes over a corpus.
+
+        Args:
+            segments (Iterable[str]): The segments to scan with both engines.
+
+        Returns:
+            List[str]: The segments on which the matches, the counts or the Han length differ. Empty if they all agree.
+        """
+        mismatches: List[str] = []
+        for segment in segments:
+            expected = tuple(pattern.findall(segment) for pattern in self.patterns) + \
+                (sum(1 for _ in self.han_re.finditer(segment)),)
+            canto_feature, canto_exclude, swc_feature, swc_exclude, segment_length = expected
+            expected_counts = (len(canto_feature) - len(canto_exclude), len(swc_feature) - len(swc_exclude),
+                               segment_length)
+            matches = array("i")
+            han_length = self.find_offsets(segment, matches)
+            found = tuple([segment[start:end] for code, start, end in zip(*[iter(matches)] * 3) if code == lexicon]
+                          for lexicon in range(4)) + (han_length,)
+            if self.findall(segment) != expected or self.count(segment) != expected_counts or \
+                    self.count_matches(segment) != tuple(map(len, expected[:4])) + (segment_length,) or found != expected:
+                mismatches.append(segment)
+        return mismatches
+
@@ -0,0 +1,223 @@
+"""
+Feature table: the feature counts of a corpus, computed once and re-judged under many threshold configs.
+
+The judgement of a segment only depends on its net Cantonese and SWC feature counts and its Han length, and the
+judgement of a document only on the judgements of its segments. So the table keeps these three counts per segment
+in flat arrays, and records which segments form each part of a document: the document itself, or its matrix and
+its quotes. Judging the table with new thresholds gives the same judgements as `CantoneseDetector.judge()` with
+these thresholds, without scanning the text again.
+"""
+import json
+import sys
+from array import array
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+from . import VectorJudge
+from .Detector import CantoneseDetector
+from .JudgementTypes import JudgementType
+from .ParallelJudge import JUDGEMENTS
+
+MAGIC = b"CDFT1\n"
+
+# The arrays of the file format, in order, with their typecodes. Counts are 32-bit, offsets 64-bit.
+ARRAYS: Tuple[Tuple[str, str], ...] = (
+    ("canto_counts", "i"),
+    ("swc_counts", "i"),
+    ("han_lengths", "i"),
+    ("part_offsets", "q"),
+    ("document_offsets", "q"),
+)
+
+
+class FeatureTable:
+    """
+    Per-segment feature counts of a corpus, judged in the `split_seg` and `use_quotes` modes it was built with.
+
+    Segments are stored part by part: the segments of part `p` are `part_offsets[p]` to `part_offsets[p + 1]`.
+    Each document has one part, judged on its own, or two, its matrix and its quotes, whose judgements are
+    combined as in `_judge_matrix_quotes()`. The parts of document `d` are `document_offsets[d]` to
+    `document_offsets[d + 1]`.
+
+    Attributes:
+        split_seg (bool): Whether the documents were split into segments.
+        use_quotes (bool): Whether the matrix and the quotes were separated.
+        canto_counts (array): Net Cantonese feature count of each segment.
+        swc_counts (array): Net SWC feature count of each segment.
+        han_lengths (array): Han length of each segment.
+        part_offsets (array): Offset of the first segment of each part, and the number of segments at the end.
+        document_offsets (array): Offset of the first part of each document, and the number of parts at the end.
+    """
+
+    def __init__(self, split_seg: bool, use_quotes: bool, canto_counts: array, swc_counts: array, han_lengths: array, part_offsets: array, document_offsets: array) -> None:
+        self.split_seg: bool = split_seg
+        self.use_quotes: bool = use_quotes
+        self.canto_counts: array = canto_counts
+        self.swc_counts: array = swc_counts
+        self.han_lengths: array = han_lengths
+        self.part_offsets: array = part_offsets
+        self.document_offsets: array = document_offsets
+        # Built on the first call to `judge()`
+        self._triples: Optional[List[Tuple[int, int, int]]] = None
+        self._triple_ids: Optional[array] = None
+
+    @classmethod
+    def build(cls, documents: Iterable[str], split_seg: bool = False, use_quotes: bool = False) -> "FeatureTable":
+        """
+        Scan the documents once and build their feature table.
+
+        Args:
+            documents (Iterable[str]): The documents.
+            split_seg (bool): Split the documents into segments, as `CantoneseDetector.split_seg`.
+            use_quotes (bool): Separate the matrix and the quotes, as `CantoneseDetector.use_quotes`.
+
+        Returns:
+            FeatureTable: The feature table of the documents.
+        """
+        detector = CantoneseDetector(split_seg=split_seg, use_quotes=use_quotes)
+        table = cls(split_seg, use_quotes, array("i"), array("i"), array("i"), array("q", [0]), array("q", [0]))
+
+        for document in documents:
+            # One part judged on its own, or the matrix and the quotes
+            for part in detector._separate_parts(document):
+                for segment in detector._split_part_texts(document, part):
+                    canto_count, swc_count, han_length = detector._get_segment_counts(segment)
+                    table.canto_counts.append(canto_count)
+                    table.swc_counts.append(swc_count)
+                    table.han_lengths.append(han_length)
+                table.part_offsets.append(len(table.han_lengths))
+            table.document_offsets.append(len(table.part_offsets) - 1)
+
+        return table
+
+    def __len__(self) -> int:
+        return len(self.document_offsets) - 1
+
+    def save(self, path: str) -> None:
+        """
+        Write the table to a file: a magic line, a JSON header line, then the raw little-endian arrays.
+        """
+        header = {"split_seg": self.split_seg, "use_quotes": self.use_quotes,
+                  "lengths": {name: len(getattr(self, name)) for name, _ in ARRAYS}}
+        with open(path, "wb") as f:
+            f.write(MAGIC)
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            for name, _ in ARRAYS:
+                values = getattr(self, name)
+                if sys.byteorder == "big":
+                    values = array(values.typecode, values)
+                    values.byteswap()
+                values.tofile(f)
+
+    @classmethod
+    def load(cls, path: str) -> "FeatureTable":
+        """
+        Read a table written by `save()`.
+        """
+        with open(path, "rb") as f:
+            if f.readline() != MAGIC:
+                raise ValueError(f"{path} is not a feature table")
+            header = json.loads(f.readline())
+            arrays = {name: cls._read_array(f, typecode, header["lengths"][name]) for name, typecode in ARRAYS}
+        return cls(header["split_seg"], header["use_quotes"], **arrays)
+
+    @staticmethod
+    def _read_array(f: BinaryIO, typecode: str, length: int) -> array:
+        values = array(typecode)
+        values.fromfile(f, length)
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+    def _unique_segments(self) -> Tuple[List[Tuple[int, int, int]], array]:
+        """
+        Return the distinct `(canto_count, swc_count, han_length)` triples, and the index of the triple of each
+        segment. Segments with the same triple always have the same judgement, so each triple is judged once.
+        """
+        if self._triples is None:
+            index: Dict[Tuple[int, int, int], int] = {}
+            self._triple_ids = array("i", (index.setdefault(triple, len(index))
+                                           for triple in zip(self.canto_counts, self.swc_counts, self.han_lengths)))
+            self._triples = list(index)
+        return self._triples, self._triple_ids
+
+    def judge(self, backend: str = "auto", **thresholds: float) -> List[JudgementType]:
+        """
+        Judge every document of the table with the given thresholds.
+
+        Args:
+            backend (str): `"numpy"` to judge with vectorized NumPy operations, `"python"` to judge in pure Python,
+                or `"auto"` to use NumPy if it is installed. Both give the same judgements.
+            **thresholds: `canto_tolerance`, `swc_tolerance`, `canto_presence` and `swc_presence`, as in
+                `CantoneseDetector`. Missing ones take their default values.
+
+        Returns:
+            List[JudgementType]: The same judgements as `CantoneseDetector(...).judge()` on each document.
+        """
+        if backend not in ("auto", "numpy", "python"):
+            raise ValueError(f"Unknown backend {backend!r}")
+        if backend == "numpy" and VectorJudge._numpy() is None:
+            raise ImportError("The numpy backend needs NumPy: pip install cantonesedetect[numpy]")
+
+        detector = CantoneseDetector(split_seg=self.split_seg, use_quotes=self.use_quotes, **thresholds)
+        if backend == "numpy" or (backend == "auto" and VectorJudge._numpy() is not None):
+            codes = self.judge_codes(detector)
+            return [JUDGEMENTS[code] for code in codes.tolist()]
+
+        triples, triple_ids = self._unique_segments()
+        triple_judgements = [detector._judge_segment_counts(*triple) for triple in triples]
+
+        part_offsets = self.part_offsets
+        part_judgements: List[JudgementType] = []
+        for part in range(len(part_offsets) - 1):
+            start, end = part_offsets[part], part_offsets[part + 1]
+            if end - start == 1:
+                # A single segment always reaches the 95% threshold of its own judgement
+                part_judgements.append(triple_judgements[triple_ids[start]])
+                continue
+            canto_seg_count = swc_seg_count = neutral_seg_count = 0
+            for triple_id in triple_ids[start:end]:
+                segment_judgement = triple_judgements[triple_id]
+                if segment_judgement is JudgementType.NEUTRAL:
+                    neutral_seg_count += 1
+                elif segment_judgement is JudgementType.CANTONESE:
+                    canto_seg_count += 1
+                elif segment_judgement is JudgementType.SWC:
+                    swc_seg_count += 1
+            part_judgements.append(detector._aggregate_segment_judgements(
+                canto_seg_count, swc_seg_count, neutral_seg_count, end - start))
+
+        document_offsets = self.document_offsets
+        judgements: List[JudgementType] = []
+        for document in range(len(document_offsets) - 1):
+            first_part = document_offsets[document]
+            if document_offsets[document + 1] - first_part == 1:
+                judgements.append(part_judgements[first_part])
+            else:
+                judgements.append(detector._combine_matrix_quotes(
+                    part_judgements[first_part], part_judgements[first_part + 1]))
+        return judgements
+
+    def judge_codes(self, detector: CantoneseDetector) -> Any:
+        """
+        Judge every document of the table with the thresholds of `detector` using NumPy.
+
+        Returns:
+            np.ndarray: The judgement code of each document, see `ParallelJudge.JUDGEMENT_CODES`.
+        """
+        segment_codes = VectorJudge.judge_segment_codes(
+            detector, self.canto_counts, self.swc_counts, self.han_lengths)
+        part_codes = VectorJudge.aggregate_part_codes(segment_codes, self.part_offsets)
+        return VectorJudge.combine_document_codes(detector, part_codes, self.document_offsets)
+
+    def judge_grid(self, configs: Iterable[Dict[str, Any]], backend: str = "auto") -> List[List[JudgementType]]:
+        """
+        Judge every document of the table under each threshold config.
+
+        Args:
+            configs (Iterable[dict]): The thresholds of `judge()` for each config.
+            backend (str): The backend of `judge()`.
+
+        Returns:
+            List[List[JudgementType]]: The judgements of the documents under each config, in order.
+        """
+        return [self.judge(backend=backend, **config) for config in configs]
@@ -0,0 +1,143 @@
+"""
+Opt-in timers and counters for the stages of `CantoneseDetector`.
+
+When enabled, `DetectorStats.attach()` replaces the stage methods of one detector instance by timed wrappers.
+A detector without instrumentation keeps its plain methods, so it pays nothing for this module.
+"""
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from .FeatureScanner import FeatureScanner
+from .Tokenizer import Segment
+
+# Stages timed by `DetectorStats`. Timers are inclusive: `judge` contains all the other stages, and `_judge_segments`
+# contains the split and the feature extraction of its segments, which is the pass of the feature scanner.
+STAGES: Tuple[str, ...] = (
+    "judge",
+    "_separate_parts",
+    "_split_part",
+    "_split_part_texts",
+    "_get_segment_features",
+    "_get_segment_counts",
+    "_judge_segments",
+)
+
+COUNTERS: Tuple[str, ...] = (
+    "documents",
+    "characters",
+    "segments",
+    "segment_characters",
+    "han_characters",
+    "canto_feature",
+    "canto_exclude",
+    "swc_feature",
+    "swc_exclude",
+)
+
+
+class DetectorStats:
+    """
+    Cumulative timers and counters of a detector.
+
+    The timers wrap the methods the detector runs, so they measure the same code as without instrumentation.
+    Han characters are counted by the feature scanner in the same pass as the features, so their cost is part of
+    `_get_segment_features` and `_get_segment_counts`. As `_get_segment_counts` only returns net counts, the matches
+    of each lexicon are counted by a second pass, whose time is left out of every timer.
+    Segments whose judgement comes from the segment cache are not counted, as no features are extracted for them.
+    The timers and counters are not locked: an instrumented detector shared by threads judges correctly, but some
+    increments may be lost.
+
+    Attributes:
+        seconds (dict): Cumulative wall time of each stage.
+        calls (dict): Number of calls of each stage.
+        counters (dict): Documents, characters and segments processed, and matches of each lexicon.
+    """
+
+    def __init__(self, scanner: FeatureScanner) -> None:
+        self.scanner: FeatureScanner = scanner
+        self.seconds: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        self.calls: Dict[str, int] = dict.fromkeys(STAGES, 0)
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        # Cumulative time spent updating the counters, which the timers subtract
+        self._overhead: List[float] = [0.0]
+
+    def reset(self) -> None:
+        """
+        Set all timers and counters to zero. The dicts are updated in place, as the wrappers hold them.
+        """
+        self.seconds.update(dict.fromkeys(STAGES, 0.0))
+        self.calls.update(dict.fromkeys(STAGES, 0))
+        self.counters.update(dict.fromkeys(COUNTERS, 0))
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Return a copy of the current timers and counters.
+        """
+        return {"seconds": dict(self.seconds), "calls": dict(self.calls), "counters": dict(self.counters)}
+
+    def _timed(self, stage: str, method: Callable) -> Callable:
+        seconds = self.seconds
+        calls = self.calls
+        overhead = self._overhead
+
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            excluded = overhead[0]
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                seconds[stage] += time.perf_counter() - start - (overhead[0] - excluded)
+                calls[stage] += 1
+
+        return wrapper
+
+    def attach(self, detector) -> None:
+        """
+        Replace the stage methods of `detector` by wrappers that update these stats.
+        """
+        counters = self.counters
+        overhead = self._overhead
+        scanner = self.scanner
+        judge = detector.judge
+        get_segment_features = self._timed("_get_segment_features", detector._get_segment_features)
+        get_segment_counts = self._timed("_get_segment_counts", detector._get_segment_counts)
+
+        def count(segment: str | Segment, segment_length: int, match_counts: Iterable[int]) -> None:
+            counters["segments"] += 1
+            counters["segment_characters"] += len(segment)
+            counters["han_characters"] += segment_length
+            canto_feature, canto_exclude, swc_feature, swc_exclude = match_counts
+            counters["canto_feature"] += canto_feature
+            counters["canto_exclude"] += canto_exclude
+            counters["swc_feature"] += swc_feature
+            counters["swc_exclude"] += swc_exclude
+
+        def counted_judge(document: str):
+            counters["documents"] += 1
+            counters["characters"] += len(document)
+            return judge(document)
+
+        def counted_get_segment_features(segment: str | Segment):
+            segment_features = get_segment_features(segment)
+            start = time.perf_counter()
+            count(segment, segment_features.segment_length, segment_features.match_counts())
+            overhead[0] += time.perf_counter() - start
+            return segment_features
+
+        def counted_get_segment_counts(segment: str | Segment) -> Tuple[int, int, int]:
+            result = get_segment_counts(segment)
+            start = time.perf_counter()
+            # The same single pass as `FeatureScanner.count()`, keeping the matches of each lexicon apart
+            pieces = [segment] if isinstance(segment, str) else segment.scan_texts()
+            match_counts = [sum(counts) for counts in zip(*map(scanner.count_matches, pieces))]
+            count(segment, match_counts.pop(), match_counts)
+            overhead[0] += time.perf_counter() - start
+            return result
+
+        detector.judge = self._timed("judge", counted_judge)
+        detector._get_segment_features = counted_get_segment_features
+        detector._get_segment_counts = counted_get_segment_counts
+        for stage in ("_separate_parts", "_split_part", "_split_part_texts", "_judge_segments"):
+            setattr(detector, stage, self._timed(stage, getattr(detector, stage)))
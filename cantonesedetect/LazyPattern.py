@@ -0,0 +1,42 @@
+"""
+Regexes compiled on first use, so that importing the package does not pay for the lexicons it may never match.
+"""
+import re
+from typing import Any, Optional
+
+
+class LazyPattern:
+    """
+    A stand-in for `re.compile(pattern, flags)`. The source is available as `pattern` without compiling. The
+    regex is compiled by the first access to any other attribute, e.g. `split`, and every attribute is then
+    stored on the instance, so later accesses cost the same as on the compiled pattern.
+
+    Attributes:
+        pattern (str): The regex source.
+        flags (int): The flags given to `re.compile()`.
+    """
+
+    def __init__(self, pattern: str, flags: int = 0) -> None:
+        self.pattern: str = pattern
+        self.flags: int = flags
+        self._compiled: Optional[re.Pattern] = None
+
+    def compile(self) -> re.Pattern:
+        """
+        Return the compiled regex, compiling it if needed.
+        """
+        if self._compiled is None:
+            # Threads racing on first use may both compile it, and get equal patterns: `re` caches compiled regexes
+            self._compiled = re.compile(self.pattern, self.flags)
+        return self._compiled
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for attributes not stored yet
+        if name.startswith("__"):
+            raise AttributeError(name)
+        value = getattr(self.compile(), name)
+        setattr(self, name, value)
+        return value
+
+    def __repr__(self) -> str:
+        return f"LazyPattern({self.pattern!r})"
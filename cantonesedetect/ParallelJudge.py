@@ -0,0 +1,257 @@
+"""
+Judge many documents with a pool of worker processes or threads.
+
+Each worker process builds its own `CantoneseDetector` once from the detector config, then judges documents in
+chunks. Without analysis, the judgements of a chunk are sent back as one `bytes` object with one byte per document,
+which is much cheaper to pickle than a list of `JudgementType`s.
+
+Worker threads share one detector, which is thread-safe, and nothing is pickled. Threads only judge in parallel on
+free-threaded CPython builds with the GIL disabled, where they are the default.
+"""
+import os
+import sys
+from array import array
+from collections import deque
+from itertools import islice
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .DocumentFeatures import DocumentFeatures
+from .JudgementTypes import JudgementType
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, Future
+
+BACKENDS: Tuple[str, ...] = ("auto", "process", "thread")
+
+JUDGEMENTS: Tuple[JudgementType, ...] = tuple(JudgementType)
+JUDGEMENT_CODES: Dict[JudgementType, int] = {
+    judgement: code for code, judgement in enumerate(JUDGEMENTS)}
+
+# The detector of a worker process, created once by `_init_worker()`
+_worker_detector = None
+
+
+def encode_judgements(judgements: Iterable[JudgementType]) -> bytes:
+    """
+    Pack judgements into one byte each.
+    """
+    return bytes(JUDGEMENT_CODES[judgement] for judgement in judgements)
+
+
+def decode_judgements(codes: bytes) -> List[JudgementType]:
+    """
+    Unpack judgements packed by `encode_judgements()`.
+    """
+    return [JUDGEMENTS[code] for code in codes]
+
+
+def chunked(documents: Iterable[str], chunksize: int) -> Iterator[List[str]]:
+    """
+    Split an iterable of documents into lists of at most `chunksize` documents.
+    """
+    iterator = iter(documents)
+    while chunk := list(islice(iterator, chunksize)):
+        yield chunk
+
+
+def _judge_documents(detector, documents: List[str]) -> bytes | List[Tuple[JudgementType, DocumentFeatures]]:
+    """
+    Judge a chunk of documents, packing the judgements if there is no analysis to return.
+    """
+    if detector.get_analysis:
+        return [detector.judge(document) for document in documents]
+    return encode_judgements(detector.judge(document) for document in documents)
+
+
+def _filter_documents(detector, documents: List[str], target: str) -> bytes:
+    """
+    Return one byte per document, 1 if `detector.is_<target>()` holds for it and 0 otherwise.
+    """
+    predicate = getattr(detector, f"is_{target}")
+    return bytes(predicate(document) for document in documents)
+
+
+def _tag_documents(detector, documents: List[str]) -> Tuple[array, array]:
+    """
+    Tag a chunk of documents, packing their spans as flat `(start, end, code)` triples with the number of spans of
+    each document.
+    """
+    spans, span_counts = array("q"), array("q")
+    for document in documents:
+        document_spans = detector.tag(document)
+        for start, end, judgement in document_spans:
+            spans.extend((start, end, JUDGEMENT_CODES[judgement]))
+        span_counts.append(len(document_spans))
+    return spans, span_counts
+
+
+def _decode_spans(spans: array, span_counts: array) -> List[List[Tuple[int, int, JudgementType]]]:
+    triples = iter(zip(*[iter(spans)] * 3))
+    return [[(start, end, JUDGEMENTS[code]) for start, end, code in islice(triples, count)] for count in span_counts]
+
+
+def default_backend() -> str:
+    """
+    Return the backend chosen by `"auto"`: `"thread"` if the GIL is disabled, otherwise `"process"`.
+    """
+    gil_enabled = getattr(sys, "_is_gil_enabled", lambda: True)
+    return "process" if gil_enabled() else "thread"
+
+
+def _init_worker(config: Dict[str, Any]) -> None:
+    global _worker_detector
+    from .Detector import CantoneseDetector
+    _worker_detector = CantoneseDetector(**config)
+
+
+def _call_with_worker_detector(function: Callable, args: Tuple) -> Any:
+    return function(_worker_detector, *args)
+
+
+class JudgePool:
+    """
+    A pool of processes or threads that judge chunks of documents with the same detector config.
+    With `workers=1` the chunks are judged in the current process, without starting a pool.
+
+    Attributes:
+        config (dict): The keyword arguments used to create the `CantoneseDetector` of every worker.
+        workers (int): Number of workers. Defaults to the number of CPUs.
+        backend (str): `"process"` for worker processes, each with its own detector, `"thread"` for worker threads
+            sharing one detector, or `"auto"` for `default_backend()`.
+    """
+
+    def __init__(self, config: Dict[str, Any], workers: Optional[int] = None, backend: str = "auto") -> None:
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}")
+        self.config: Dict[str, Any] = config
+        self.workers: int = workers or os.cpu_count() or 1
+        self.backend: str = default_backend() if backend == "auto" else backend
+
+        self._executor: Optional["Executor"] = None
+        self._detector = None
+        if self.workers > 1 and self.backend == "process":
+            # Only imported with workers, as it is slow to import
+            from concurrent.futures import ProcessPoolExecutor
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker, initargs=(config,))
+        else:
+            from .Detector import CantoneseDetector
+            self._detector = CantoneseDetector(**config)
+            if self.workers > 1:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+
+    def map_ordered(self, function: Callable, tasks: Iterable[Tuple], max_pending: Optional[int] = None) -> Iterator[Tuple[Tuple, Any]]:
+        """
+        Call `function(detector, *task)` for every task with the detector of a worker, and yield each task with
+        its result in input order. `function` must be defined at module level so that it can be sent to the workers.
+
+        Args:
+            function (Callable): The function to call in the workers.
+            tasks (Iterable[Tuple]): The arguments of each call. Consumed lazily.
+            max_pending (int): The maximum number of tasks submitted but not yet yielded, which bounds the memory
+                used by the pool. Defaults to twice the number of workers.
+
+        Yields:
+            tuple: The task and its result.
+        """
+        if self._executor is None:
+            for task in tasks:
+                yield task, function(self._detector, *task)
+            return
+
+        max_pending = max_pending or 2 * self.workers
+        pending: Deque[Tuple[Tuple, "Future"]] = deque()
+        for task in tasks:
+            if self._detector is not None:
+                # Worker threads share the detector of the pool
+                future = self._executor.submit(function, self._detector, *task)
+            else:
+                future = self._executor.submit(_call_with_worker_detector, function, task)
+            pending.append((task, future))
+            if len(pending) >= max_pending:
+                task, future = pending.popleft()
+                yield task, future.result()
+        while pending:
+            task, future = pending.popleft()
+            yield task, future.result()
+
+    def imap(self, chunks: Iterable[List[str]], max_pending: Optional[int] = None) -> Iterator[Tuple[List[str], List[JudgementType] | List[Tuple[JudgementType, DocumentFeatures]]]]:
+        """
+        Judge chunks of documents and yield each chunk with its results, in input order.
+
+        Args:
+            chunks (Iterable[List[str]]): The chunks of documents to be judged. Consumed lazily.
+            max_pending (int): The maximum number of chunks submitted but not yet yielded.
+
+        Yields:
+            tuple: The chunk, and its judgements or `(judgement, document_features)` tuples if `get_analysis` is True.
+        """
+        for (chunk,), result in self.map_ordered(_judge_documents, ((chunk,) for chunk in chunks), max_pending):
+            yield chunk, self._decode(result)
+
+    def ifilter(self, chunks: Iterable[List[str]], target: str, max_pending: Optional[int] = None) -> Iterator[Tuple[List[str], bytes]]:
+        """
+        Test chunks of documents with `is_cantonese()` or `is_swc()` and yield each chunk with its results, in
+        input order.
+
+        Args:
+            chunks (Iterable[List[str]]): The chunks of documents to be tested. Consumed lazily.
+            target (str): `"cantonese"` or `"swc"`.
+            max_pending (int): The maximum number of chunks submitted but not yet yielded.
+
+        Yields:
+            tuple: The chunk, and one byte per document, 1 if it is judged as `target` and 0 otherwise.
+        """
+        for (chunk, _), result in self.map_ordered(_filter_documents, ((chunk, target) for chunk in chunks), max_pending):
+            yield chunk, result
+
+    def itag(self, chunks: Iterable[List[str]], max_pending: Optional[int] = None) -> Iterator[Tuple[List[str], List[List[Tuple[int, int, JudgementType]]]]]:
+        """
+        Tag chunks of documents with `tag()` and yield each chunk with the spans of its documents, in input order.
+
+        Args:
+            chunks (Iterable[List[str]]): The chunks of documents to be tagged. Consumed lazily.
+            max_pending (int): The maximum number of chunks submitted but not yet yielded.
+
+        Yields:
+            tuple: The chunk, and the `(start, end, judgement)` spans of each document.
+        """
+        for (chunk,), result in self.map_ordered(_tag_documents, ((chunk,) for chunk in chunks), max_pending):
+            yield chunk, _decode_spans(*result)
+
+    @staticmethod
+    def _decode(result: bytes | List[Tuple[JudgementType, DocumentFeatures]]) -> List[JudgementType] | List[Tuple[JudgementType, DocumentFeatures]]:
+        return decode_judgements(result) if isinstance(result, bytes) else result
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self) -> "JudgePool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def judge_many(config: Dict[str, Any], documents: Iterable[str], workers: Optional[int] = None, chunksize: int = 256, backend: str = "auto") -> List[JudgementType] | List[Tuple[JudgementType, DocumentFeatures]]:
+    """
+    Judge documents in parallel and return the results in input order.
+
+    Args:
+        config (dict): The keyword arguments of the `CantoneseDetector` used by the workers.
+        documents (Iterable[str]): The documents to be judged.
+        workers (int): Number of workers. Defaults to the number of CPUs.
+        chunksize (int): Number of documents sent to a worker at a time.
+        backend (str): `"process"`, `"thread"` or `"auto"`, see `JudgePool`.
+
+    Returns:
+        list: The judgements, or `(judgement, document_features)` tuples if `get_analysis` is True.
+    """
+    results = []
+    with JudgePool(config, workers, backend) as pool:
+        for _, chunk_results in pool.imap(chunked(documents, chunksize)):
+            results.extend(chunk_results)
+    return results
@@ -0,0 +1,227 @@
+"""
+Machine-readable output of judgements and analysis: JSON Lines, and a columnar binary format.
+
+Each document becomes one record: its input, its judgement and, if the detector was built with `get_analysis`,
+its segments with their judgements, feature counts, Han lengths, content ratios and matched features.
+
+The columnar format is a sequence of self-contained blocks, one per batch of documents, so blocks written by
+different workers or jobs can be concatenated in any order into a valid file. A block is the magic line, a JSON
+header line with the length of every column, then the raw little-endian columns, in the order of `COLUMNS`.
+"""
+import sys
+from array import array
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, TextIO, Tuple
+
+from .FeatureScanner import CANTO_EXCLUDE, CANTO_FEATURE, SWC_EXCLUDE, SWC_FEATURE
+from .JudgementTypes import JudgementType
+from .ParallelJudge import JUDGEMENT_CODES, JUDGEMENTS
+
+OUTPUT_FORMATS: Tuple[str, ...] = ("text", "jsonl", "columnar")
+
+MAGIC = b"CDCOL1\n"
+
+# The columns of a block, with their typecodes. Text columns are UTF-8 bytes, sliced by their offset columns.
+# Per document: the judgement code, the input and the first segment. Per segment: the judgement code, the counts,
+# the text, the `(start, end)` pieces in the input and the matches, as flat `(lexicon, start, end)` offsets
+# into the text of the segment.
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("judgements", "B"),
+    ("input_offsets", "q"),
+    ("inputs", "B"),
+    ("segment_offsets", "q"),
+    ("segment_judgements", "B"),
+    ("canto_feature_counts", "i"),
+    ("swc_feature_counts", "i"),
+    ("han_lengths", "i"),
+    ("text_offsets", "q"),
+    ("texts", "B"),
+    ("piece_offsets", "q"),
+    ("pieces", "q"),
+    ("match_offsets", "q"),
+    ("matches", "i"),
+)
+
+LEXICONS: Tuple[Tuple[str, int], ...] = (
+    ("canto_feature", CANTO_FEATURE),
+    ("canto_exclude", CANTO_EXCLUDE),
+    ("swc_feature", SWC_FEATURE),
+    ("swc_exclude", SWC_EXCLUDE),
+)
+
+
+def _segment_record(text: str, pieces: Iterable[Tuple[int, int]], judgement: JudgementType, canto_feature_count: int, swc_feature_count: int, han_length: int, matches: Iterable[int]) -> Dict[str, Any]:
+    triples = list(zip(*[iter(matches)] * 3))
+    record: Dict[str, Any] = {
+        "text": text,
+        "offsets": [[start, end] for start, end in pieces],
+        "judgement": judgement.value,
+        "canto_feature_count": canto_feature_count,
+        "swc_feature_count": swc_feature_count,
+        "han_length": han_length,
+        "canto_content": canto_feature_count / han_length if han_length > 0 else 0,
+        "swc_content": swc_feature_count / han_length if han_length > 0 else 0,
+    }
+    for name, lexicon in LEXICONS:
+        record[name] = [text[start:end] for code, start, end in triples if code == lexicon]
+    return record
+
+
+def document_record(document: str, result: JudgementType | Tuple) -> Dict[str, Any]:
+    """
+    Return the record of a document.
+
+    Args:
+        document (str): The input document.
+        result: The result of `judge()`: a judgement, or a `(judgement, document_features)` tuple.
+
+    Returns:
+        dict: `input` and `judgement`, and `segments` if the result has the document features.
+    """
+    if isinstance(result, JudgementType):
+        return {"input": document, "judgement": result.value}
+
+    judgement, document_features = result
+    return {
+        "input": document,
+        "judgement": judgement.value,
+        "segments": [
+            _segment_record(segment_features.segment, segment_features.offsets, segment_judgement,
+                            segment_features.canto_feature_count, segment_features.swc_feature_count,
+                            segment_features.segment_length, segment_features.matches)
+            for segment_features, segment_judgement in zip(document_features.document_segments_features,
+                                                           document_features.document_segments_judgements)
+        ],
+    }
+
+
+def write_results(writer: TextIO, lines: List[str], results: List, print_analysis: bool) -> None:
+    """
+    Write the judgements of input lines as the CLI prints them, with the analysis if `print_analysis` is True.
+    The analysis of each document is written to `writer` as it is rendered.
+    """
+    if print_analysis:
+        for line, (judgement, document_features) in zip(lines, results):
+            writer.write(f"====================================\nINPUT:{line}\nJUDGEMENT: {judgement.value}\n")
+            document_features.write_analysis(writer)
+    else:
+        writer.write("".join(judgement.value + '\n' for judgement in results))
+
+
+def write_jsonl(writer: TextIO, documents: Iterable[str], results: Iterable) -> None:
+    """
+    Write one JSON record per document to a text stream, each as soon as it is built.
+    """
+    # Only imported for the JSON formats, so that the CLI does not import it for text output
+    import json
+    for document, result in zip(documents, results):
+        writer.write(json.dumps(document_record(document, result), ensure_ascii=False) + "\n")
+
+
+def encode_columnar(documents: Iterable[str], results: Iterable) -> bytes:
+    """
+    Encode a batch of documents and their results as one block of the columnar format.
+    """
+    import json
+    columns: Dict[str, array] = {name: array(typecode) for name, typecode in COLUMNS}
+    columns["input_offsets"].append(0)
+    columns["segment_offsets"].append(0)
+    columns["text_offsets"].append(0)
+    columns["piece_offsets"].append(0)
+    columns["match_offsets"].append(0)
+    inputs = bytearray()
+    texts = bytearray()
+    analysis = False
+
+    for document, result in zip(documents, results):
+        if isinstance(result, JudgementType):
+            judgement = result
+        else:
+            analysis = True
+            judgement, document_features = result
+            for segment_features, segment_judgement in zip(document_features.document_segments_features,
+                                                           document_features.document_segments_judgements):
+                columns["segment_judgements"].append(JUDGEMENT_CODES[segment_judgement])
+                columns["canto_feature_counts"].append(segment_features.canto_feature_count)
+                columns["swc_feature_counts"].append(segment_features.swc_feature_count)
+                columns["han_lengths"].append(segment_features.segment_length)
+                texts += segment_features.segment.encode("utf-8")
+                columns["text_offsets"].append(len(texts))
+                for piece in segment_features.offsets:
+                    columns["pieces"].extend(piece)
+                columns["piece_offsets"].append(len(columns["pieces"]) // 2)
+                columns["matches"].extend(segment_features.matches)
+                columns["match_offsets"].append(len(columns["matches"]) // 3)
+        columns["judgements"].append(JUDGEMENT_CODES[judgement])
+        inputs += document.encode("utf-8")
+        columns["input_offsets"].append(len(inputs))
+        columns["segment_offsets"].append(len(columns["segment_judgements"]))
+
+    columns["inputs"].frombytes(inputs)
+    columns["texts"].frombytes(texts)
+    header = {"documents": len(columns["judgements"]), "analysis": analysis,
+              "lengths": {name: len(columns[name]) for name, _ in COLUMNS}}
+    block = bytearray(MAGIC)
+    block += json.dumps(header).encode("utf-8") + b"\n"
+    for name, _ in COLUMNS:
+        values = columns[name]
+        if sys.byteorder == "big":
+            values.byteswap()
+        block += values.tobytes()
+    return bytes(block)
+
+
+def read_columnar_blocks(stream: BinaryIO) -> Iterator[Tuple[Dict[str, Any], Dict[str, array]]]:
+    """
+    Read the blocks of a columnar file one at a time.
+
+    Yields:
+        tuple: The header of the block, and its columns as arrays.
+    """
+    import json
+    while True:
+        magic = stream.readline()
+        if not magic:
+            return
+        if magic != MAGIC:
+            raise ValueError("Not a columnar judgement block")
+        header = json.loads(stream.readline())
+        columns: Dict[str, array] = {}
+        for name, typecode in COLUMNS:
+            values = array(typecode)
+            values.fromfile(stream, header["lengths"][name])
+            if sys.byteorder == "big":
+                values.byteswap()
+            columns[name] = values
+        yield header, columns
+
+
+def read_columnar(stream: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """
+    Read a columnar file back into the same records as `document_record()`.
+    """
+    for header, columns in read_columnar_blocks(stream):
+        inputs = columns["inputs"].tobytes()
+        texts = columns["texts"].tobytes()
+        input_offsets, segment_offsets = columns["input_offsets"], columns["segment_offsets"]
+        text_offsets, piece_offsets, match_offsets = \
+            columns["text_offsets"], columns["piece_offsets"], columns["match_offsets"]
+        pieces, matches = columns["pieces"], columns["matches"]
+
+        for index in range(header["documents"]):
+            record: Dict[str, Any] = {
+                "input": inputs[input_offsets[index]:input_offsets[index + 1]].decode("utf-8"),
+                "judgement": JUDGEMENTS[columns["judgements"][index]].value,
+            }
+            if header["analysis"]:
+                segments: List[Dict[str, Any]] = []
+                for segment in range(segment_offsets[index], segment_offsets[index + 1]):
+                    piece_start, piece_end = piece_offsets[segment], piece_offsets[segment + 1]
+                    segments.append(_segment_record(
+                        texts[text_offsets[segment]:text_offsets[segment + 1]].decode("utf-8"),
+                        zip(pieces[2 * piece_start:2 * piece_end:2], pieces[2 * piece_start + 1:2 * piece_end:2]),
+                        JUDGEMENTS[columns["segment_judgements"][segment]],
+                        columns["canto_feature_counts"][segment], columns["swc_feature_counts"][segment],
+                        columns["han_lengths"][segment],
+                        matches[3 * match_offsets[segment]:3 * match_offsets[segment + 1]]))
+                record["segments"] = segments
+            yield record
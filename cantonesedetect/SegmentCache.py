@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class SegmentCache:
+    """
+    A bounded least-recently-used cache of segment judgements, for corpora where the same short segments repeat
+    many times. The keys contain the segment and the threshold config, so one cache can be shared by detectors
+    with different thresholds. The cache is locked, so a detector and its cache can be shared by threads.
+
+    Attributes:
+        maxsize (int): The maximum number of cached segments. The least recently used segment is evicted first.
+        hits (int): Number of lookups that found a cached judgement.
+        misses (int): Number of lookups that did not.
+        evictions (int): Number of judgements evicted to keep the cache within `maxsize`.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        if maxsize <= 0:
+            raise ValueError(f"Cache size must be positive, got {maxsize}")
+        self.maxsize: int = maxsize
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        # Another thread may evict a key between a lookup and `move_to_end()`
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Return the cached value of `key` and mark it as recently used, or None if it is not cached.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Cache a value, evicting the least recently used one if the cache is full.
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Remove all cached values and reset the statistics.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, int | float]:
+        """
+        Return the hit/miss statistics of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups > 0 else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
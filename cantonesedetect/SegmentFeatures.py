@@ -1,22 +1,138 @@
-from typing import List
+from array import array
+from typing import List, Optional, Sequence, Tuple
+
+from cantonesedetect.FeatureScanner import CANTO_EXCLUDE, CANTO_FEATURE, SWC_EXCLUDE, SWC_FEATURE
 
 
 class SegmentFeatures:
-    def __init__(self, segment, canto_feature, canto_exclude, swc_feature,
-                 swc_exclude, canto_feature_count, swc_feature_count, segment_length) -> None:
-        self.segment: str = segment
+    """
+    The features of a segment, kept as offsets: the segment is a reference to its document and its pieces, and the
+    matches are `(lexicon, start, end)` offsets into the text of the segment. The strings are only built when
+    they are read.
+
+    Attributes:
+        document (str): The document the segment belongs to, or the segment itself.
+        offsets (Sequence[Tuple[int, int]]): The `(start, end)` pieces of the segment in `document`.
+        joiner (str): The text that stands between two pieces, see `Tokenizer.Part`.
+        matches (array): The matches of the four lexicons, as flat `(lexicon, start, end)` integers.
+        canto_feature_count (int): The net number of Cantonese features.
+        swc_feature_count (int): The net number of SWC features.
+        segment_length (int): The number of Han characters.
+    """
+    __slots__ = ("document", "offsets", "joiner", "matches",
+                 "canto_feature_count", "swc_feature_count", "segment_length")
 
-        self.canto_feature: List[str] = canto_feature
-        self.canto_exclude: List[str] = canto_exclude
-        self.swc_feature: List[str] = swc_feature
-        self.swc_exclude: List[str] = swc_exclude
+    def __init__(self, segment: str, canto_feature: List[str], canto_exclude: List[str], swc_feature: List[str],
+                 swc_exclude: List[str], canto_feature_count: int, swc_feature_count: int, segment_length: int) -> None:
+        """
+        Build the features of a segment from the matched strings of each lexicon, in order, as the detector did
+        before it kept offsets. See `from_offsets()` for the form the detector uses.
 
+        Raises:
+            ValueError: If a match is not found in the segment after the previous match of its lexicon.
+        """
+        found: List[Tuple[int, int, int]] = []
+        for lexicon, features in ((CANTO_FEATURE, canto_feature), (CANTO_EXCLUDE, canto_exclude),
+                                  (SWC_FEATURE, swc_feature), (SWC_EXCLUDE, swc_exclude)):
+            position = 0
+            for feature in features:
+                start = segment.find(feature, position)
+                if start < 0:
+                    raise ValueError(f"{feature!r} is not found in the segment {segment!r}")
+                position = start + len(feature)
+                found.append((start, lexicon, position))
+
+        self.document: str = segment
+        self.offsets: Sequence[Tuple[int, int]] = ((0, len(segment)),)
+        self.joiner: str = ""
+        self.matches: array = array("i", (value for start, lexicon, end in sorted(found)
+                                          for value in (lexicon, start, end)))
         self.canto_feature_count: int = canto_feature_count
         self.swc_feature_count: int = swc_feature_count
         # Input with no Han characters will have a length of 0.
         self.segment_length: int = segment_length
 
-        self.canto_content: float = canto_feature_count / \
-            segment_length if segment_length > 0 else 0
-        self.swc_content: float = swc_feature_count / \
-            segment_length if segment_length > 0 else 0
+    @classmethod
+    def from_offsets(cls, document: str, offsets: Sequence[Tuple[int, int]], joiner: str, matches: array, segment_length: int) -> "SegmentFeatures":
+        """
+        Build the features of a segment from the matches found by `FeatureScanner.find_offsets()`.
+
+        Args:
+            document (str): The document the segment belongs to, or the segment itself.
+            offsets (Sequence[Tuple[int, int]]): The `(start, end)` pieces of the segment in `document`.
+            joiner (str): The text that stands between two pieces.
+            matches (array): The matches as flat `(lexicon, start, end)` integers, offsets into the segment text.
+            segment_length (int): The number of Han characters.
+
+        Returns:
+            SegmentFeatures: The features, with the net counts of the matches.
+        """
+        segment_features = object.__new__(cls)
+        segment_features.document, segment_features.offsets, segment_features.joiner = document, offsets, joiner
+        segment_features.matches = matches
+        lexicons = matches[0::3]
+        segment_features.canto_feature_count = lexicons.count(CANTO_FEATURE) - lexicons.count(CANTO_EXCLUDE)
+        segment_features.swc_feature_count = lexicons.count(SWC_FEATURE) - lexicons.count(SWC_EXCLUDE)
+        segment_features.segment_length = segment_length
+        return segment_features
+
+    def relocate(self, document: str, offsets: Sequence[Tuple[int, int]], joiner: str) -> "SegmentFeatures":
+        """
+        Return the same features for another occurrence of the same segment text, e.g. from the segment cache.
+        """
+        segment_features = object.__new__(SegmentFeatures)
+        segment_features.document, segment_features.offsets, segment_features.joiner = document, offsets, joiner
+        segment_features.matches = self.matches
+        segment_features.canto_feature_count = self.canto_feature_count
+        segment_features.swc_feature_count = self.swc_feature_count
+        segment_features.segment_length = self.segment_length
+        return segment_features
+
+    @property
+    def segment(self) -> str:
+        if len(self.offsets) == 1:
+            start, end = self.offsets[0]
+            return self.document[start:end]
+        return self.joiner.join(self.document[start:end] for start, end in self.offsets)
+
+    def match_counts(self) -> Tuple[int, int, int, int]:
+        """
+        Return the numbers of Cantonese features, Cantonese exclusions, SWC features and SWC exclusions.
+        """
+        lexicons = self.matches[0::3]
+        return (lexicons.count(CANTO_FEATURE), lexicons.count(CANTO_EXCLUDE),
+                lexicons.count(SWC_FEATURE), lexicons.count(SWC_EXCLUDE))
+
+    def _matched(self, lexicon: int, segment: Optional[str] = None) -> List[str]:
+        """
+        Return the matches of a lexicon as strings, in order.
+        """
+        if segment is None:
+            segment = self.segment
+        matches = self.matches
+        return [segment[matches[index + 1]:matches[index + 2]]
+                for index in range(0, len(matches), 3) if matches[index] == lexicon]
+
+    @property
+    def canto_feature(self) -> List[str]:
+        return self._matched(CANTO_FEATURE)
+
+    @property
+    def canto_exclude(self) -> List[str]:
+        return self._matched(CANTO_EXCLUDE)
+
+    @property
+    def swc_feature(self) -> List[str]:
+        return self._matched(SWC_FEATURE)
+
+    @property
+    def swc_exclude(self) -> List[str]:
+        return self._matched(SWC_EXCLUDE)
+
+    @property
+    def canto_content(self) -> float:
+        return self.canto_feature_count / self.segment_length if self.segment_length > 0 else 0
+
+    @property
+    def swc_content(self) -> float:
+        return self.swc_feature_count / self.segment_length if self.segment_length > 0 else 0
@@ -0,0 +1,259 @@
+"""
+A local judging server, so that several services can share one detector and its compiled lexicons.
+
+The server speaks a minimal HTTP/1.1 over a TCP or a Unix socket, with keep-alive:
+
+- `POST /judge` with `{"document": "..."}` returns the record of the document, or with `{"documents": [...]}` the
+  records of all of them, in order. A record is `{"judgement": ...}`, plus `"segments"` with `get_analysis`.
+- `GET /stats` returns the throughput and latency counters.
+- `GET /health` returns `{"status": "ok"}`.
+
+The documents of concurrent requests are judged together in micro-batches by an `AsyncJudge`, in a thread, or in
+a pool of worker processes.
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .AsyncJudge import AsyncJudge
+from .ParallelJudge import BACKENDS, default_backend
+from .Records import document_record
+
+# Latencies kept for the percentiles of `/stats`
+LATENCY_WINDOW = 10000
+
+MAX_BODY_SIZE = 64 * 1024 * 1024
+
+REASONS: Dict[int, str] = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    """
+    An error response.
+    """
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status: int = status
+
+
+class ServerStats:
+    """
+    Throughput and latency of a server.
+
+    Attributes:
+        requests (int): Number of `/judge` requests answered.
+        documents (int): Number of documents judged.
+        errors (int): Number of error responses.
+        latencies (deque): Seconds from reading to answering each of the last `LATENCY_WINDOW` requests.
+    """
+
+    def __init__(self) -> None:
+        self.started: float = time.monotonic()
+        self.requests: int = 0
+        self.documents: int = 0
+        self.errors: int = 0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, documents: int, latency: float) -> None:
+        self.requests += 1
+        self.documents += documents
+        self.latencies.append(latency)
+
+    def snapshot(self, judge: AsyncJudge) -> Dict[str, Any]:
+        """
+        Return the counters as a JSON-serializable dict.
+        """
+        uptime = time.monotonic() - self.started
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+        return {
+            "uptime": uptime,
+            "requests": self.requests,
+            "documents": self.documents,
+            "errors": self.errors,
+            "batches": judge.batches,
+            "mean_batch_size": judge.documents / judge.batches if judge.batches else 0.0,
+            "documents_per_second": self.documents / uptime if uptime > 0 else 0.0,
+            "latency": {
+                "p50": percentile(0.5),
+                "p90": percentile(0.9),
+                "p99": percentile(0.99),
+                "max": latencies[-1] if latencies else 0.0,
+            },
+        }
+
+
+class JudgeServer:
+    """
+    Serve the judgements of a detector over HTTP.
+
+    Attributes:
+        detector (CantoneseDetector): The detector. Worker processes create their own from its config, worker
+            threads share it.
+        workers (int): Number of workers. With 1 worker, batches are judged in a dedicated thread of this process.
+        backend (str): `"process"`, `"thread"` or `"auto"` for the workers, see `ParallelJudge.JudgePool`.
+        judge (AsyncJudge): The micro-batcher, created by `start()`.
+        stats (ServerStats): The throughput and latency counters.
+    """
+
+    def __init__(self, detector, workers: int = 1, max_batch_size: int = 64, max_delay: float = 0.001, max_pending: int = 1024, max_body_size: int = MAX_BODY_SIZE, backend: str = "auto") -> None:
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}")
+        self.detector = detector
+        self.workers: int = workers
+        self.backend: str = default_backend() if backend == "auto" else backend
+        self.max_batch_size: int = max_batch_size
+        self.max_delay: float = max_delay
+        self.max_pending: int = max_pending
+        self.max_body_size: int = max_body_size
+        self.judge: Optional[AsyncJudge] = None
+        self.stats: ServerStats = ServerStats()
+        self.server: Optional[asyncio.AbstractServer] = None
+        self._executor: Optional[Executor] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000, path: Optional[str] = None) -> asyncio.AbstractServer:
+        """
+        Start listening on a Unix socket if `path` is given, otherwise on a TCP port.
+
+        Returns:
+            asyncio.AbstractServer: The listening server. With `port=0`, its sockets tell the port chosen.
+        """
+        # A thread of its own, so that other users of the default executor cannot starve the batches
+        if self.workers > 1 and self.backend == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.judge = AsyncJudge(self.detector, executor=self._executor, max_batch_size=self.max_batch_size,
+                                max_delay=self.max_delay, max_pending=self.max_pending,
+                                max_concurrent_batches=self.workers)
+        self.stats = ServerStats()
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self._handle, path=path)
+        else:
+            self.server = await asyncio.start_server(self._handle, host=host, port=port)
+        return self.server
+
+    async def close(self) -> None:
+        """
+        Stop listening, finish the batches in flight and shut the worker processes down.
+        """
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.judge is not None:
+            await self.judge.aclose()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def _judge_body(self, body: bytes) -> Dict[str, Any] | List[Dict[str, Any]]:
+        try:
+            request = json.loads(body)
+        except ValueError:
+            raise HTTPError(400, "The body is not valid JSON")
+
+        single = isinstance(request, dict) and isinstance(request.get("document"), str)
+        if single:
+            documents = [request["document"]]
+        elif isinstance(request, dict) and isinstance(request.get("documents"), list) \
+                and all(isinstance(document, str) for document in request["documents"]):
+            documents = request["documents"]
+        else:
+            raise HTTPError(400, "Expected {\"document\": str} or {\"documents\": [str, ...]}")
+
+        results = await asyncio.gather(*(self.judge.judge(document) for document in documents))
+        records = []
+        for document, result in zip(documents, results):
+            record = document_record(document, result)
+            del record["input"]
+            records.append(record)
+        return records[0] if single else records
+
+    async def _respond(self, method: str, target: str, body: bytes) -> Tuple[int, Any]:
+        if target == "/judge":
+            if method != "POST":
+                raise HTTPError(405, "Use POST")
+            start = time.perf_counter()
+            response = await self._judge_body(body)
+            self.stats.record(len(response) if isinstance(response, list) else 1, time.perf_counter() - start)
+            return 200, response
+        if target in ("/stats", "/health"):
+            if method != "GET":
+                raise HTTPError(405, "Use GET")
+            return 200, self.stats.snapshot(self.judge) if target == "/stats" else {"status": "ok"}
+        raise HTTPError(404, f"No such path: {target}")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Answer the requests of one connection until it is closed.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers: Dict[str, str] = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                    length = int(headers.get("content-length", 0))
+                    if length > self.max_body_size:
+                        keep_alive = False
+                        raise HTTPError(413, "The body is too large")
+                    body = await reader.readexactly(length)
+                    status, response = await self._respond(method, target, body)
+                except HTTPError as e:
+                    self.stats.errors += 1
+                    status, response = e.status, {"error": str(e)}
+                except ValueError:
+                    self.stats.errors += 1
+                    keep_alive = False
+                    status, response = 400, {"error": "Malformed request"}
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as e:
+                    self.stats.errors += 1
+                    status, response = 500, {"error": str(e)}
+
+                payload = json.dumps(response, ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(payload)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    .encode("latin-1") + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(detector, host: str = "127.0.0.1", port: int = 8000, path: Optional[str] = None, **kwargs) -> None:
+    """
+    Run a `JudgeServer` until cancelled. The keyword arguments are passed to `JudgeServer`.
+    """
+    server = JudgeServer(detector, **kwargs)
+    listener = await server.start(host=host, port=port, path=path)
+    try:
+        await listener.serve_forever()
+    finally:
+        await server.close()
@@ -0,0 +1,201 @@
+"""
+Judge a document that arrives in chunks, without keeping the whole document in memory.
+
+The document is consumed from left to right. Quotes are separated as `Tokenizer` does, and the matrix and
+the quotes are each fed to an accumulator that splits them into segments and only keeps running counters of the
+segment judgements. The final judgement is the same as `CantoneseDetector.judge()` on the whole document.
+
+Only text that is not decided yet is buffered: the current segment, the lookahead of the feature scanner, and a
+quote from its opening mark until the next opening mark of the same type, because a quote ends at the last
+closing mark before it.
+"""
+import re
+from typing import List
+
+from .Detector import ALL_DELIMITERS_RE, FEATURE_SCANNER, CantoneseDetector
+from .JudgementTypes import JudgementType
+
+# The opening and closing marks of `ALL_QUOTEMARKS_RE`
+QUOTE_PAIRS = {"「": "」", "“": "”", "《": "》", "【": "】", "『": "』"}
+QUOTE_OPENING_RE = re.compile("[" + "".join(QUOTE_PAIRS) + "]")
+
+
+class _SegmentAccumulator:
+    """
+    Incrementally judge a text as `CantoneseDetector._judge_document()` would, keeping only counters.
+    """
+
+    def __init__(self, detector: CantoneseDetector) -> None:
+        self.detector = detector
+        # Split mode: the pieces of the current segment and the segment judgement counters
+        self.parts: List[str] = []
+        self.canto_seg_count = self.swc_seg_count = self.neutral_seg_count = self.total_seg_count = 0
+        # Unsplit mode: the text not scanned yet, the scan positions of the lexicons and the feature counts
+        self.tail: str = ""
+        self.resume: List[int] = [0, 0, 0, 0]
+        self.counts: List[int] = [0, 0, 0, 0, 0]
+
+    def feed(self, text: str) -> None:
+        if not text:
+            return
+        if self.detector.split_seg:
+            self._feed_segments(text)
+        else:
+            self._scan(self.tail + text, final=False)
+
+    def _feed_segments(self, text: str) -> None:
+        if ALL_DELIMITERS_RE.search(text) is None:
+            self.parts.append(text)
+            return
+        self.parts.append(text)
+        pieces = ALL_DELIMITERS_RE.split("".join(self.parts))
+        for segment in pieces[:-1]:
+            self._judge_segment(segment)
+        self.parts = [pieces[-1]]
+
+    def _judge_segment(self, segment: str) -> None:
+        if not segment.strip():
+            return
+        segment_judgement = self.detector._judge_single_segment(segment)
+        self.total_seg_count += 1
+        if segment_judgement is JudgementType.NEUTRAL:
+            self.neutral_seg_count += 1
+        elif segment_judgement is JudgementType.CANTONESE:
+            self.canto_seg_count += 1
+        elif segment_judgement is JudgementType.SWC:
+            self.swc_seg_count += 1
+
+    def _scan(self, text: str, final: bool) -> None:
+        # A match starting at a position may extend up to `max_literal_length` characters, so positions are only
+        # scanned once that much text follows them, or at the end.
+        stop = len(text) if final else max(0, len(text) - FEATURE_SCANNER.max_literal_length + 1)
+        counts = FEATURE_SCANNER.count_matches(text, stop, self.resume)
+        for index, count in enumerate(counts):
+            self.counts[index] += count
+        self.resume = [max(0, position - stop) for position in self.resume]
+        self.tail = text[stop:]
+
+    def finish(self) -> JudgementType:
+        if self.detector.split_seg:
+            self._judge_segment("".join(self.parts))
+            self.parts = []
+            return self.detector._aggregate_segment_judgements(
+                self.canto_seg_count, self.swc_seg_count, self.neutral_seg_count, self.total_seg_count)
+
+        self._scan(self.tail, final=True)
+        canto_feature, canto_exclude, swc_feature, swc_exclude, segment_length = self.counts
+        return self.detector._judge_segment_counts(
+            canto_feature - canto_exclude, swc_feature - swc_exclude, segment_length)
+
+
+class StreamingDetector:
+    """
+    Judge a document fed in chunks with `feed()`, and get its judgement with `finish()`.
+    The judgement is the same as `detector.judge()` on the concatenation of the chunks.
+
+    Attributes:
+        detector (CantoneseDetector): The detector whose modes and thresholds are used. `get_analysis` is not
+            supported, as it needs every segment to be kept.
+    """
+
+    def __init__(self, detector: CantoneseDetector) -> None:
+        if detector.get_analysis:
+            raise ValueError("StreamingDetector does not support get_analysis")
+        self.detector: CantoneseDetector = detector
+        self._reset()
+
+    def _reset(self) -> None:
+        self._matrix = _SegmentAccumulator(self.detector)
+        self._quotes = _SegmentAccumulator(self.detector)
+        # Text not separated into matrix and quotes yet. If it is not empty, it starts with an opening mark.
+        self._pending: str = ""
+        # Position in `_pending` up to which there is no other opening mark of the same type
+        self._searched: int = 1
+        # Whether anything was sent to the matrix or the quotes yet
+        self._started: bool = False
+        self._quote_count: int = 0
+
+    def feed(self, chunk: str) -> None:
+        """
+        Add the next chunk of the document.
+        """
+        if not self.detector.use_quotes:
+            self._matrix.feed(chunk)
+            return
+        self._pending += chunk
+        self._separate_quotes(final=False)
+
+    def finish(self) -> JudgementType:
+        """
+        Judge the document fed so far, and reset the detector for the next document.
+
+        Returns:
+            JudgementType: The final judgement.
+        """
+        try:
+            if not self.detector.use_quotes:
+                return self._matrix.finish()
+
+            if not self._started:
+                # The whole document is still pending, i.e. it starts with a quote that is not closed before the
+                # next quote of the same type. It may be a single quote covering the whole document, which
+                # `_judge_matrix_quotes()` handles specially, so judge it as a whole.
+                return self.detector.judge(self._pending)
+
+            self._separate_quotes(final=True)
+            return self.detector._combine_matrix_quotes(self._matrix.finish(), self._quotes.finish())
+        finally:
+            self._reset()
+
+    def _emit_matrix(self, text: str) -> None:
+        if text:
+            self._started = True
+            self._matrix.feed(text)
+
+    def _emit_quote(self, content: str) -> None:
+        self._started = True
+        # A quote is replaced by "…" in the matrix, and the quotes are joined with "…"
+        self._matrix.feed("…")
+        if self._quote_count > 0:
+            self._quotes.feed("…")
+        self._quotes.feed(content)
+        self._quote_count += 1
+
+    def _separate_quotes(self, final: bool) -> None:
+        """
+        Send the decided part of `_pending` to the matrix and the quotes, the same way as `ALL_QUOTEMARKS_RE`
+        separates them.
+        """
+        pending = self._pending
+        position = 0
+        while position < len(pending):
+            opening = pending[position]
+            if opening not in QUOTE_PAIRS:
+                # Matrix text up to the next opening mark
+                match = QUOTE_OPENING_RE.search(pending, position)
+                next_opening = match.start() if match is not None else len(pending)
+                self._emit_matrix(pending[position:next_opening])
+                position = next_opening
+                self._searched = position + 1
+                continue
+
+            # `[^「]*` stops before the next opening mark of the same type, then backtracks to the last closing mark
+            next_same = pending.find(opening, max(self._searched, position + 1))
+            if next_same == -1:
+                if not final:
+                    # Not decided until the next opening mark of the same type or the end of the document
+                    self._searched = len(pending)
+                    break
+                next_same = len(pending)
+            closing = pending.rfind(QUOTE_PAIRS[opening], position + 1, next_same)
+            if closing == -1:
+                # Not a quote, the opening mark belongs to the matrix
+                self._emit_matrix(opening)
+                position += 1
+            else:
+                self._emit_quote(pending[position + 1:closing])
+                position = closing + 1
+            self._searched = position + 1
+
+        self._pending = pending[position:]
+        self._searched -= position
@@ -0,0 +1,249 @@
+"""
+Span-based tokenization of a document into its matrix and quotes, and into segments.
+
+The matrix is the document with each quote replaced by "…", and the quotes are their contents joined by "…". Both are
+split at the delimiters into non-blank segments. `Tokenizer` gives these segments as spans of the original document,
+without building the matrix and quotes strings:
+
+- A part is the matrix, the quotes, or the whole document, as a list of `(start, end)` pieces and the joiner that
+  stands between two pieces: "…" where a quote was cut out, or "" where nested quotes were removed.
+- A `Segment` is the pieces of a part between two delimiters.
+
+No lexicon literal contains "…", so the features of a segment are the features of its pieces, scanned separately.
+"""
+import re
+from enum import StrEnum
+from typing import List, Sequence, Tuple
+
+# `str.strip()` and `\s` use the same definition of whitespace
+NON_SPACE_RE = re.compile(r'\S')
+
+Piece = Tuple[int, int]
+
+
+class SpanKind(StrEnum):
+    MATRIX = "matrix"
+    QUOTE = "quote"
+    DELIMITER = "delimiter"
+
+
+class Part:
+    """
+    The matrix, the quotes or the whole document, as pieces of the document.
+
+    Attributes:
+        kind (SpanKind): `SpanKind.MATRIX` for the matrix or the whole document, `SpanKind.QUOTE` for the quotes.
+        pieces (List[Piece]): The `(start, end)` pieces, in order.
+        joiner (str): The text that stands between two pieces.
+    """
+    __slots__ = ("kind", "pieces", "joiner")
+
+    def __init__(self, kind: SpanKind, pieces: List[Piece], joiner: str) -> None:
+        self.kind: SpanKind = kind
+        self.pieces: List[Piece] = pieces
+        self.joiner: str = joiner
+
+
+class Segment:
+    """
+    A segment as pieces of the original document.
+
+    Attributes:
+        document (str): The original document.
+        pieces (Sequence[Piece]): The `(start, end)` pieces, in order.
+        joiner (str): The text that stands between two pieces, see `Part`.
+        kind (SpanKind): The kind of the part the segment belongs to.
+    """
+    __slots__ = ("document", "pieces", "joiner", "kind")
+
+    def __init__(self, document: str, pieces: Sequence[Piece], joiner: str, kind: SpanKind) -> None:
+        self.document: str = document
+        self.pieces: Sequence[Piece] = pieces
+        self.joiner: str = joiner
+        self.kind: SpanKind = kind
+
+    @property
+    def start(self) -> int:
+        return self.pieces[0][0]
+
+    @property
+    def end(self) -> int:
+        return self.pieces[-1][1]
+
+    def text(self) -> str:
+        """
+        Return the text of the segment.
+        """
+        if len(self.pieces) == 1:
+            start, end = self.pieces[0]
+            return self.document[start:end]
+        return self.joiner.join(self.document[start:end] for start, end in self.pieces)
+
+    def scan_texts(self) -> List[str]:
+        """
+        Return the texts whose features add up to the features of the segment: each piece, or the whole text if
+        a feature may cross two pieces.
+        """
+        if self.joiner or len(self.pieces) == 1:
+            return [self.document[start:end] for start, end in self.pieces]
+        return [self.text()]
+
+    def __len__(self) -> int:
+        return sum(end - start for start, end in self.pieces) + len(self.joiner) * (len(self.pieces) - 1)
+
+    def __str__(self) -> str:
+        return self.text()
+
+
+class Tokenizer:
+    """
+    Split documents into parts and segments with the quote and delimiter regexes of the detector.
+    """
+
+    def __init__(self, quotemarks_re: re.Pattern, delimiters_re: re.Pattern) -> None:
+        # Every alternative of `quotemarks_re` is a pair of marks around one group, the content of the quote.
+        self.quotemarks_re: re.Pattern = quotemarks_re
+        self.delimiters_re: re.Pattern = delimiters_re
+
+    def separate_parts(self, document: str, use_quotes: bool) -> List[Part]:
+        """
+        Return the parts of a document judged by `CantoneseDetector.judge()`: the whole document, or its matrix and its
+        quotes, with the same special cases as `_judge_matrix_quotes()`.
+
+        Args:
+            document (str): The document.
+            use_quotes (bool): Separate the matrix and the quotes.
+
+        Returns:
+            List[Part]: One part judged on its own, or the matrix and the quotes.
+        """
+        if not use_quotes:
+            return [Part(SpanKind.MATRIX, [(0, len(document))], "")]
+
+        matches = list(self.quotemarks_re.finditer(document))
+        if (len(matches) == 1 and matches[0].span() == (0, len(document))) or (not matches and document == "…"):
+            # The matrix is "…": the entire input is a quote, judged without the quotes nested in it
+            start, end = matches[0].span(matches[0].lastindex) if matches else (0, 0)
+            pieces: List[Piece] = []
+            for nested in self.quotemarks_re.finditer(document, start, end):
+                pieces.append((start, nested.start()))
+                start = nested.end()
+            pieces.append((start, end))
+            return [Part(SpanKind.QUOTE, pieces, "")]
+
+        matrix_pieces: List[Piece] = []
+        start = 0
+        for match in matches:
+            matrix_pieces.append((start, match.start()))
+            start = match.end()
+        matrix_pieces.append((start, len(document)))
+        matrix = Part(SpanKind.MATRIX, matrix_pieces, "…")
+
+        if not matches or (len(matches) == 1 and matches[0].group(matches[0].lastindex) == ""):
+            # No quotes, or a single empty one
+            return [matrix]
+        return [matrix, Part(SpanKind.QUOTE, [match.span(match.lastindex) for match in matches], "…")]
+
+    def split_part(self, document: str, part: Part, split_seg: bool) -> List[Segment]:
+        """
+        Return the segments of a part, split at the delimiters of its text.
+
+        Args:
+            document (str): The document.
+            part (Part): A part of the document.
+            split_seg (bool): Split at the delimiters and drop blank segments, otherwise the part is one segment.
+
+        Returns:
+            List[Segment]: The segments.
+        """
+        if not split_seg:
+            return [Segment(document, part.pieces, part.joiner, part.kind)]
+
+        segments: List[Segment] = []
+        joiner, kind = part.joiner, part.kind
+        search = NON_SPACE_RE.search
+        if len(part.pieces) == 1:
+            start, end = part.pieces[0]
+            for delimiter in self.delimiters_re.finditer(document, start, end):
+                stop = delimiter.start()
+                if search(document, start, stop) is not None:
+                    segments.append(Segment(document, ((start, stop),), joiner, kind))
+                start = delimiter.end()
+            if search(document, start, end) is not None:
+                segments.append(Segment(document, ((start, end),), joiner, kind))
+            return segments
+
+        pieces: List[Piece] = []
+        # A segment is blank if all its pieces are, and a joiner "…" between two pieces is not blank
+        blank = True
+        for start, end in part.pieces:
+            if pieces and joiner:
+                blank = False
+            for delimiter in self.delimiters_re.finditer(document, start, end):
+                stop = delimiter.start()
+                pieces.append((start, stop))
+                if not blank or search(document, start, stop) is not None:
+                    segments.append(Segment(document, pieces, joiner, kind))
+                pieces = []
+                blank = True
+                start = delimiter.end()
+            pieces.append((start, end))
+            if blank and search(document, start, end) is not None:
+                blank = False
+        if not blank:
+            segments.append(Segment(document, pieces, joiner, kind))
+        return segments
+
+    def split_part_texts(self, document: str, part: Part, split_seg: bool) -> List[str]:
+        """
+        Return the texts of the segments of `split_part()`. Each piece is split on its own, and only the segments
+        that run over two pieces are joined, so the text of the part is never built.
+
+        Args:
+            document (str): The document.
+            part (Part): A part of the document.
+            split_seg (bool): Split at the delimiters and drop blank segments, otherwise the part is one segment.
+
+        Returns:
+            List[str]: The texts of the segments.
+        """
+        if not split_seg:
+            if len(part.pieces) == 1:
+                start, end = part.pieces[0]
+                return [document[start:end]]
+            return [part.joiner.join(document[start:end] for start, end in part.pieces)]
+
+        split = self.delimiters_re.split
+        texts: List[str] = []
+        for start, end in part.pieces:
+            piece_texts = split(document[start:end])
+            if texts:
+                # The last segment of the previous piece continues into this one
+                piece_texts[0] = texts.pop() + part.joiner + piece_texts[0]
+            texts += piece_texts
+        return [text for text in texts if text.strip()]
+
+    def tokenize(self, document: str, use_quotes: bool = False) -> List[Tuple[int, int, SpanKind]]:
+        """
+        Tokenize a document into `(start, end, kind)` spans, in document order: runs of matrix or quote text between
+        delimiters, and the delimiters. Quote marks and nested quotes that are not judged are not covered by any span.
+
+        Args:
+            document (str): The document.
+            use_quotes (bool): Separate the matrix and the quotes, otherwise all the text is matrix text.
+
+        Returns:
+            List[Tuple[int, int, SpanKind]]: The non-empty spans.
+        """
+        spans: List[Tuple[int, int, SpanKind]] = []
+        for part in self.separate_parts(document, use_quotes):
+            for start, end in part.pieces:
+                for delimiter in self.delimiters_re.finditer(document, start, end):
+                    if delimiter.start() > start:
+                        spans.append((start, delimiter.start(), part.kind))
+                    spans.append((delimiter.start(), delimiter.end(), SpanKind.DELIMITER))
+                    start = delimiter.end()
+                if end > start:
+                    spans.append((start, end, part.kind))
+        spans.sort()
+        return spans
@@ -0,0 +1,135 @@
+"""
+Vectorized threshold evaluation with NumPy, used by `FeatureTable` when NumPy is installed.
+
+The functions below apply `_judge_segment_counts()`, `_aggregate_segment_judgements()` and
+`_combine_matrix_quotes()` to whole arrays at once. They give exactly the same judgements as the scalar path:
+the thresholds are computed with the same float64 products and `floor`/`ceil`, the counts are converted to float64
+exactly, and IEEE division is correctly rounded as Python's int division is.
+
+Judgements are encoded with `ParallelJudge.JUDGEMENT_CODES`.
+"""
+from functools import lru_cache
+from typing import Any
+
+from .JudgementTypes import JudgementType
+from .ParallelJudge import JUDGEMENT_CODES, JUDGEMENTS
+
+NEUTRAL = JUDGEMENT_CODES[JudgementType.NEUTRAL]
+CANTONESE = JUDGEMENT_CODES[JudgementType.CANTONESE]
+SWC = JUDGEMENT_CODES[JudgementType.SWC]
+MIXED = JUDGEMENT_CODES[JudgementType.MIXED]
+
+
+@lru_cache(maxsize=None)
+def _numpy() -> Any:
+    """
+    Import NumPy on first use, so that `import cantonesedetect` does not pay for it.
+
+    Returns:
+        module: The `numpy` module, or None if it is not installed.
+    """
+    try:
+        import numpy
+    except ImportError:  # NumPy is an optional dependency: pip install cantonesedetect[numpy]
+        return None
+    return numpy
+
+
+def judge_segment_codes(detector, canto_counts: Any, swc_counts: Any, han_lengths: Any) -> Any:
+    """
+    Judge every segment from its counts with the thresholds of `detector`, as `_judge_segment_counts()`.
+
+    Args:
+        detector (CantoneseDetector): The detector whose thresholds are used.
+        canto_counts (array-like): Net Cantonese feature count of each segment.
+        swc_counts (array-like): Net SWC feature count of each segment.
+        han_lengths (array-like): Han length of each segment.
+
+    Returns:
+        np.ndarray: The judgement code of each segment, as uint8.
+    """
+    np = _numpy()
+    canto = np.asarray(canto_counts, dtype=np.int64)
+    swc = np.asarray(swc_counts, dtype=np.int64)
+    length = np.asarray(han_lengths, dtype=np.int64)
+    length_float = length.astype(np.float64)
+    num_all_features = canto + swc
+
+    lack_swc = swc <= np.floor(detector.swc_tolerance * length_float)
+    lack_canto = canto <= np.floor(detector.canto_tolerance * length_float)
+    neutral = (length == 0) | (num_all_features == 0) | (lack_canto & lack_swc)
+
+    has_canto = canto >= np.ceil(detector.canto_presence * length_float)
+    has_swc = swc >= np.ceil(detector.swc_presence * length_float)
+
+    # Segments without features are Neutral, so the ratios only matter where `num_all_features` is not 0
+    denominator = num_all_features.astype(np.float64)
+    canto_ratio = np.divide(canto.astype(np.float64), denominator,
+                            out=np.zeros_like(denominator), where=num_all_features != 0)
+    swc_ratio = np.divide(swc.astype(np.float64), denominator,
+                          out=np.zeros_like(denominator), where=num_all_features != 0)
+    canto_pref = canto_ratio - swc_ratio > 0.9
+    swc_pref = swc_ratio - canto_ratio > 0.9
+
+    codes = np.full(length.shape, MIXED, dtype=np.uint8)
+    codes[swc_pref & ~has_canto] = SWC
+    codes[canto_pref & ~has_swc] = CANTONESE
+    codes[neutral] = NEUTRAL
+    return codes
+
+
+def aggregate_part_codes(segment_codes: Any, part_offsets: Any) -> Any:
+    """
+    Aggregate the segment judgements of every part, as `_aggregate_segment_judgements()`.
+
+    Args:
+        segment_codes (np.ndarray): The judgement code of each segment.
+        part_offsets (array-like): Offset of the first segment of each part, and the number of segments at the end.
+
+    Returns:
+        np.ndarray: The judgement code of each part, as uint8.
+    """
+    np = _numpy()
+    offsets = np.asarray(part_offsets, dtype=np.int64)
+    totals = np.diff(offsets)
+    part_of_segment = np.repeat(np.arange(len(totals)), totals)
+
+    def count(code: int) -> Any:
+        return np.bincount(part_of_segment[segment_codes == code], minlength=len(totals))
+
+    canto_seg_count, swc_seg_count, neutral_seg_count = count(CANTONESE), count(SWC), count(NEUTRAL)
+    # 95% threshold
+    threshold = np.ceil(totals.astype(np.float64) * 0.95)
+
+    codes = np.full(totals.shape, MIXED, dtype=np.uint8)
+    codes[swc_seg_count + neutral_seg_count >= threshold] = SWC
+    codes[canto_seg_count + neutral_seg_count >= threshold] = CANTONESE
+    codes[neutral_seg_count >= threshold] = NEUTRAL
+    return codes
+
+
+def combine_document_codes(detector, part_codes: Any, document_offsets: Any) -> Any:
+    """
+    Combine the parts of every document: a single part gives its own judgement, and a matrix and its quotes are
+    combined by `detector._combine_matrix_quotes()`, tabulated once for every pair of judgements.
+
+    Args:
+        detector (CantoneseDetector): The detector whose combination is used.
+        part_codes (np.ndarray): The judgement code of each part.
+        document_offsets (array-like): Offset of the first part of each document, and the number of parts at the end.
+
+    Returns:
+        np.ndarray: The judgement code of each document, as uint8.
+    """
+    np = _numpy()
+    offsets = np.asarray(document_offsets, dtype=np.int64)
+    first_parts = offsets[:-1]
+    codes = part_codes[first_parts].copy() if len(part_codes) else np.zeros(len(first_parts), dtype=np.uint8)
+
+    combined = np.diff(offsets) == 2
+    if combined.any():
+        table = np.array([[JUDGEMENT_CODES[detector._combine_matrix_quotes(matrix, quotes)] for quotes in JUDGEMENTS]
+                          for matrix in JUDGEMENTS], dtype=np.uint8)
+        matrix_parts = first_parts[combined]
+        codes[combined] = table[part_codes[matrix_parts], part_codes[matrix_parts + 1]]
+    return codes
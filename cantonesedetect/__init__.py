@@ -1 +1,15 @@
 from .Detector import CantoneseDetector
+from .StreamingDetector import StreamingDetector
+
+
+def __getattr__(name):
+    # Imported on first use: asyncio is slow to import, and FeatureTable may bring in NumPy
+    if name == "AsyncJudge":
+        from .AsyncJudge import AsyncJudge as value
+    elif name == "FeatureTable":
+        from .FeatureTable import FeatureTable as value
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # Importing the submodule bound its name to the module, the class replaces it
+    globals()[name] = value
+    return value
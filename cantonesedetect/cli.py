@@ -1,43 +1,346 @@
 import argparse
 import sys
+from contextlib import nullcontext
+from typing import ContextManager, List, Optional, TextIO
+
 from cantonesedetect import CantoneseDetector
+from cantonesedetect.Detector import ALL_DELIMITERS_RE, FEATURE_SCANNER
+from cantonesedetect.ParallelJudge import BACKENDS, JudgePool, chunked
+from cantonesedetect.Records import OUTPUT_FORMATS, encode_columnar, write_jsonl, write_results
 
-sys.stdout.reconfigure(encoding='utf-8')
+# The corpus, deduplication and statistics modules are imported by the modes that use them, so that the other
+# invocations do not pay for them.
 
 
-def main():
+def open_input(path: str) -> ContextManager[TextIO]:
     """
-    When used as a command line tool, specify input text file with `--input <INPUT.txt>`, 
-    and output mode with `--mode <MODE>`.
+    Open the input file for reading, or stdin if `path` is `-`. Stdin is left open on exit.
     """
-    argparser = argparse.ArgumentParser(
-        description='Specify input text file with `--input <INPUT.txt>`, where each line is a sentence. ')
+    if path == '-':
+        sys.stdin.reconfigure(encoding='utf-8')
+        return nullcontext(sys.stdin)
+    return open(path, encoding='utf-8')
 
-    argparser.add_argument('--input', type=str, default='input.txt',
-                           help='Specify input text file, where each line is a sentence. Default is `input.txt`.')
+
+def add_detector_arguments(argparser: argparse.ArgumentParser) -> None:
+    """
+    Add the options shared by the main command and the subcommands.
+    """
     argparser.add_argument(
         '--quotes', help='Separate quotes from matrix and judge them separately.', action='store_true')
     argparser.add_argument(
         '--split', help='Split the document into segments', action='store_true', default=False)
     argparser.add_argument(
         '--print_analysis', help='Split the document into segments', action='store_true', default=False)
-    args = argparser.parse_args()
+    argparser.add_argument('--workers', type=int, default=1,
+                           help='Number of workers. Default is 1, which judges in the current process.')
+    argparser.add_argument('--backend', choices=BACKENDS, default='auto',
+                           help='Run the workers as `process`es or `thread`s sharing one detector. Threads only judge in '
+                                'parallel on free-threaded Python with the GIL disabled. Default is `auto`: threads '
+                                'there, processes otherwise.')
+    argparser.add_argument('--cache-size', type=int, default=0,
+                           help='Cache the judgements of up to this many distinct segments in each worker. Default is 0, no cache.')
+    argparser.add_argument('--early-exit', action='store_true', default=False,
+                           help='Stop judging the segments of a document once its judgement is decided. Ignored with --print_analysis.')
+    argparser.add_argument('--format', choices=OUTPUT_FORMATS, default='text',
+                           help='Output format: `text`, `jsonl` with one JSON record per line, or `columnar` binary blocks. '
+                                'With --print_analysis, the records include the segments and their features. Default is `text`.')
+
+
+def job_main(argv: List[str]) -> None:
+    """
+    `cantonesedetect job`: judge one shard of a file into an output file, with checkpoints to resume from.
+    """
+    from cantonesedetect.Corpus import DEFAULT_RANGE_SIZE, run_job
+
+    argparser = argparse.ArgumentParser(
+        prog='cantonesedetect job',
+        description='Judge one shard of a large input file. The job writes a checkpoint after every byte range and '
+                    'resumes from it when run again with the same arguments.')
+    argparser.add_argument('--input', type=str, required=True,
+                           help='Input text file, where each line is a sentence.')
+    argparser.add_argument('--output', type=str, required=True,
+                           help='Output file of this shard.')
+    argparser.add_argument('--shard-index', type=int, default=0,
+                           help='Index of the shard to judge, from 0 to SHARD_COUNT - 1. Default is 0.')
+    argparser.add_argument('--shard-count', type=int, default=1,
+                           help='Number of shards the input is split into. Default is 1.')
+    argparser.add_argument('--checkpoint', type=str, default=None,
+                           help='Checkpoint file. Default is `<OUTPUT>.checkpoint`.')
+    argparser.add_argument('--range-size', type=int, default=DEFAULT_RANGE_SIZE,
+                           help='Size in bytes of the input judged between two checkpoints. Default is 64 MiB.')
+    add_detector_arguments(argparser)
+    args = argparser.parse_args(argv)
 
     detector = CantoneseDetector(
-        split_seg=args.split, use_quotes=args.quotes, get_analysis=args.print_analysis)
-
-    with open(args.input, encoding='utf-8') as f:
-        if args.print_analysis:
-            for line in f:
-                judgement, document_features = detector.judge(line.strip())
-                analysis = document_features.get_analysis()
-                sys.stdout.write(f"====================================\nINPUT:{line.strip()}\nJUDGEMENT: {
-                                 judgement.value}\n")
-                sys.stdout.write(analysis)
-        else:
-            for line in f:
-                judgement = detector.judge(line.strip())
-                sys.stdout.write(judgement.value + '\n')
+        split_seg=args.split, use_quotes=args.quotes, get_analysis=args.print_analysis, cache_size=args.cache_size,
+        early_exit=args.early_exit)
+    try:
+        checkpoint = run_job(detector._get_config(), args.input, args.output, shard_index=args.shard_index,
+                             shard_count=args.shard_count, checkpoint_path=args.checkpoint,
+                             workers=args.workers, range_size=args.range_size, output_format=args.format,
+                             backend=args.backend)
+    except ValueError as e:
+        argparser.error(str(e))
+    sys.stderr.write(
+        f"Shard {args.shard_index}/{args.shard_count} done: input bytes {checkpoint['start']}-{checkpoint['end']}, "
+        f"{checkpoint['output_offset']} output bytes\n")
+
+
+def serve_main(argv: List[str]) -> None:
+    """
+    `cantonesedetect serve`: judge documents sent over HTTP on a local TCP or Unix socket, see `Server.py`.
+    """
+    argparser = argparse.ArgumentParser(
+        prog='cantonesedetect serve',
+        description='Serve judgements over HTTP. POST {"document": ...} or {"documents": [...]} to /judge, '
+                    'and GET /stats for throughput and latency.')
+    argparser.add_argument('--host', type=str, default='127.0.0.1',
+                           help='Host to listen on. Default is 127.0.0.1.')
+    argparser.add_argument('--port', type=int, default=8000,
+                           help='TCP port to listen on. Default is 8000.')
+    argparser.add_argument('--unix-socket', type=str, default=None,
+                           help='Listen on this Unix socket path instead of a TCP port.')
+    argparser.add_argument('--max-batch-size', type=int, default=64,
+                           help='Maximum number of documents judged in one batch. Default is 64.')
+    argparser.add_argument('--max-delay', type=float, default=0.001,
+                           help='Seconds to wait for more documents before judging a batch that is not full. Default is 0.001.')
+    argparser.add_argument('--max-pending', type=int, default=1024,
+                           help='Maximum number of documents waiting for a batch before requests wait. Default is 1024.')
+    add_detector_arguments(argparser)
+    args = argparser.parse_args(argv)
+
+    # asyncio is only imported by the server
+    import asyncio
+    from cantonesedetect.Server import serve
+    detector = CantoneseDetector(
+        split_seg=args.split, use_quotes=args.quotes, get_analysis=args.print_analysis, cache_size=args.cache_size,
+        early_exit=args.early_exit)
+    address = args.unix_socket if args.unix_socket is not None else f"http://{args.host}:{args.port}"
+    sys.stderr.write(f"Serving on {address}\n")
+    try:
+        asyncio.run(serve(detector, host=args.host, port=args.port, path=args.unix_socket, workers=args.workers,
+                          max_batch_size=args.max_batch_size, max_delay=args.max_delay, max_pending=args.max_pending,
+                          backend=args.backend))
+    except KeyboardInterrupt:
+        pass
+
+
+def table_main(argv: List[str]) -> None:
+    """
+    `cantonesedetect table`: judge a text column of a Parquet or Arrow file, and write it with the judgement columns.
+    """
+    argparser = argparse.ArgumentParser(
+        prog='cantonesedetect table',
+        description='Judge a text column of a Parquet or Arrow IPC file, and write the file with the judgement and the '
+                    'feature counts as new columns. Needs pyarrow: pip install cantonesedetect[arrow]')
+    argparser.add_argument('--input', type=str, required=True,
+                           help='Input file: Parquet if it ends with `.parquet`, otherwise an Arrow IPC file or stream.')
+    argparser.add_argument('--output', type=str, required=True,
+                           help='Output file: Parquet if it ends with `.parquet`, otherwise an Arrow IPC file.')
+    argparser.add_argument('--column', type=str, default='text',
+                           help='Name of the text column. Default is `text`.')
+    argparser.add_argument(
+        '--quotes', help='Separate quotes from matrix and judge them separately.', action='store_true')
+    argparser.add_argument(
+        '--split', help='Split the document into segments', action='store_true', default=False)
+    argparser.add_argument('--workers', type=int, default=1,
+                           help='Number of workers. Default is 1, which judges in the current process.')
+    argparser.add_argument('--backend', choices=BACKENDS, default='auto',
+                           help='Run the workers as `process`es or `thread`s, see `cantonesedetect --help`. Default is `auto`.')
+    argparser.add_argument('--batch-size', type=int, default=65536,
+                           help='Number of rows read at a time from Parquet. Default is 65536.')
+    argparser.add_argument('--chunk-size', type=int, default=1024,
+                           help='Number of distinct texts sent to a worker at a time. Default is 1024.')
+    args = argparser.parse_args(argv)
+
+    from cantonesedetect.ArrowJudge import judge_table_file
+    detector = CantoneseDetector(split_seg=args.split, use_quotes=args.quotes)
+    try:
+        rows = judge_table_file(detector._get_config(), args.input, args.output, args.column, workers=args.workers,
+                                batch_size=args.batch_size, chunksize=args.chunk_size, backend=args.backend)
+    except (ImportError, KeyError, TypeError, ValueError) as e:
+        argparser.error(str(e.args[0]) if e.args else str(e))
+    sys.stderr.write(f"Judged {rows} rows\n")
+
+
+def merge_stats_main(argv: List[str]) -> None:
+    """
+    Merge the statistics files written with `--stats` by several runs, e.g. on different machines.
+    """
+    argparser = argparse.ArgumentParser(
+        prog='cantonesedetect merge-stats',
+        description='Merge corpus statistics files written with `--stats`. Files ending with `.json` are read and '
+                    'written as JSON, others as binary.')
+    argparser.add_argument('--output', type=str, required=True,
+                           help='The merged statistics file.')
+    argparser.add_argument('inputs', nargs='+',
+                           help='The statistics files to merge.')
+    args = argparser.parse_args(argv)
+    from cantonesedetect.CorpusStats import CorpusStats
+    CorpusStats.merged(CorpusStats.load(path) for path in args.inputs).save(args.output)
+
+
+def main(argv: Optional[List[str]] = None):
+    """
+    When used as a command line tool, specify input text file with `--input <INPUT.txt>`, 
+    and output mode with `--mode <MODE>`.
+
+    `cantonesedetect job ...` runs a resumable, sharded corpus job instead, see `job_main()`, and
+    `cantonesedetect serve ...` a judging server, see `serve_main()`, and `cantonesedetect merge-stats ...` merges
+    the files written with `--stats`, see `merge_stats_main()`. `cantonesedetect table ...` judges a column of a
+    Parquet or Arrow file, see `table_main()`.
+    """
+    # Reconfigured when run, not on import, so that importing this module has no side effects
+    sys.stdout.reconfigure(encoding='utf-8')
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['job']:
+        return job_main(argv[1:])
+    if argv[:1] == ['serve']:
+        return serve_main(argv[1:])
+    if argv[:1] == ['table']:
+        return table_main(argv[1:])
+    if argv[:1] == ['merge-stats']:
+        return merge_stats_main(argv[1:])
+
+    argparser = argparse.ArgumentParser(
+        description='Specify input text file with `--input <INPUT.txt>`, where each line is a sentence. '
+                    'Run `cantonesedetect job --help` for resumable sharded jobs, `cantonesedetect serve --help` '
+                    'for the judging server, and `cantonesedetect table --help` for Parquet and Arrow files.')
+
+    argparser.add_argument('--input', type=str, default='input.txt',
+                           help='Specify input text file, where each line is a sentence. Default is `input.txt`. Use `-` to read from stdin.')
+    add_detector_arguments(argparser)
+    argparser.add_argument('--batch-size', type=int, default=1000,
+                           help='Number of lines sent to a worker at a time. Default is 1000.')
+    argparser.add_argument('--mmap', action='store_true', default=False,
+                           help='Corpus mode: memory-map the input file and judge newline-aligned byte ranges in parallel.')
+    argparser.add_argument('--output', type=str, default=None,
+                           help='In corpus mode, the output file. Default is `-`, which writes to stdout.')
+    argparser.add_argument('--shard-output', type=str, default=None,
+                           help='In corpus mode, write the output of each byte range to its own file `<SHARD_OUTPUT>.<INDEX>` instead.')
+    argparser.add_argument('--range-size', type=int, default=None,
+                           help='In corpus mode, the size in bytes of the range judged by one task. Default is 64 MiB.')
+    argparser.add_argument('--filter', choices=['cantonese', 'swc'], default=None,
+                           help='Filter mode: only write the input lines judged as this language, which is faster than judging them. '
+                                'Not available with --mmap, --print_analysis or a --format other than `text`.')
+    argparser.add_argument('--dedup', metavar='MODE', default=None,
+                           help='Judge each distinct line once: `reuse` writes duplicates with the judgement of their first copy, '
+                                '`drop` leaves them out. The number of duplicates is reported on stderr.')
+    argparser.add_argument('--dedup-max-entries', type=int, default=None,
+                           help='Distinct lines remembered in memory for --dedup. Older ones are forgotten, or spilled with '
+                                '--dedup-spill. With `drop`, the copies of a forgotten line are written again. Default is 1000000.')
+    argparser.add_argument('--dedup-spill', type=str, default=None,
+                           help='Directory of a temporary file where --dedup spills the lines beyond --dedup-max-entries, '
+                                'so that no duplicate is missed.')
+    argparser.add_argument('--stats', type=str, default=None,
+                           help='Also collect the corpus statistics: judgements, segment judgements by length, and the '
+                                'counts of every feature and exclusion, and save them to this file, as JSON if it ends '
+                                'with `.json`, otherwise as binary. See `cantonesedetect merge-stats`.')
+    argparser.add_argument(
+        '--check_scanner', help='Compare the single-pass feature scanner with the lexicon regexes over the input instead of judging it.', action='store_true', default=False)
+    args = argparser.parse_args(argv)
+
+    if args.check_scanner:
+        with open_input(args.input) as f:
+            mismatches = FEATURE_SCANNER.differential_check(
+                segment for line in f for segment in [line.strip()] + ALL_DELIMITERS_RE.split(line))
+        for segment in mismatches:
+            sys.stdout.write(f"MISMATCH: {segment}\n")
+        sys.stdout.write(f"Scanner mismatches: {len(mismatches)}\n")
+        sys.exit(1 if mismatches else 0)
+
+    detector = CantoneseDetector(
+        split_seg=args.split, use_quotes=args.quotes, get_analysis=args.print_analysis, cache_size=args.cache_size,
+        early_exit=args.early_exit)
+
+    if args.dedup is not None:
+        from cantonesedetect.Deduplicator import DEDUP_MODES, DEFAULT_MAX_ENTRIES, Deduplicator
+        if args.dedup not in DEDUP_MODES:
+            argparser.error(f'`--dedup` must be one of {", ".join(DEDUP_MODES)}.')
+        if args.mmap:
+            argparser.error('`--dedup` reads the input as a stream, it cannot be used with `--mmap`.')
+        if args.dedup == 'reuse' and args.print_analysis:
+            argparser.error('`--dedup reuse` cannot reuse the analysis, use `--dedup drop` with `--print_analysis`.')
+
+    if args.stats is not None:
+        for option, used in (('--mmap', args.mmap), ('--filter', args.filter), ('--dedup', args.dedup),
+                             ('--print_analysis', args.print_analysis)):
+            if used:
+                argparser.error(f'`--stats` cannot be used with `{option}`.')
+
+    if args.filter is not None:
+        for option, used in (('--mmap', args.mmap), ('--print_analysis', args.print_analysis),
+                             (f'--format {args.format}', args.format != 'text')):
+            if used:
+                argparser.error(f'`--filter` writes the matching input lines, it cannot be used with `{option}`.')
+
+    if not args.mmap:
+        for option, value in (('--output', args.output), ('--shard-output', args.shard_output),
+                              ('--range-size', args.range_size)):
+            if value is not None:
+                argparser.error(f'`{option}` is only used in corpus mode, add `--mmap`.')
+
+    if args.mmap:
+        from cantonesedetect.Corpus import DEFAULT_RANGE_SIZE, judge_file
+        if args.input == '-':
+            argparser.error('`--mmap` needs an input file, not stdin.')
+        range_size = args.range_size if args.range_size is not None else DEFAULT_RANGE_SIZE
+        if args.shard_output is not None:
+            for _ in judge_file(detector._get_config(), args.input, shard_output=args.shard_output,
+                                workers=args.workers, range_size=range_size, output_format=args.format,
+                                backend=args.backend):
+                pass
+            return
+        sys.stdout.flush()
+        # stdout is left open, only a file opened here is closed
+        with nullcontext(sys.stdout.buffer) if args.output in (None, '-') else open(args.output, 'wb') as output:
+            for _ in judge_file(detector._get_config(), args.input, output=output,
+                                workers=args.workers, range_size=range_size, output_format=args.format,
+                                backend=args.backend):
+                output.flush()
+        return
+
+    # Lines are read lazily and only a few batches per worker are in flight, so memory stays bounded.
+    with open_input(args.input) as f, JudgePool(detector._get_config(), args.workers, args.backend) as pool:
+        lines = (line.strip() for line in f)
+        dedup = None
+        if args.dedup is not None:
+            dedup = Deduplicator(args.dedup, args.dedup_max_entries if args.dedup_max_entries is not None else
+                                 DEFAULT_MAX_ENTRIES, args.dedup_spill)
+        stats = None
+        if args.stats is not None:
+            from cantonesedetect.CorpusStats import CorpusStats
+            stats = CorpusStats()
+        try:
+            if args.filter is not None:
+                batches = pool.ifilter(chunked(lines, args.batch_size), args.filter) if dedup is None else \
+                    dedup.ifilter(pool, chunked(lines, args.batch_size), args.filter)
+                for batch, keep in batches:
+                    sys.stdout.write("".join(line + "\n" for line, kept in zip(batch, keep) if kept))
+                return
+            if args.format == 'columnar':
+                sys.stdout.flush()
+            if dedup is not None:
+                batches = dedup.imap(pool, chunked(lines, args.batch_size))
+            elif stats is not None:
+                batches = stats.imap(pool, chunked(lines, args.batch_size))
+            else:
+                batches = pool.imap(chunked(lines, args.batch_size))
+            for batch, results in batches:
+                if args.format == 'columnar':
+                    sys.stdout.buffer.write(encode_columnar(batch, results))
+                elif args.format == 'jsonl':
+                    write_jsonl(sys.stdout, batch, results)
+                else:
+                    write_results(sys.stdout, batch, results, args.print_analysis)
+            if stats is not None:
+                stats.save(args.stats)
+        finally:
+            if dedup is not None:
+                dedup.close()
+                sys.stdout.flush()
+                sys.stderr.write(dedup.report())
 
 
 if __name__ == '__main__':
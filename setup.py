@@ -17,6 +17,10 @@ setup(
     long_description=long_description,
     long_description_content_type='text/markdown',
     test_suite='tests',
+    extras_require={
+        'numpy': ['numpy'],
+        'arrow': ['pyarrow'],
+    },
     entry_points={
         'console_scripts': [
             'cantonesedetect=cantonesedetect.cli:main',
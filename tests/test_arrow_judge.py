@@ -0,0 +1,132 @@
+import os
+import tempfile
+import unittest
+
+from cantonesedetect import ArrowJudge
+from cantonesedetect.ArrowJudge import OUTPUT_COLUMNS, judge_record_batches, judge_table_file, pa
+from cantonesedetect.Detector import CantoneseDetector
+from cantonesedetect.ParallelJudge import JudgePool
+
+
+@unittest.skipIf(pa is None, "pyarrow is not installed")
+class TestArrowJudge(unittest.TestCase):
+    """
+    Test judging a text column of Arrow record batches and Parquet files.
+    """
+
+    def setUp(self):
+        with open('tests/test_judge_sentences.txt', encoding='utf-8') as f:
+            self.texts = [line.split('|')[0] for line in f] * 2 + [None, "", "Hello World!", None]
+        ids = list(range(len(self.texts)))
+        self.batches = [pa.record_batch({"id": ids[start:start + 10], "text": self.texts[start:start + 10]})
+                        for start in range(0, len(self.texts), 10)]
+
+    def expected(self, detector):
+        records = []
+        analysis = CantoneseDetector(**{**detector._get_config(), "get_analysis": True})
+        for text in self.texts:
+            if text is None:
+                records.append(dict.fromkeys(OUTPUT_COLUMNS))
+                continue
+            judgement, document_features = analysis.judge(text)
+            segments = document_features.document_segments_features
+            records.append({
+                "judgement": judgement.value,
+                "canto_feature_count": sum(segment.canto_feature_count for segment in segments),
+                "swc_feature_count": sum(segment.swc_feature_count for segment in segments),
+                "han_length": sum(segment.segment_length for segment in segments),
+            })
+        return records
+
+    def test_judge_record_batches(self):
+        """
+        The judgement columns are the judgements and summed segment counts of each row, null for null texts, in
+        every mode, with other thresholds, and with several workers.
+        """
+        configs = [{}, {"split_seg": True}, {"split_seg": True, "use_quotes": True},
+                   {"use_quotes": True, "canto_presence": 0.5, "swc_tolerance": 0.0}]
+        for config in configs:
+            detector = CantoneseDetector(**config)
+            for workers in (1, 2) if config == configs[2] else (1,):
+                with JudgePool(detector._get_config(), workers) as pool:
+                    batches = list(judge_record_batches(pool, iter(self.batches), "text", chunksize=3))
+                self.assertEqual([batch.num_rows for batch in batches], [batch.num_rows for batch in self.batches])
+                table = pa.Table.from_batches(batches)
+                self.assertEqual(table.column("id").to_pylist(), list(range(len(self.texts))))
+                self.assertEqual(table.select(list(OUTPUT_COLUMNS)).to_pylist(), self.expected(detector))
+
+    def test_dictionary_column(self):
+        """
+        A dictionary-encoded column is judged from its dictionary.
+        """
+        detector = CantoneseDetector(split_seg=True)
+        batch = pa.record_batch({"text": pa.array(self.texts).dictionary_encode()})
+        with JudgePool(detector._get_config(), 1) as pool:
+            judged, = judge_record_batches(pool, [batch], "text")
+        self.assertEqual(judged.select(list(OUTPUT_COLUMNS)).to_pylist(), self.expected(detector))
+
+        with JudgePool(detector._get_config(), 1) as pool:
+            with self.assertRaises(KeyError):
+                list(judge_record_batches(pool, [batch], "content"))
+            with self.assertRaises(ValueError):
+                list(judge_record_batches(pool, [judged.drop_columns(["judgement"]).append_column(
+                    "judgement", judged.column("text"))], "text"))
+
+    def test_null_dictionary_value(self):
+        """
+        Rows whose dictionary value is null are null texts, and a column of other values raises a TypeError.
+        """
+        detector = CantoneseDetector(split_seg=True)
+        dictionary = pa.array([text if text is not None else "" for text in self.texts] + [None])
+        indices = [len(self.texts) if text is None else index for index, text in enumerate(self.texts)]
+        column = pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), dictionary)
+        with JudgePool(detector._get_config(), 1) as pool:
+            judged, = judge_record_batches(pool, [pa.record_batch({"text": column})], "text")
+            self.assertEqual(judged.select(list(OUTPUT_COLUMNS)).to_pylist(), self.expected(detector))
+
+            for values in (pa.array([1, 2, 1]), pa.array([1, 2, 1]).dictionary_encode()):
+                with self.assertRaisesRegex(TypeError, "must hold strings"):
+                    list(judge_record_batches(pool, [pa.record_batch({"text": values})], "text"))
+
+    def test_judge_table_file(self):
+        """
+        Parquet and Arrow IPC files are judged into either format.
+        """
+        import pyarrow.parquet as pq
+        detector = CantoneseDetector(split_seg=True, use_quotes=True)
+        with tempfile.TemporaryDirectory() as tempdir:
+            parquet_path = os.path.join(tempdir, "input.parquet")
+            pq.write_table(pa.Table.from_batches(self.batches), parquet_path, row_group_size=7)
+            arrow_path = os.path.join(tempdir, "judged.arrow")
+            self.assertEqual(judge_table_file(detector._get_config(), parquet_path, arrow_path, "text",
+                                              batch_size=5), len(self.texts))
+
+            with pa.memory_map(arrow_path) as source:
+                table = pa.ipc.open_file(source).read_all()
+            self.assertEqual(table.select(list(OUTPUT_COLUMNS)).to_pylist(), self.expected(detector))
+
+            for name, new_writer in (("input.arrow", pa.ipc.new_file), ("input.arrows", pa.ipc.new_stream)):
+                input_path = os.path.join(tempdir, name)
+                with new_writer(input_path, self.batches[0].schema) as writer:
+                    for batch in self.batches:
+                        writer.write_batch(batch)
+                output_path = os.path.join(tempdir, "judged.parquet")
+                judge_table_file(detector._get_config(), input_path, output_path, "text", workers=2)
+                table = pq.read_table(output_path)
+                self.assertEqual(table.column("id").to_pylist(), list(range(len(self.texts))))
+                self.assertEqual(table.select(list(OUTPUT_COLUMNS)).to_pylist(), self.expected(detector))
+
+    def test_without_pyarrow(self):
+        """
+        Without pyarrow, judging Arrow data raises an ImportError that tells how to install it.
+        """
+        try:
+            ArrowJudge.pa = None
+            with self.assertRaisesRegex(ImportError, r"cantonesedetect\[arrow\]"):
+                ArrowJudge.read_record_batches("input.parquet")
+        finally:
+            ArrowJudge.pa = pa
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import asyncio
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from cantonesedetect.AsyncJudge import AsyncJudge
+from cantonesedetect.Detector import CantoneseDetector
+
+
+class TestAsyncJudge(unittest.TestCase):
+    """
+    Test the asyncio API.
+    """
+
+    documents = ["我哋去邊度？", "我们去哪里？", "Hello World!", "他說「係噉嘅」", "他說「係噉嘅」。我們去吃飯", ""] * 20
+
+    def setUp(self):
+        self.detector = CantoneseDetector(split_seg=True, use_quotes=True)
+        self.expected = [self.detector.judge(document) for document in self.documents]
+
+    def test_ajudge(self):
+        """
+        Concurrent `ajudge()` calls give the same judgements as `judge()`, and are judged in batches.
+        """
+        async def main():
+            results = await asyncio.gather(*(self.detector.ajudge(document) for document in self.documents))
+            return results, self.detector._async_judge.batches
+
+        results, batches = asyncio.run(main())
+        self.assertEqual(results, self.expected)
+        self.assertLess(batches, len(self.documents))
+
+        # A new event loop gets a new batcher
+        self.assertEqual(asyncio.run(self.detector.ajudge(self.documents[3])), self.expected[3])
+
+    def test_ajudge_many(self):
+        """
+        `ajudge_many()` yields results in input order, from plain and async iterables.
+        """
+        async def documents():
+            for document in self.documents:
+                await asyncio.sleep(0)
+                yield document
+
+        async def main():
+            plain = [result async for result in self.detector.ajudge_many(self.documents)]
+            streamed = [result async for result in self.detector.ajudge_many(documents())]
+            return plain, streamed
+
+        plain, streamed = asyncio.run(main())
+        self.assertEqual(plain, self.expected)
+        self.assertEqual(streamed, self.expected)
+
+    def test_backpressure(self):
+        """
+        With a small queue and batches, every document is still judged, in batches no larger than the limit.
+        """
+        async def main():
+            async with AsyncJudge(self.detector, max_batch_size=4, max_pending=8) as judge:
+                results = [result async for result in judge.judge_many(self.documents)]
+                self.assertLessEqual(judge._queue.qsize(), 8)
+                return results, judge.batches, judge.documents
+
+        results, batches, documents = asyncio.run(main())
+        self.assertEqual(results, self.expected)
+        self.assertEqual(documents, len(self.documents))
+        self.assertGreaterEqual(batches, len(self.documents) // 4)
+
+    def test_process_executor(self):
+        """
+        In a process pool, batches are judged by detectors created from the config, with analysis.
+        """
+        detector = CantoneseDetector(split_seg=True, use_quotes=True, get_analysis=True)
+
+        async def main():
+            with ProcessPoolExecutor(max_workers=2) as executor:
+                async with AsyncJudge(detector, executor=executor, max_concurrent_batches=2) as judge:
+                    return await asyncio.gather(*(judge.judge(document) for document in self.documents[:12]))
+
+        results = asyncio.run(main())
+        self.assertEqual([judgement for judgement, _ in results], self.expected[:12])
+        self.assertEqual(results[4][1].get_analysis(), detector.judge(self.documents[4])[1].get_analysis())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+
+from cantonesedetect.Detector import CantoneseDetector
+from cantonesedetect.cli import main
+
+
+class TestCli(unittest.TestCase):
+    """
+    Test the command line interface.
+    """
+
+    def test_workers(self):
+        """
+        Lines read from stdin and judged in batches by several workers are written in input order.
+        """
+        with open('tests/test_judge_sentences.txt', encoding='utf-8') as f:
+            lines = [line.split('|')[0] for line in f]
+        detector = CantoneseDetector(split_seg=True, use_quotes=True)
+        result = subprocess.run(
+            [sys.executable, "-m", "cantonesedetect.cli", "--input", "-", "--split", "--quotes", "--workers", "2",
+             "--batch-size", "3"],
+            input="".join(line + "\n" for line in lines).encode("utf-8"), capture_output=True, check=True)
+        self.assertEqual(result.stdout.decode("utf-8").splitlines(),
+                         [detector.judge(line).value for line in lines])
+
+    def test_mmap(self):
+        """
+        Corpus mode writes to stdout without closing it, and its options are rejected without `--mmap`.
+        """
+        lines = ["我哋去邊度？", "我们去哪里？", "佢嚟咗。"]
+        with tempfile.TemporaryDirectory() as tempdir:
+            input_path = os.path.join(tempdir, "input.txt")
+            with open(input_path, 'w', encoding='utf-8') as f:
+                f.write("".join(line + "\n" for line in lines))
+
+            output_path = os.path.join(tempdir, "output.txt")
+            with open(output_path, 'w', encoding='utf-8') as output, redirect_stdout(output):
+                main(['--input', input_path, '--mmap'])
+                self.assertFalse(output.closed)
+            with open(output_path, encoding='utf-8') as f:
+                self.assertEqual(f.read(), "cantonese\nswc\ncantonese\n")
+
+            for options in (['--output', output_path], ['--shard-output', output_path], ['--range-size', '1024']):
+                with self.assertRaises(SystemExit), redirect_stderr(io.StringIO()):
+                    main(['--input', input_path] + options)
+
+    def test_dedup_mode(self):
+        """
+        An unknown `--dedup` mode is rejected.
+        """
+        with self.assertRaises(SystemExit), redirect_stderr(io.StringIO()):
+            main(['--input', 'tests/test_judge_sentences.txt', '--dedup', 'keep'])
+
+    def test_filter(self):
+        """
+        `--filter` writes the input lines judged as the language, and is rejected with the options it would ignore.
+        """
+        lines = ["我哋去邊度？", "我们去哪里？", "佢嚟咗。"]
+        with tempfile.TemporaryDirectory() as tempdir:
+            input_path = os.path.join(tempdir, "input.txt")
+            with open(input_path, 'w', encoding='utf-8') as f:
+                f.write("".join(line + "\n" for line in lines))
+
+            output_path = os.path.join(tempdir, "output.txt")
+            with open(output_path, 'w', encoding='utf-8') as output, redirect_stdout(output):
+                main(['--input', input_path, '--filter', 'cantonese'])
+            with open(output_path, encoding='utf-8') as f:
+                self.assertEqual(f.read(), "我哋去邊度？\n佢嚟咗。\n")
+
+            for options in (['--mmap'], ['--format', 'jsonl'], ['--format', 'columnar'], ['--print_analysis']):
+                with self.assertRaises(SystemExit), redirect_stderr(io.StringIO()):
+                    main(['--input', input_path, '--filter', 'cantonese'] + options)
+            with self.assertRaises(SystemExit), redirect_stderr(io.StringIO()):
+                main(['job', '--input', input_path, '--output', os.path.join(tempdir, "labels.txt"),
+                      '--filter', 'cantonese'])
+
+    def test_lazy_import(self):
+        """
+        Importing the package and the CLI compiles no lexicon and imports neither asyncio, the process pool, NumPy,
+        pyarrow, json nor the corpus, deduplication and statistics modules.
+        The lexicons are compiled into the trie by the first judgement, without compiling their regexes.
+        The lazily imported classes replace their modules as attributes of the package.
+        """
+        code = (
+            "import sys, cantonesedetect, cantonesedetect.cli\n"
+            "from cantonesedetect.Detector import CANTO_FEATURE_RE, FEATURE_SCANNER, CantoneseDetector\n"
+            "print('asyncio' in sys.modules, 'concurrent.futures' in sys.modules, 'numpy' in sys.modules, "
+            "'pyarrow' in sys.modules, CANTO_FEATURE_RE._compiled is None, 'trie' in vars(FEATURE_SCANNER))\n"
+            "print(*(module in sys.modules for module in ('json', 'cantonesedetect.Corpus', "
+            "'cantonesedetect.CorpusStats', 'cantonesedetect.Deduplicator')))\n"
+            "CantoneseDetector(split_seg=True, use_quotes=True).judge('他說「係噉嘅」')\n"
+            "print(CANTO_FEATURE_RE._compiled is None, 'trie' in vars(FEATURE_SCANNER))\n"
+            "from cantonesedetect import AsyncJudge, FeatureTable\n"
+            "print(isinstance(AsyncJudge, type), isinstance(FeatureTable, type), "
+            "cantonesedetect.FeatureTable is FeatureTable)\n")
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.split(), ["False", "False", "False", "False", "True", "False",
+                                           "False", "False", "False", "False", "True", "True", "True", "True", "True"])
+
+
+if __name__ == '__main__':
+    unittest.main()
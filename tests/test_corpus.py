@@ -0,0 +1,102 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from cantonesedetect.Corpus import format_results, judge_file, run_job, split_byte_ranges
+from cantonesedetect.Detector import CantoneseDetector
+
+
+class TestCorpus(unittest.TestCase):
+    """
+    Test the memory-mapped corpus mode.
+    """
+
+    def setUp(self):
+        self.detector = CantoneseDetector(split_seg=True, use_quotes=True)
+        with open('input.txt', encoding='utf-8') as f:
+            self.lines = [line.strip() for line in f]
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tempdir.name, 'input.txt')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(self.lines))
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_split_byte_ranges(self):
+        """
+        Ranges cover the whole file and every range but the last ends after a newline.
+        """
+        ranges = split_byte_ranges(self.path, 7)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], len(data))
+        for (_, end), (next_start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, next_start)
+            self.assertEqual(data[end - 1:end], b'\n')
+
+    def test_judge_file(self):
+        """
+        The ranges are judged in parallel and written in input order.
+        """
+        expected = format_results(self.lines, [self.detector.judge(line) for line in self.lines], False)
+        output = io.BytesIO()
+        for _ in judge_file(self.detector._get_config(), self.path, output=output, workers=2, range_size=200):
+            pass
+        self.assertEqual(output.getvalue().decode('utf-8'), expected)
+
+        shard_output = os.path.join(self.tempdir.name, 'shard')
+        ranges = list(judge_file(self.detector._get_config(), self.path, shard_output=shard_output,
+                                 workers=1, range_size=500))
+        shards = []
+        for index in range(len(ranges)):
+            with open(f"{shard_output}.{index:05d}", encoding='utf-8') as f:
+                shards.append(f.read())
+        self.assertEqual("".join(shards), expected)
+
+    def test_run_job_resume(self):
+        """
+        Shards concatenate to the whole output, and a job resumed from a checkpoint neither duplicates nor drops lines,
+        even if output was written after the last checkpoint.
+        """
+        config = self.detector._get_config()
+        expected = format_results(self.lines, [self.detector.judge(line) for line in self.lines], False)
+
+        outputs = []
+        for shard_index in range(3):
+            output_path = os.path.join(self.tempdir.name, f'output.{shard_index}')
+            run_job(config, self.path, output_path, shard_index=shard_index, shard_count=3, range_size=300)
+            with open(output_path, encoding='utf-8') as f:
+                outputs.append(f.read())
+        self.assertEqual("".join(outputs), expected)
+
+        # Crash after the first range of shard 0 was checkpointed and part of the second range was written
+        output_path = os.path.join(self.tempdir.name, 'output.0')
+        checkpoint_path = output_path + '.checkpoint'
+        with open(checkpoint_path, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        first_range_end = split_byte_ranges(self.path, 100, checkpoint["start"], checkpoint["end"])[0][1]
+        with open(self.path, 'rb') as f:
+            first_range_lines = f.read(first_range_end).decode('utf-8').count('\n')
+        first_output = format_results(
+            self.lines[:first_range_lines], [self.detector.judge(line) for line in self.lines[:first_range_lines]], False)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(first_output + "partial output\n")
+        checkpoint.update(input_offset=first_range_end, output_offset=len(first_output.encode('utf-8')))
+        with open(checkpoint_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f)
+
+        run_job(config, self.path, output_path, shard_index=0, shard_count=3, range_size=300)
+        with open(output_path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), outputs[0])
+
+        with self.assertRaises(ValueError):
+            run_job(config, self.path, output_path, shard_index=0, shard_count=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
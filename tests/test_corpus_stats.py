@@ -0,0 +1,120 @@
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from cantonesedetect.CorpusStats import CANTO_EXCLUDE, CANTO_FEATURE, CorpusStats, MAGIC
+from cantonesedetect.Detector import CantoneseDetector
+from cantonesedetect.JudgementTypes import JudgementType
+from cantonesedetect.ParallelJudge import JUDGEMENT_CODES, JudgePool, chunked
+from cantonesedetect.cli import main
+
+
+class TestCorpusStats(unittest.TestCase):
+    """
+    Test the mergeable corpus statistics.
+    """
+
+    def setUp(self):
+        with open('tests/test_judge_sentences.txt', encoding='utf-8') as f:
+            self.lines = [line.split('|')[0] for line in f] * 3 + ["", "Hello World!"]
+
+    def test_judge(self):
+        """
+        Counting a document gives the same judgement as `judge()` in every mode, and counts its features and
+        segments. Early exit and the segment cache of the detector leave the counts unchanged.
+        """
+        for split_seg in (False, True):
+            for use_quotes in (False, True):
+                detector = CantoneseDetector(split_seg=split_seg, use_quotes=use_quotes)
+                stats = CorpusStats()
+                self.assertEqual([stats.judge(detector, line) for line in self.lines],
+                                 [detector.judge(line) for line in self.lines])
+                self.assertEqual(sum(stats.documents), len(self.lines))
+                self.assertEqual(sum(stats.segment_lengths),
+                                 sum(len(detector._split_part_texts(line, part))
+                                     for line in self.lines for part in detector._separate_parts(line)))
+
+                fast_detector = CantoneseDetector(split_seg=split_seg, use_quotes=use_quotes, early_exit=True, cache_size=8)
+                fast_stats = CorpusStats()
+                self.assertEqual([fast_stats.judge(fast_detector, line) for line in self.lines],
+                                 [detector.judge(line) for line in self.lines])
+                self.assertEqual(fast_stats, stats)
+
+        stats = CorpusStats()
+        stats.judge(CantoneseDetector(), "我哋唔係關係，我哋")
+        self.assertEqual(stats.markers(CANTO_FEATURE), {"哋": 2, "唔係": 1})
+        self.assertEqual(stats.markers(CANTO_EXCLUDE), {"關係": 1})
+        self.assertEqual(stats.documents[JUDGEMENT_CODES[JudgementType.CANTONESE]], 1)
+        self.assertEqual(stats.to_json()["segment_lengths"],
+                         [{"min_han_length": 8, "max_han_length": 15, "cantonese": 1}])
+
+    def test_merge(self):
+        """
+        Statistics of chunks judged by several workers merge into the statistics of the whole corpus.
+        """
+        detector = CantoneseDetector(split_seg=True, use_quotes=True)
+        expected = CorpusStats()
+        for line in self.lines:
+            expected.judge(detector, line)
+
+        for workers in (1, 2):
+            stats = CorpusStats()
+            with JudgePool(detector._get_config(), workers) as pool:
+                results = [result for _, batch_results in stats.imap(pool, chunked(self.lines, 7))
+                           for result in batch_results]
+            self.assertEqual(results, [detector.judge(line) for line in self.lines])
+            self.assertEqual(stats, expected)
+
+        halves = [CorpusStats(), CorpusStats()]
+        for index, line in enumerate(self.lines):
+            halves[index % 2].judge(detector, line)
+        self.assertEqual(CorpusStats.merged(halves), expected)
+
+    def test_export(self):
+        """
+        The binary and JSON exports read back to the same statistics.
+        """
+        detector = CantoneseDetector(split_seg=True)
+        stats = CorpusStats()
+        for line in self.lines:
+            stats.judge(detector, line)
+
+        block = stats.to_bytes()
+        self.assertTrue(block.startswith(MAGIC))
+        self.assertEqual(CorpusStats.from_bytes(block), stats)
+        self.assertEqual(CorpusStats.from_json(json.loads(json.dumps(stats.to_json()))), stats)
+
+        with self.assertRaises(ValueError):
+            CorpusStats.from_bytes(b"corrupt")
+        with self.assertRaises(ValueError):
+            CorpusStats.from_json({"documents": {}, "segment_lengths": [], "canto_feature": {"唔知道": 1},
+                                   "canto_exclude": {}, "swc_feature": {}, "swc_exclude": {}})
+
+    def test_cli(self):
+        """
+        `--stats` saves the statistics of a run, and `merge-stats` merges the files of several runs.
+        """
+        detector = CantoneseDetector(split_seg=True)
+        expected = CorpusStats()
+        for line in self.lines:
+            expected.judge(detector, line)
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            halves = [self.lines[:20], self.lines[20:]]
+            paths = [os.path.join(tempdir, "part0.stats"), os.path.join(tempdir, "part1.json")]
+            for index, (half, path) in enumerate(zip(halves, paths)):
+                input_path = os.path.join(tempdir, f"input{index}.txt")
+                with open(input_path, 'w', encoding='utf-8') as f:
+                    f.write("".join(line + "\n" for line in half))
+                with open(os.devnull, 'w', encoding='utf-8') as devnull, redirect_stdout(devnull):
+                    main(['--input', input_path, '--split', '--stats', path, '--batch-size', '8'])
+
+            merged = os.path.join(tempdir, "merged.stats")
+            main(['merge-stats', '--output', merged] + paths)
+            self.assertEqual(CorpusStats.load(merged), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
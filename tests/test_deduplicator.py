@@ -0,0 +1,110 @@
+import os
+import random
+import tempfile
+import unittest
+
+from cantonesedetect.Deduplicator import Deduplicator
+from cantonesedetect.Detector import CantoneseDetector
+from cantonesedetect.ParallelJudge import JudgePool, chunked
+
+
+class TestDeduplicator(unittest.TestCase):
+    """
+    Test the deduplicating corpus mode.
+    """
+
+    def setUp(self):
+        self.detector = CantoneseDetector(split_seg=True, use_quotes=True)
+        distinct = ["我哋去邊度？", "我们去哪里？", "Hello World!", "他說「係噉嘅」", "他說「係噉嘅」。我們去吃飯", ""] + \
+            [f"第{index}日佢哋嚟咗" for index in range(50)]
+        rng = random.Random(0)
+        self.lines = [rng.choice(distinct) for _ in range(500)]
+        self.expected = [self.detector.judge(line) for line in self.lines]
+
+    def judge(self, dedup, workers=1):
+        with JudgePool(self.detector._get_config(), workers) as pool, dedup:
+            lines, results = [], []
+            for batch, batch_results in dedup.imap(pool, chunked(self.lines, 37)):
+                lines += batch
+                results += batch_results
+        return lines, results
+
+    def test_reuse(self):
+        """
+        Duplicates get the judgement of their first copy, and only distinct lines are judged.
+        """
+        for workers in (1, 2):
+            dedup = Deduplicator("reuse")
+            lines, results = self.judge(dedup, workers)
+            self.assertEqual(lines, self.lines)
+            self.assertEqual(results, self.expected)
+            self.assertEqual(dedup.lines, len(self.lines))
+            self.assertEqual(dedup.duplicates, len(self.lines) - len(set(self.lines)))
+            self.assertEqual(dedup.rejudged, 0)
+            self.assertIn(f"duplicates: {dedup.duplicates}", dedup.report())
+
+    def test_drop(self):
+        """
+        Only the first copy of every line is written.
+        """
+        dedup = Deduplicator("drop")
+        lines, results = self.judge(dedup)
+        self.assertEqual(lines, list(dict.fromkeys(self.lines)))
+        self.assertEqual(results, [self.detector.judge(line) for line in lines])
+
+        analysis = CantoneseDetector(split_seg=True, get_analysis=True)
+        with JudgePool(analysis._get_config(), 1) as pool:
+            with self.assertRaises(ValueError):
+                next(Deduplicator("reuse").imap(pool, chunked(self.lines, 37)))
+            batch, results = next(Deduplicator("drop").imap(pool, chunked(self.lines, 37)))
+            self.assertEqual(results[0][0], analysis.judge(batch[0])[0])
+
+    def test_bounded(self):
+        """
+        With a small seen-set, forgotten lines are judged again and spilled lines are still recognized, and the
+        results stay the same.
+        """
+        dedup = Deduplicator("reuse", max_entries=8)
+        lines, results = self.judge(dedup)
+        self.assertEqual(results, self.expected)
+        self.assertGreater(dedup.seen.evicted, 0)
+        self.assertLess(dedup.duplicates - dedup.rejudged, len(self.lines) - len(set(self.lines)))
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            dedup = Deduplicator("drop", max_entries=8, spill_dir=tempdir)
+            lines, _ = self.judge(dedup)
+            self.assertEqual(lines, list(dict.fromkeys(self.lines)))
+            self.assertGreater(dedup.seen.spilled, 0)
+            self.assertEqual(os.listdir(tempdir), [])
+
+    def test_drop_window(self):
+        """
+        Without spilling, `"drop"` only drops the copies of lines still in memory: a forgotten line is written again.
+        With spilling, every evicted entry goes to disk, so every line is written exactly once.
+        """
+        self.lines = [f"第{index}日佢哋嚟咗" for index in range(20)] * 2
+        dedup = Deduplicator("drop", max_entries=8)
+        lines, _ = self.judge(dedup)
+        self.assertEqual(lines, self.lines)
+        self.assertGreater(dedup.seen.evicted, 0)
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            dedup = Deduplicator("drop", max_entries=8, spill_dir=tempdir)
+            lines, _ = self.judge(dedup)
+            self.assertEqual(lines, self.lines[:20])
+            self.assertEqual(dedup.seen.evicted, 0)
+            self.assertEqual(len(dedup.seen), 20)
+
+    def test_filter(self):
+        """
+        Filtering reuses the decision of the first copy.
+        """
+        dedup = Deduplicator("reuse")
+        with JudgePool(self.detector._get_config(), 1) as pool, dedup:
+            kept = [line for batch, keep in dedup.ifilter(pool, chunked(self.lines, 37), "cantonese")
+                    for line, kept in zip(batch, keep) if kept]
+        self.assertEqual(kept, [line for line in self.lines if self.detector.is_cantonese(line)])
+
+
+if __name__ == '__main__':
+    unittest.main()
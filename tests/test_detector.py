@@ -1,7 +1,10 @@
+import io
+import math
 import unittest
 import pytest
 from cantonesedetect.Detector import CantoneseDetector
 from cantonesedetect.JudgementTypes import JudgementType
+from cantonesedetect.SegmentFeatures import SegmentFeatures
 
 
 class TestCantoneseDetector(unittest.TestCase):
@@ -23,14 +26,14 @@ class TestCantoneseDetector(unittest.TestCase):
         self.assertEqual(self.detector._hant_length("123 foobar。"), 0)
 
     @pytest.mark.private
-    def test_separate_quotes(self):
+    def test_separate_parts(self):
         """
-        `_separate_quotes()` should always return 2 strings.
+        `_separate_parts()` should return the matrix and the quotes.
         """
         document = "一外「一內」二外『二內』三外“三內”。"
-        matrix, quotes = self.detector._separate_quotes(document)
-        self.assertEqual(matrix, "一外…二外…三外…。")
-        self.assertEqual(quotes, "一內…二內…三內")
+        matrix, quotes = self.detector._separate_parts(document)
+        self.assertEqual(matrix.joiner.join(document[start:end] for start, end in matrix.pieces), "一外…二外…三外…。")
+        self.assertEqual(quotes.joiner.join(document[start:end] for start, end in quotes.pieces), "一內…二內…三內")
 
     @pytest.mark.private
     def test_get_segment_features(self):
@@ -43,6 +46,48 @@ class TestCantoneseDetector(unittest.TestCase):
         self.assertEqual(segment_features.swc_feature_count, 2)  # 們、哪裏
         self.assertEqual(segment_features.segment_length, 16)
 
+        # The features can still be built from the matched strings
+        built = SegmentFeatures(segment, segment_features.canto_feature, segment_features.canto_exclude,
+                                segment_features.swc_feature, segment_features.swc_exclude, 2, 2, 16)
+        for name in ("segment", "canto_feature", "canto_exclude", "swc_feature", "swc_exclude", "canto_content",
+                     "swc_content", "segment_length"):
+            self.assertEqual(getattr(built, name), getattr(segment_features, name))
+        self.assertEqual(built.matches, segment_features.matches)
+        with self.assertRaises(ValueError):
+            SegmentFeatures(segment, ["佢"], [], [], [], 1, 0, 16)
+
+    def test_analysis(self):
+        """
+        The features keep offsets into the document, and the analysis written to a stream is `get_analysis()`.
+        """
+        detector = CantoneseDetector(split_seg=True, use_quotes=True, get_analysis=True)
+        document = "他說「我哋唔係關係。」"
+        _, document_features = detector.judge(document)
+        quote_features = document_features.document_segments_features[1]
+        self.assertEqual(quote_features.segment, "我哋唔係關係")
+        self.assertEqual(quote_features.offsets, ((3, 9),))
+        self.assertEqual(quote_features.canto_feature, ["哋", "唔係"])
+        self.assertEqual(quote_features.canto_exclude, ["關係"])
+        self.assertEqual(quote_features.match_counts(), (2, 1, 0, 0))
+        self.assertFalse(hasattr(quote_features, "__dict__"))
+
+        analysis = io.StringIO()
+        document_features.write_analysis(analysis)
+        self.assertEqual(analysis.getvalue(), document_features.get_analysis())
+        self.assertIn("Segment: 我哋唔係關係\nJudgement: cantonese\nCantonese features: 哋, 唔係\n", analysis.getvalue())
+
+    @pytest.mark.private
+    def test_get_segment_counts(self):
+        """
+        `_get_segment_counts()` should agree with the counts of `_get_segment_features()`.
+        """
+        segment = "我哋去邊度食飯啊？我們去哪裏吃飯呢？"
+        segment_features = self.detector._get_segment_features(segment)
+        self.assertEqual(self.detector._get_segment_counts(segment), (
+            segment_features.canto_feature_count, segment_features.swc_feature_count, segment_features.segment_length))
+        self.assertEqual(self.detector._judge_segment_counts(2, 0, 7), JudgementType.CANTONESE)
+        self.assertEqual(self.detector._judge_segment_counts(0, 0, 0), JudgementType.NEUTRAL)
+
     @pytest.mark.private
     def test_judge_single_segment(self):
         """
@@ -83,6 +128,122 @@ class TestCantoneseDetector(unittest.TestCase):
         self.assertEqual(self.detector.judge(
             "Hello World!"), JudgementType.NEUTRAL)
 
+    def test_instrumentation(self):
+        """
+        An instrumented detector gives the same judgements and counts stages, segments and matches.
+        """
+        self.assertIsNone(self.detector.stats)
+        detector = CantoneseDetector(split_seg=True, use_quotes=True, instrument=True)
+        self.assertEqual(detector.judge("他說「係噉嘅」。我們去吃飯"), JudgementType.CANTONESE_QUOTES_IN_SWC)
+
+        snapshot = detector.stats.snapshot()
+        self.assertEqual(snapshot["counters"]["documents"], 1)
+        self.assertEqual(snapshot["counters"]["segments"], 3)
+        self.assertEqual(snapshot["counters"]["canto_feature"], 2)  # 噉、嘅
+        self.assertEqual(snapshot["counters"]["swc_feature"], 3)  # 他、說、吃
+        self.assertEqual(snapshot["calls"]["_separate_parts"], 1)
+        self.assertEqual(snapshot["calls"]["_judge_segments"], 2)
+        self.assertEqual(snapshot["calls"]["_get_segment_counts"], 3)
+        self.assertGreater(snapshot["seconds"]["_get_segment_counts"], 0)
+        self.assertGreater(snapshot["seconds"]["judge"], 0)
+
+        detector.stats.reset()
+        self.assertEqual(detector.stats.snapshot()["counters"]["documents"], 0)
+        detector.judge("我哋去邊度？")
+        self.assertEqual(detector.stats.snapshot()["counters"]["documents"], 1)
+        self.assertEqual(detector.stats.snapshot()["calls"]["judge"], 1)
+
+    def test_early_exit(self):
+        """
+        Early exit gives the same judgements as the full scan, and stops once the judgement is decided.
+        """
+        documents = ["我哋去邊度？", "我们去哪里？", "Hello World!", "他說「係噉嘅」", "他說「係噉嘅」。我們去吃飯",
+                     "佢嚟咗。" * 30 + "他說了。" * 2, "他說了。" * 30 + "佢嚟咗。", "「佢嚟咗，他說了」。今日。"]
+        for split_seg in (False, True):
+            for use_quotes in (False, True):
+                detector = CantoneseDetector(split_seg=split_seg, use_quotes=use_quotes)
+                early_detector = CantoneseDetector(split_seg=split_seg, use_quotes=use_quotes, early_exit=True)
+                for document in documents:
+                    self.assertEqual(early_detector.judge(document), detector.judge(document))
+
+        # 2 SWC segments out of 40 can no longer make the document SWC or Neutral, nor can they stop it being Cantonese
+        detector = CantoneseDetector(split_seg=True, early_exit=True, instrument=True)
+        self.assertEqual(detector.judge("佢嚟咗。" * 38 + "他說了。" * 2), JudgementType.CANTONESE)
+        self.assertEqual(detector.stats.snapshot()["calls"]["_get_segment_counts"], 38)
+
+    def test_reachable_segment_judgements(self):
+        """
+        The reachable judgements are exactly those the aggregation gives for some judgements of the remaining segments.
+        """
+        detector = CantoneseDetector(split_seg=True)
+
+        def compositions(count):
+            return [(canto, swc, neutral) for canto in range(count + 1) for swc in range(count + 1 - canto)
+                    for neutral in range(count + 1 - canto - swc)]
+
+        for total in range(1, 9):
+            threshold = math.ceil(total * 0.95)
+            for judged in range(total + 1):
+                remaining = total - judged
+                for canto, swc, neutral in compositions(judged):
+                    expected = {detector._aggregate_segment_judgements(canto + extra_canto, swc + extra_swc,
+                                                                       neutral + extra_neutral, total)
+                                for extra_canto, extra_swc, extra_neutral in compositions(remaining)}
+                    reachable = detector._reachable_segment_judgements(canto, swc, neutral, remaining, threshold)
+                    self.assertEqual(set(reachable), expected)
+                    self.assertEqual(len(reachable), len(expected))
+
+    def test_predicates(self):
+        """
+        `is_cantonese()` and `is_swc()` agree with `judge()`, and stop once the answer is certain.
+        """
+        documents = ["我哋去邊度？", "我们去哪里？", "Hello World!", "他說「係噉嘅」", "他說「係噉嘅」。我們去吃飯", "",
+                     "佢嚟咗。" * 30 + "他說了。" * 2, "他說了。" * 30 + "佢嚟咗。", "「佢嚟咗，他說了」。今日。", "。，"]
+        for split_seg in (False, True):
+            for use_quotes in (False, True):
+                detector = CantoneseDetector(split_seg=split_seg, use_quotes=use_quotes)
+                for document in documents:
+                    judgement = detector.judge(document)
+                    self.assertEqual(detector.is_cantonese(document), judgement == JudgementType.CANTONESE)
+                    self.assertEqual(detector.is_swc(document), judgement == JudgementType.SWC)
+
+        # After 3 SWC segments out of 40, Cantonese + Neutral can no longer reach 95%
+        detector = CantoneseDetector(split_seg=True, instrument=True)
+        self.assertFalse(detector.is_cantonese("他說了。" * 3 + "佢嚟咗。" * 37))
+        self.assertEqual(detector.stats.snapshot()["calls"]["_get_segment_counts"], 3)
+
+    def test_tag(self):
+        """
+        `tag()` gives the judgements of the segments as merged spans of the document, the same as the analysis.
+        """
+        detector = CantoneseDetector(split_seg=True, use_quotes=True)
+        document = "我哋去邊度？佢話好。我们去哪里？他說「係噉嘅，我哋走啦」。"
+        self.assertEqual([(document[start:end], judgement) for start, end, judgement in detector.tag(document)], [
+            ("我哋去邊度？佢話好", JudgementType.CANTONESE),
+            ("我们去哪里？他說", JudgementType.SWC),
+            ("係噉嘅，我哋走啦", JudgementType.CANTONESE),
+        ])
+        self.assertEqual(detector.tag(""), [])
+        self.assertEqual(CantoneseDetector().tag("Hello World!"), [(0, 12, JudgementType.NEUTRAL)])
+
+        with open('tests/test_judge_sentences.txt', encoding='utf-8') as f:
+            documents = [line.split('|')[0] for line in f] + ["佢嚟咗。他說了。\n\n今日好熱。佢嚟咗"]
+        for split_seg in (False, True):
+            analysis = CantoneseDetector(split_seg=split_seg, get_analysis=True)
+            detectors = (CantoneseDetector(split_seg=split_seg), CantoneseDetector(split_seg=split_seg, cache_size=8),
+                         analysis)
+            for detector in detectors:
+                for document in documents:
+                    expected = []
+                    document_features = analysis.judge(document)[1]
+                    for segment_features, judgement in zip(document_features.document_segments_features,
+                                                           document_features.document_segments_judgements):
+                        (start, end), = segment_features.offsets
+                        if expected and expected[-1][2] is judgement:
+                            start = expected.pop()[0]
+                        expected.append((start, end, judgement))
+                    self.assertEqual(detector.tag(document), expected)
+
 
 if __name__ == '__main__':
     unittest.main()
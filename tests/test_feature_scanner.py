@@ -0,0 +1,79 @@
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from cantonesedetect.Detector import FEATURE_SCANNER
+from cantonesedetect.FeatureScanner import FeatureScanner, _expand_pattern
+
+
+class TestFeatureScanner(unittest.TestCase):
+    """
+    Test the single-pass `FeatureScanner` against the lexicon regexes.
+    """
+
+    def test_expand_pattern(self):
+        """
+        Literals are expanded in the order the regex engine tries them.
+        """
+        self.assertEqual(_expand_pattern("(ab|c)[de]|f"), ["abd", "abe", "cd", "ce", "f"])
+        with self.assertRaises(ValueError):
+            _expand_pattern("a+")
+
+    def test_findall(self):
+        """
+        `findall()` returns the four match lists and the Han length.
+        """
+        canto_feature, canto_exclude, swc_feature, swc_exclude, segment_length = FEATURE_SCANNER.findall(
+            "我哋唔係關係，Hello你們在那裏吃飯")
+        self.assertEqual(canto_feature, ["哋", "唔係"])
+        self.assertEqual(canto_exclude, ["關係"])
+        self.assertEqual(swc_feature, ["在", "那", "吃"])
+        self.assertEqual(swc_exclude, [])
+        self.assertEqual(segment_length, 13)
+
+    def test_differential_check(self):
+        """
+        The scanner agrees with the regexes on real sentences and on dense random mixes of lexicon characters,
+        where matches of different lexicons overlap.
+        """
+        with open('tests/test_judge_sentences.txt', encoding='utf-8') as f:
+            segments = [line.split('|')[0] for line in f]
+
+        alphabet = sorted({char for pattern in FEATURE_SCANNER.patterns
+                           for literal in _expand_pattern(pattern.pattern) for char in literal}) + list("，。a 𠀀︀")
+        rng = random.Random(0)
+        segments += ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40))) for _ in range(2000)]
+
+        self.assertEqual(FEATURE_SCANNER.differential_check(segments), [])
+
+        # The CLI check reads its input like every other mode, here from stdin
+        result = subprocess.run([sys.executable, "-m", "cantonesedetect.cli", "--input", "-", "--check_scanner"],
+                                input="\n".join(segments[:50]).encode("utf-8"), capture_output=True, check=True)
+        self.assertEqual(result.stdout.decode("utf-8").strip(), "Scanner mismatches: 0")
+
+    def test_cache(self):
+        """
+        A scanner with a cache directory saves its trie once, and later scanners load the same trie from it.
+        """
+        with tempfile.TemporaryDirectory() as tempdir:
+            scanner = FeatureScanner(*FEATURE_SCANNER.patterns, FEATURE_SCANNER.han_re, cache_dir=tempdir)
+            self.assertEqual(scanner.trie, FEATURE_SCANNER.trie)
+            self.assertEqual(os.listdir(tempdir), [os.path.basename(scanner.cache_path())])
+
+            cached = FeatureScanner(*FEATURE_SCANNER.patterns, FEATURE_SCANNER.han_re, cache_dir=tempdir)
+            self.assertEqual(cached.trie, FEATURE_SCANNER.trie)
+            self.assertEqual(cached.max_literal_length, FEATURE_SCANNER.max_literal_length)
+            self.assertEqual(cached.count("我哋唔係關係，你們在那裏吃飯"), FEATURE_SCANNER.count("我哋唔係關係，你們在那裏吃飯"))
+
+            # A corrupt file is rebuilt
+            with open(scanner.cache_path(), 'wb') as f:
+                f.write(b"corrupt")
+            self.assertEqual(FeatureScanner(*FEATURE_SCANNER.patterns, FEATURE_SCANNER.han_re,
+                                            cache_dir=tempdir).trie, FEATURE_SCANNER.trie)
+
+
+if __name__ == '__main__':
+    unittest.main()
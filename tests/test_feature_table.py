@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+from array import array
+
+from cantonesedetect.Detector import CantoneseDetector
+from cantonesedetect.FeatureTable import FeatureTable
+from cantonesedetect.VectorJudge import _numpy
+
+
+class TestFeatureTable(unittest.TestCase):
+    """
+    Test re-judging a feature table under other thresholds.
+    """
+
+    documents = ["我哋去邊度？", "我们去哪里？", "Hello World!", "他說「係噉嘅」", "他說「係噉嘅」。我們去吃飯", "",
+                 "「佢嚟咗，他說了」", "佢嚟咗。他說了。今日好熱。", "。，", "「」"]
+    configs = [{}, {"canto_presence": 0.5, "swc_presence": 0.5}, {"canto_tolerance": 0.2, "swc_tolerance": 0.0},
+               {"canto_tolerance": 0.0, "swc_tolerance": 0.0, "canto_presence": 0.0, "swc_presence": 0.0}]
+
+    def test_judge_grid(self):
+        """
+        Every config gives the same judgements as a detector with these thresholds, in every mode.
+        """
+        for split_seg in (False, True):
+            for use_quotes in (False, True):
+                table = FeatureTable.build(self.documents, split_seg=split_seg, use_quotes=use_quotes)
+                self.assertEqual(len(table), len(self.documents))
+                for config, judgements in zip(self.configs, table.judge_grid(self.configs)):
+                    detector = CantoneseDetector(split_seg=split_seg, use_quotes=use_quotes, **config)
+                    self.assertEqual(judgements, [detector.judge(document) for document in self.documents])
+
+    @unittest.skipIf(_numpy() is None, "NumPy is not installed")
+    def test_numpy_backend(self):
+        """
+        The vectorized backend gives the same judgements as the pure Python one, including at the exact
+        floor/ceil boundaries of the thresholds.
+        """
+        configs = self.configs + [{"canto_tolerance": 1 / 3, "swc_tolerance": 0.1, "canto_presence": 0.1, "swc_presence": 0.3}]
+        for split_seg in (False, True):
+            for use_quotes in (False, True):
+                table = FeatureTable.build(self.documents, split_seg=split_seg, use_quotes=use_quotes)
+                self.assertEqual(table.judge_grid(configs, backend="numpy"), table.judge_grid(configs, backend="python"))
+
+        # Segments at the boundaries: 10 Han characters with 0 to 3 features of each language
+        counts = [(canto, swc) for canto in range(-1, 4) for swc in range(-1, 4)]
+        offsets = array("q", range(len(counts) + 1))
+        table = FeatureTable(False, False, array("i", [canto for canto, _ in counts]), array("i", [swc for _, swc in counts]),
+                             array("i", [10] * len(counts)), offsets, offsets)
+        for config in configs:
+            detector = CantoneseDetector(**config)
+            self.assertEqual(table.judge(backend="numpy", **config),
+                             [detector._judge_segment_counts(canto, swc, 10) for canto, swc in counts])
+
+    def test_save_load(self):
+        table = FeatureTable.build(self.documents, split_seg=True, use_quotes=True)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "table.bin")
+            table.save(path)
+            loaded = FeatureTable.load(path)
+        self.assertEqual((loaded.split_seg, loaded.use_quotes), (True, True))
+        self.assertEqual(loaded.han_lengths, table.han_lengths)
+        self.assertEqual(loaded.document_offsets, table.document_offsets)
+        self.assertEqual(loaded.judge(), table.judge())
+
+
+if __name__ == '__main__':
+    unittest.main()
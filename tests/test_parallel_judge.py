@@ -0,0 +1,62 @@
+import unittest
+
+from cantonesedetect.Detector import CantoneseDetector
+from cantonesedetect.JudgementTypes import JudgementType
+from cantonesedetect.ParallelJudge import JUDGEMENTS, JudgePool, chunked, decode_judgements, encode_judgements
+
+
+class TestParallelJudge(unittest.TestCase):
+    """
+    Test judging chunks of documents in a pool of workers.
+    """
+
+    def setUp(self):
+        with open('tests/test_judge_sentences.txt', encoding='utf-8') as f:
+            self.documents = [line.split('|')[0] for line in f] + ["佢嚟咗。他說了。\n\n今日好熱。佢嚟咗", ""]
+
+    def test_encode_judgements(self):
+        """
+        Judgements are sent back from the workers as one byte each.
+        """
+        self.assertEqual(decode_judgements(encode_judgements(JUDGEMENTS)), list(JUDGEMENTS))
+        self.assertEqual(list(chunked(range(7), 3)), [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_judge_many(self):
+        """
+        `judge_many()` should return the same judgements as `judge()`, in input order.
+        """
+        detector = CantoneseDetector(use_quotes=True)
+        documents = ["我哋去邊度？", "我们去哪里？", "Hello World!", "他說「係噉嘅」"] * 10
+        expected = [detector.judge(document) for document in documents]
+        self.assertEqual(detector.judge_many(documents, workers=1), expected)
+        self.assertEqual(detector.judge_many(documents, workers=2, chunksize=3), expected)
+
+        analysis_detector = CantoneseDetector(split_seg=True, use_quotes=True, get_analysis=True)
+        results = analysis_detector.judge_many(documents, workers=2, chunksize=3)
+        self.assertEqual([judgement for judgement, _ in results], [
+            analysis_detector.judge(document)[0] for document in documents])
+        self.assertEqual(results[0][1].get_analysis(), analysis_detector.judge(documents[0])[1].get_analysis())
+
+    def test_imap(self):
+        """
+        `imap()`, `ifilter()` and `itag()` yield every chunk with its results, in input order, with a bounded number
+        of chunks in flight.
+        """
+        detector = CantoneseDetector(split_seg=True, use_quotes=True)
+        chunks = list(chunked(self.documents, 4))
+        with JudgePool(detector._get_config(), 2) as pool:
+            judged = list(pool.imap(iter(chunks), max_pending=1))
+            filtered = list(pool.ifilter(iter(chunks), "cantonese"))
+            tagged = list(pool.itag(iter(chunks)))
+
+        self.assertEqual([chunk for chunk, _ in judged], chunks)
+        self.assertEqual([judgement for _, judgements in judged for judgement in judgements],
+                         [detector.judge(document) for document in self.documents])
+        self.assertEqual([kept for _, keep in filtered for kept in keep],
+                         [detector.judge(document) == JudgementType.CANTONESE for document in self.documents])
+        self.assertEqual([spans for _, chunk_spans in tagged for spans in chunk_spans],
+                         [detector.tag(document) for document in self.documents])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from cantonesedetect.Corpus import judge_file
+from cantonesedetect.Detector import CantoneseDetector
+from cantonesedetect.Records import document_record, encode_columnar, read_columnar, write_jsonl
+
+
+class TestRecords(unittest.TestCase):
+    """
+    Test the JSON Lines and columnar output formats.
+    """
+
+    documents = ["他說「係噉嘅」。我們去吃飯", "我哋唔係關係。", "", "Hello World!", "「佢嚟咗，他說了」。今日。"]
+
+    def test_jsonl(self):
+        """
+        Every document is one JSON line with its judgement, and its segments with analysis.
+        """
+        detector = CantoneseDetector(split_seg=True, use_quotes=True, get_analysis=True)
+        results = [detector.judge(document) for document in self.documents]
+        output = io.StringIO()
+        write_jsonl(output, self.documents, results)
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+
+        self.assertEqual(len(records), len(self.documents))
+        self.assertEqual(records[0]["judgement"], "cantonese_quotes_in_swc")
+        quote = records[0]["segments"][2]
+        self.assertEqual(quote["text"], "係噉嘅")
+        self.assertEqual(quote["offsets"], [[3, 6]])
+        self.assertEqual(quote["judgement"], "cantonese")
+        self.assertEqual((quote["canto_feature_count"], quote["han_length"]), (2, 3))
+        self.assertEqual(quote["canto_feature"], ["噉", "嘅"])
+        self.assertEqual(records[1]["segments"][0]["canto_exclude"], ["關係"])
+
+        plain = CantoneseDetector().judge(self.documents[0])
+        self.assertEqual(document_record(self.documents[0], plain), {"input": self.documents[0], "judgement": "mixed"})
+
+    def test_columnar(self):
+        """
+        Blocks of the columnar format read back as the JSON records, with or without analysis.
+        """
+        for get_analysis in (False, True):
+            detector = CantoneseDetector(split_seg=True, use_quotes=True, get_analysis=get_analysis)
+            results = [detector.judge(document) for document in self.documents]
+            # Two blocks concatenated
+            stream = io.BytesIO(encode_columnar(self.documents[:2], results[:2])
+                                + encode_columnar(self.documents[2:], results[2:]))
+            expected = [document_record(document, result) for document, result in zip(self.documents, results)]
+            self.assertEqual(list(read_columnar(stream)), expected)
+
+    def test_judge_file(self):
+        """
+        The corpus mode writes the same records as judging line by line.
+        """
+        detector = CantoneseDetector(split_seg=True, get_analysis=True)
+        with tempfile.TemporaryDirectory() as tempdir:
+            path = os.path.join(tempdir, 'input.txt')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("\n".join(self.documents * 20))
+            expected = [document_record(document, detector.judge(document)) for document in self.documents * 20]
+
+            output = io.BytesIO()
+            for _ in judge_file(detector._get_config(), path, output=output, workers=2, range_size=100,
+                                output_format="jsonl"):
+                pass
+            self.assertEqual([json.loads(line) for line in output.getvalue().decode('utf-8').splitlines()], expected)
+
+            output = io.BytesIO()
+            for _ in judge_file(detector._get_config(), path, output=output, workers=2, range_size=100,
+                                output_format="columnar"):
+                pass
+            output.seek(0)
+            self.assertEqual(list(read_columnar(output)), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
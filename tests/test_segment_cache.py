@@ -0,0 +1,48 @@
+import unittest
+
+from cantonesedetect.Detector import CantoneseDetector
+from cantonesedetect.SegmentCache import SegmentCache
+
+
+class TestSegmentCache(unittest.TestCase):
+    """
+    Test the LRU cache of segment judgements.
+    """
+
+    def test_eviction(self):
+        """
+        The least recently used entry is evicted first.
+        """
+        cache = SegmentCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_cached_detector(self):
+        """
+        A cached detector gives the same judgements and counts hits for repeated segments, in every mode.
+        """
+        documents = ["係。係。我哋去邊度？", "他說「係」", "他說「係噉嘅」。係。", "是咁的"] * 3
+        for split_seg in (False, True):
+            for use_quotes in (False, True):
+                detector = CantoneseDetector(split_seg=split_seg, use_quotes=use_quotes)
+                cached_detector = CantoneseDetector(split_seg=split_seg, use_quotes=use_quotes, cache_size=8)
+                for document in documents:
+                    self.assertEqual(cached_detector.judge(document), detector.judge(document))
+                self.assertGreater(cached_detector.segment_cache.hits, 0)
+                self.assertLessEqual(len(cached_detector.segment_cache), 8)
+
+        analysis_detector = CantoneseDetector(split_seg=True, get_analysis=True, cache_size=8)
+        judgement, document_features = analysis_detector.judge("佢嚟咗。佢嚟咗。")
+        self.assertEqual(judgement, "cantonese")
+        self.assertEqual(len(document_features.document_segments_features), 2)
+        self.assertEqual(analysis_detector.segment_cache.stats()["hits"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
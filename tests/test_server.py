@@ -0,0 +1,115 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+import urllib.error
+import urllib.request
+
+from cantonesedetect.Detector import CantoneseDetector
+from cantonesedetect.Server import JudgeServer
+
+
+async def request(reader, writer, method, target, body=None):
+    """
+    Send one request on a keep-alive connection and return the status and the decoded JSON response.
+    """
+    payload = b"" if body is None else json.dumps(body).encode("utf-8")
+    writer.write(f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(payload)}\r\n\r\n"
+                 .encode("latin-1") + payload)
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) != b"\r\n":
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return status, json.loads(await reader.readexactly(int(headers["content-length"])))
+
+
+class TestJudgeServer(unittest.TestCase):
+    """
+    Test the judging server.
+    """
+
+    documents = ["我哋去邊度？", "我们去哪里？", "Hello World!", "他說「係噉嘅」", "他說「係噉嘅」。我們去吃飯"]
+
+    def setUp(self):
+        self.detector = CantoneseDetector(split_seg=True, use_quotes=True)
+        self.expected = [self.detector.judge(document).value for document in self.documents]
+
+    def test_tcp(self):
+        """
+        Single and batched documents over TCP, concurrent clients, errors and stats.
+        """
+        async def main():
+            server = JudgeServer(self.detector)
+            listener = await server.start(port=0)
+            port = listener.sockets[0].getsockname()[1]
+            try:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                self.assertEqual(await request(reader, writer, "POST", "/judge", {"document": self.documents[0]}),
+                                 (200, {"judgement": "cantonese"}))
+                status, records = await request(reader, writer, "POST", "/judge", {"documents": self.documents})
+                self.assertEqual([record["judgement"] for record in records], self.expected)
+                self.assertEqual((await request(reader, writer, "POST", "/judge", {"text": ""}))[0], 400)
+                self.assertEqual((await request(reader, writer, "GET", "/judge"))[0], 405)
+                self.assertEqual((await request(reader, writer, "GET", "/nothing"))[0], 404)
+                writer.close()
+
+                # Concurrent clients with a standard HTTP client
+                def post(document):
+                    with urllib.request.urlopen(urllib.request.Request(
+                            f"http://127.0.0.1:{port}/judge", data=json.dumps({"document": document}).encode("utf-8"),
+                            method="POST")) as response:
+                        return json.loads(response.read())["judgement"]
+
+                loop = asyncio.get_running_loop()
+                judgements = await asyncio.gather(*(loop.run_in_executor(None, post, document)
+                                                    for document in self.documents * 4))
+                self.assertEqual(judgements, self.expected * 4)
+
+                with self.assertRaises(urllib.error.HTTPError):
+                    await loop.run_in_executor(None, post, None)
+
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                status, stats = await request(reader, writer, "GET", "/stats")
+                writer.close()
+                return status, stats
+            finally:
+                await server.close()
+
+        status, stats = asyncio.run(main())
+        self.assertEqual(status, 200)
+        self.assertEqual(stats["requests"], 22)
+        self.assertEqual(stats["documents"], 26)
+        self.assertEqual(stats["errors"], 4)
+        self.assertGreater(stats["batches"], 0)
+        self.assertGreaterEqual(stats["latency"]["max"], stats["latency"]["p50"])
+
+    def test_unix_socket(self):
+        """
+        A server on a Unix socket with worker processes and analysis.
+        """
+        if not hasattr(asyncio, "start_unix_server"):
+            self.skipTest("Unix sockets are not available")
+        detector = CantoneseDetector(split_seg=True, use_quotes=True, get_analysis=True)
+
+        async def main(path):
+            server = JudgeServer(detector, workers=2)
+            await server.start(path=path)
+            try:
+                reader, writer = await asyncio.open_unix_connection(path)
+                response = await request(reader, writer, "POST", "/judge", {"documents": self.documents})
+                writer.close()
+                return response
+            finally:
+                await server.close()
+
+        with tempfile.TemporaryDirectory() as tempdir:
+            status, records = asyncio.run(main(os.path.join(tempdir, "judge.sock")))
+        self.assertEqual(status, 200)
+        self.assertEqual([record["judgement"] for record in records], self.expected)
+        self.assertEqual(records[3]["segments"][1]["canto_feature"], ["噉", "嘅"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import random
+import unittest
+
+from cantonesedetect.Detector import CantoneseDetector
+from cantonesedetect.StreamingDetector import StreamingDetector
+
+
+class TestStreamingDetector(unittest.TestCase):
+    """
+    `StreamingDetector` should give the same judgement as `judge()` however the document is chunked.
+    """
+
+    def test_same_as_judge(self):
+        rng = random.Random(0)
+        alphabet = list("我哋唔係嘅佢喺啲咗他們的是在了吃說關係而已屋企你好，。！？\n a「」『』“”《》【】…")
+        documents = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60))) for _ in range(300)]
+        with open('tests/test_judge_sentences.txt', encoding='utf-8') as f:
+            documents += [line.split('|')[0] for line in f]
+        documents += ["「佢話『係咪』」", "「「」", "」「", "「你好」」", "“一”二「三」《四》"]
+
+        for split_seg in (False, True):
+            for use_quotes in (False, True):
+                detector = CantoneseDetector(split_seg=split_seg, use_quotes=use_quotes)
+                stream = StreamingDetector(detector)
+                for document in documents:
+                    position = 0
+                    while position < len(document):
+                        size = rng.randint(1, 8)
+                        stream.feed(document[position:position + size])
+                        position += size
+                    self.assertEqual(stream.finish(), detector.judge(document),
+                                     f"split_seg={split_seg}, use_quotes={use_quotes}, document={document!r}")
+
+    def test_get_analysis_unsupported(self):
+        with self.assertRaises(ValueError):
+            StreamingDetector(CantoneseDetector(get_analysis=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import os
+import random
+import subprocess
+import sys
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from cantonesedetect.Detector import ALL_HAN_RE, FEATURE_SCANNER, CantoneseDetector
+from cantonesedetect.FeatureScanner import FeatureScanner
+from cantonesedetect.LazyPattern import LazyPattern
+from cantonesedetect.ParallelJudge import JudgePool, chunked, default_backend
+from cantonesedetect.SegmentCache import SegmentCache
+
+THREADS = 8
+
+
+class TestThreadSafety(unittest.TestCase):
+    """
+    Stress the detector and its shared state from many threads at once.
+    """
+
+    def setUp(self):
+        # Switch threads as often as possible, so that races show up on GIL builds too
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        with open('tests/test_judge_sentences.txt', encoding='utf-8') as f:
+            self.documents = [line.split('|')[0] for line in f] + [
+                "他說「係噉嘅」。我們去吃飯", "佢嚟咗。" * 20 + "他說了。", "", "Hello World!"]
+
+    def tearDown(self):
+        sys.setswitchinterval(self.switch_interval)
+
+    def run_threads(self, function, *args):
+        """
+        Start `function(index, *args)` in every thread at the same time, and return their results.
+        """
+        barrier = threading.Barrier(THREADS)
+
+        def run(index):
+            barrier.wait()
+            return function(index, *args)
+
+        with ThreadPoolExecutor(THREADS) as executor:
+            return list(executor.map(run, range(THREADS)))
+
+    def test_shared_detector(self):
+        """
+        A detector shared by threads, with a segment cache small enough to evict all the time, gives the same
+        judgements, tags and analysis as when it is used by one thread.
+        """
+        configs = [{"split_seg": True, "use_quotes": True, "cache_size": 4},
+                   {"split_seg": True, "early_exit": True, "cache_size": 4},
+                   {"split_seg": True, "use_quotes": True, "get_analysis": True, "cache_size": 4}]
+        for config in configs:
+            detector = CantoneseDetector(**config)
+
+            def results(document):
+                judgement = detector.judge(document)
+                if config.get("get_analysis"):
+                    judgement = judgement[0], judgement[1].get_analysis()
+                return judgement, detector.tag(document), detector.is_cantonese(document)
+
+            expected = {document: results(document) for document in self.documents}
+
+            def judge_all(index):
+                documents = self.documents * 20
+                random.Random(index).shuffle(documents)
+                return [(document, results(document)) for document in documents]
+
+            for thread_results in self.run_threads(judge_all):
+                for document, result in thread_results:
+                    self.assertEqual(result, expected[document])
+            stats = detector.segment_cache.stats()
+            self.assertLessEqual(stats["size"], 4)
+            self.assertGreater(stats["evictions"], 0)
+
+    def test_segment_cache(self):
+        """
+        Concurrent lookups and insertions neither fail nor lose statistics.
+        """
+        cache = SegmentCache(8)
+
+        def use(index):
+            rng = random.Random(index)
+            for _ in range(2000):
+                key = rng.randrange(16)
+                value = cache.get(key)
+                if value is None:
+                    cache.put(key, key)
+                elif value != key:
+                    return False
+            return True
+
+        self.assertEqual(self.run_threads(use), [True] * THREADS)
+        stats = cache.stats()
+        self.assertLessEqual(stats["size"], 8)
+        self.assertEqual(stats["hits"] + stats["misses"], THREADS * 2000)
+
+    def test_lazy_build(self):
+        """
+        Threads that judge before the lexicons are compiled all wait for the same trie and compiled regexes.
+        """
+        patterns = [LazyPattern(pattern.pattern) for pattern in FEATURE_SCANNER.patterns]
+        scanner = FeatureScanner(*patterns, ALL_HAN_RE)
+
+        def scan(index):
+            return scanner.trie, scanner.count("我哋唔係關係，你們在那裏吃飯"), patterns[index % 4].findall("是咁的")
+
+        results = self.run_threads(scan)
+        self.assertTrue(all(trie is results[0][0] for trie, _, _ in results))
+        self.assertEqual(results[0][0], FEATURE_SCANNER.trie)
+        for _, counts, matches in results:
+            self.assertEqual(counts, FEATURE_SCANNER.count("我哋唔係關係，你們在那裏吃飯"))
+        self.assertEqual([matches for _, _, matches in results[:4]],
+                         [pattern.findall("是咁的") for pattern in FEATURE_SCANNER.patterns])
+
+    def test_thread_backend(self):
+        """
+        A pool of threads sharing one detector gives the same results as the detector, in input order.
+        """
+        detector = CantoneseDetector(split_seg=True, use_quotes=True, cache_size=16)
+        documents = self.documents * 10
+        with JudgePool(detector._get_config(), 4, backend="thread") as pool:
+            self.assertEqual(pool.backend, "thread")
+            self.assertEqual([result for _, results in pool.imap(chunked(documents, 7)) for result in results],
+                             [detector.judge(document) for document in documents])
+            self.assertEqual([kept for _, keep in pool.ifilter(chunked(documents, 7), "cantonese") for kept in keep],
+                             [detector.is_cantonese(document) for document in documents])
+            self.assertEqual([spans for _, tags in pool.itag(chunked(documents, 7)) for spans in tags],
+                             [detector.tag(document) for document in documents])
+        self.assertEqual(detector.judge_many(documents, workers=4, chunksize=5, backend="thread"),
+                         [detector.judge(document) for document in documents])
+
+        gil_enabled = getattr(sys, "_is_gil_enabled", lambda: True)()
+        self.assertEqual(default_backend(), "process" if gil_enabled else "thread")
+        self.assertEqual(JudgePool(detector._get_config(), 1).backend, default_backend())
+        with self.assertRaises(ValueError):
+            JudgePool(detector._get_config(), 1, backend="fiber")
+
+    def test_cli_import(self):
+        """
+        Importing the CLI from several threads leaves stdout alone: it is only reconfigured by `main()`.
+        """
+        code = (
+            "import sys, threading\n"
+            "threads = [threading.Thread(target=__import__, args=('cantonesedetect.cli',)) for _ in range(8)]\n"
+            "[thread.start() for thread in threads]\n"
+            "[thread.join() for thread in threads]\n"
+            "print(sys.stdout.encoding)\n")
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                env={**os.environ, "PYTHONIOENCODING": "ascii"}).stdout
+        self.assertEqual(output.strip(), "ascii")
+
+
+if __name__ == '__main__':
+    unittest.main()
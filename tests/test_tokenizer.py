@@ -0,0 +1,88 @@
+import unittest
+
+from cantonesedetect.Detector import ALL_DELIMITERS_RE, ALL_QUOTEMARKS_RE, CantoneseDetector
+from cantonesedetect.Tokenizer import SpanKind
+
+
+def separate_quotes(document):
+    """
+    The matrix and quotes strings, built with the regexes: the reference for the spans.
+    """
+    matrix = ALL_QUOTEMARKS_RE.sub("…", document)
+    quotes = "…".join("".join(groups) for groups in ALL_QUOTEMARKS_RE.findall(document))
+    return matrix, quotes
+
+
+def split_document(text, split_seg):
+    """
+    The non-blank segments of a text split at the delimiters, or the whole text.
+    """
+    if split_seg:
+        return [segment for segment in ALL_DELIMITERS_RE.split(text) if segment.strip()]
+    return [text]
+
+
+class TestTokenizer(unittest.TestCase):
+    """
+    Test the span-based tokenization of documents.
+    """
+
+    documents = ["", "…", "「」", "他說「」", "「係」", "「外「內」」", "「一「二」三」四", "一外「一內」二外『二內』三外“三內”。",
+                 "係。，。係\n 他說：「係噉嘅，你知唔知？」《關係》", "“未完", "  。  ", "他們「是」。「否」"]
+
+    def expected_parts(self, detector, document):
+        """
+        The texts judged by `_judge_matrix_quotes()`, built from `separate_quotes()`.
+        """
+        if not detector.use_quotes:
+            return [document]
+        matrix, quotes = separate_quotes(document)
+        if matrix == "…":
+            return [ALL_QUOTEMARKS_RE.sub("", quotes)]
+        elif quotes == "":
+            return [matrix]
+        return [matrix, quotes]
+
+    def test_same_segments(self):
+        """
+        The spans give the same segments as splitting the matrix and quotes strings.
+        """
+        for split_seg in (False, True):
+            for use_quotes in (False, True):
+                detector = CantoneseDetector(split_seg=split_seg, use_quotes=use_quotes)
+                for document in self.documents:
+                    parts = detector._separate_parts(document)
+                    segments = [[segment.text() for segment in detector._split_part(document, part)] for part in parts]
+                    expected = [split_document(text, split_seg) for text in self.expected_parts(detector, document)]
+                    self.assertEqual(segments, expected, document)
+                    self.assertEqual([detector._split_part_texts(document, part) for part in parts], expected, document)
+
+    def test_segment_counts(self):
+        """
+        Counting the features of the spans gives the same counts as counting the segment strings.
+        """
+        detector = CantoneseDetector(split_seg=True, use_quotes=True)
+        for document in self.documents:
+            for part in detector._separate_parts(document):
+                for segment in detector._split_part(document, part):
+                    self.assertEqual(detector._get_segment_counts(segment), detector._get_segment_counts(segment.text()))
+                    features = detector._get_segment_features(segment)
+                    self.assertEqual(features.segment, segment.text())
+                    self.assertEqual(features.offsets, tuple(segment.pieces))
+
+    def test_tokenize(self):
+        """
+        `tokenize()` gives the matrix, quote and delimiter spans in document order.
+        """
+        detector = CantoneseDetector(use_quotes=True)
+        document = "佢話「係，係」。"
+        self.assertEqual(detector.tokenize(document), [
+            (0, 2, SpanKind.MATRIX), (3, 4, SpanKind.QUOTE), (4, 5, SpanKind.DELIMITER), (5, 6, SpanKind.QUOTE),
+            (7, 8, SpanKind.DELIMITER)])
+        self.assertEqual(CantoneseDetector().tokenize(document), [
+            (0, 4, SpanKind.MATRIX), (4, 5, SpanKind.DELIMITER), (5, 7, SpanKind.MATRIX), (7, 8, SpanKind.DELIMITER)])
+        self.assertEqual(detector.tokenize(""), [])
+
+
+if __name__ == '__main__':
+    unittest.main()